@@ -2,24 +2,30 @@ from flask import Flask
 from flask_cors import CORS
 import os
 import logging
+from pathlib import Path
 from core.config import Config
-from services.model_service import ModelInference
-from services.image_service import image_processor
+from core.resources import resource_manager
+from core.startup import startup
+
+# Split the CPU budget before any model, onnxruntime session or worker thread exists
+cpu_plan = resource_manager.apply(resource_manager.plan())
+
+from services.job_service import JobManager
+from services.model_switch import ModelSwitchBroadcast
 
 # Import route blueprints
 from routes import (
     general_bp,
     model_bp,
     analysis_bp,
+    job_bp,
     init_general_routes,
     init_model_routes,
     init_analysis_routes,
+    init_job_routes,
     register_error_handlers
 )
 
-from routes.admin_routes import admin_bp
-from routes.wardrobe_routes import wardrobe_bp, init_wardrobe_routes
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,38 +40,119 @@ CORS(app, origins=Config.CORS_ORIGINS)
 # Initialize services
 logger.info("🚀 Initializing Body Measurement AI API...")
 logger.info(f"📍 Model directory: {Config.MODEL_DIR}")
+logger.info(
+    f"🧮 CPU budget: {cpu_plan['total_cores']} cores -> segmentation "
+    f"{cpu_plan['segmentation_sessions']}x{cpu_plan['segmentation_threads']} threads, "
+    f"measurement {cpu_plan['measurement_threads']} threads"
+    f"{' (pinned)' if cpu_plan['pinned'] else ''}"
+)
 
 # Check if models exist
 if not Config.MODEL_DIR.exists():
     logger.info(f"⚠️ Creating model directory: {Config.MODEL_DIR}")
     Config.MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
-# Load model
-selected_model = os.getenv('MODEL_NAME', Config.DEFAULT_MODEL)
-if selected_model != Config.DEFAULT_MODEL:
-    logger.info(f"🔄 Using model from environment: {selected_model}")
+if Config.SERVING_MODE == 'split':
+    # Segmentation and measurement run in their own stage_worker.py process
+    # groups; this process parses requests and calls them over their sockets
+    from services.stage_service import connect_stages
+    
+    logger.info("🔀 Split serving: segmentation and measurement run as separate stages")
+    try:
+        # Stages load and warm up their models before they start answering
+        image_processor, model_inference, model_pool = startup.step('stages', connect_stages)
+        logger.info(f"✅ Stages connected (measurement model: {model_inference.model_name})")
+    except Exception as e:
+        logger.error(f"❌ Error connecting to stages: {e}")
+        image_processor = model_inference = model_pool = None
+else:
+    from services.model_service import ModelInference
+    from services.model_pool import ModelPool
+    from services.image_service import image_processor
+    
+    # Load model
+    selected_model = os.getenv('MODEL_NAME', Config.DEFAULT_MODEL)
+    if selected_model != Config.DEFAULT_MODEL:
+        logger.info(f"🔄 Using model from environment: {selected_model}")
+    
+    device = 'cuda' if os.getenv('USE_GPU', 'False') == 'True' else 'cpu'
+    
+    def load_segmentation():
+        """rembg sessions, then one warm-up run per session"""
+        def load_sessions():
+            if image_processor.load() is None:
+                raise RuntimeError("rembg AI model not loaded")
+        
+        startup.step('segmentation_sessions', load_sessions)
+        if Config.STARTUP_WARMUP:
+            startup.step('segmentation_warmup', image_processor.warm_up, Config.IMG_SIZE)
+    
+    def load_measurement():
+        """Checkpoint (download if needed) and model, then one warm-up forward"""
+        inference = startup.step('measurement_model', ModelInference, model_name=selected_model, device=device)
+        startup.add_details('measurement_model', **inference.load_timings)
+        if Config.STARTUP_WARMUP:
+            startup.step('measurement_warmup', inference.warm_up)
+        return inference
+    
+    # Segmentation and measurement load side by side (onnxruntime, checkpoint I/O
+    # and most torch work run without the GIL)
+    loaded = startup.run_parallel({'segmentation': load_segmentation, 'measurement': load_measurement})
+    model_inference = loaded['measurement']
+    if model_inference is not None:
+        logger.info(f"✅ Model loaded: {selected_model}")
+    else:
+        logger.error(f"❌ Error loading model: {selected_model}")
+    
+    if Config.PREFETCH_MODELS:
+        logger.info("📥 Prefetching other models in background...")
+        from services.hf_service import hf_manager
+        hf_manager.prefetch_models(exclude=[selected_model])
+    
+    if Config.CPU_AUTOTUNE and resource_manager.prefork:
+        logger.info("⚠️ CPU_AUTOTUNE is skipped under serve.py (the master must stay single-threaded)")
+    elif Config.CPU_AUTOTUNE and model_inference is not None and image_processor.session_pool is not None:
+        logger.info("⏱️ Benchmarking CPU splits between segmentation and measurement...")
+        
+        def autotune():
+            plan = resource_manager.autotune(image_processor, model_inference)
+            if Config.STARTUP_WARMUP:
+                image_processor.warm_up(Config.IMG_SIZE)  # the winning split may have new sessions
+            return plan
+        
+        cpu_plan = startup.step('cpu_autotune', autotune)
+    
+    # Extra models requested per call (?model= / X-Model) stay resident in an LRU pool
+    model_pool = ModelPool(model_inference, Config.MODEL_POOL_MEMORY_MB, device) if model_inference else None
 
-try:
-    model_inference = ModelInference(
-        model_name=selected_model,
-        device='cuda' if os.getenv('USE_GPU', 'False') == 'True' else 'cpu'
-    )
-    logger.info(f"✅ Model loaded: {selected_model}")
-except Exception as e:
-    logger.error(f"❌ Error loading model: {e}")
-    model_inference = None
+# Under serve.py with several workers, jobs and model switches go through files every worker sees
+shared_state = Path(Config.SERVE_STATE_DIR) if Config.SERVE_STATE_DIR else None
+
+# Asynchronous /jobs/... requests run on their own worker pool
+job_manager = JobManager(
+    Config.JOB_WORKERS, Config.JOB_RESULT_TTL_S, Config.JOB_MAX_RETAINED, Config.JOB_MAX_QUEUED,
+    store_path=shared_state / 'jobs.sqlite3' if shared_state else None
+)
+
+# serve.py starts a watcher in each worker (split mode can't switch models)
+model_switch = None
+if shared_state is not None and Config.SERVING_MODE != 'split' and model_inference is not None:
+    model_switch = ModelSwitchBroadcast(shared_state, Config.WORKERS)
 
+startup.finish()
 logger.info("✅ API initialized successfully!")
 
 # Initialize routes with dependencies
 init_general_routes(model_inference)
-init_model_routes(model_inference, image_processor)
-init_analysis_routes(model_inference)
+init_model_routes(model_inference, image_processor, model_pool, model_switch)
+init_analysis_routes(model_inference, model_pool)
+init_job_routes(job_manager, model_inference, image_processor, model_pool)
 
 # Register blueprints
 app.register_blueprint(general_bp)
 app.register_blueprint(model_bp)
 app.register_blueprint(analysis_bp)
+app.register_blueprint(job_bp)
 
 # Register error handlers
 register_error_handlers(app)
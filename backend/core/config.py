@@ -9,6 +9,15 @@ class Config:
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 5000))
     
+    # Production server (serve.py): pre-forked gunicorn workers sharing the master's models
+    WORKERS = int(os.getenv('WORKERS', 2))
+    WORKER_THREADS = int(os.getenv('WORKER_THREADS', 4))  # request threads per worker
+    WORKER_TIMEOUT_S = int(os.getenv('WORKER_TIMEOUT_S', 120))
+    # Jobs and /switch-model requests shared by the workers (serve.py creates a temporary
+    # directory when WORKERS > 1 and this is unset)
+    SERVE_STATE_DIR = os.getenv('SERVE_STATE_DIR')
+    MODEL_SWITCH_TIMEOUT_S = float(os.getenv('MODEL_SWITCH_TIMEOUT_S', 300))  # /switch-model wait=true
+    
     # Model Configuration
     BASE_DIR = Path(__file__).parent.parent
     MODEL_DIR = BASE_DIR / 'models'
@@ -28,7 +37,8 @@ class Config:
             'name': 'Model V1 (EfficientNet-B3)',
             'description': 'Balanced accuracy and speed',
             'speed': 'medium',
-            'accuracy': 'high'
+            'accuracy': 'high',
+            'quantization': None  # None, 'dynamic' (int8 head) or 'static' (int8 encoders + head)
         },
         'model_v2': {
             'filename': MODEL_FILES['model_v2'],
@@ -37,7 +47,8 @@ class Config:
             'name': 'Model V2 (MobileNetV3)',
             'description': 'Lightweight and fast',
             'speed': 'fast',
-            'accuracy': 'medium'
+            'accuracy': 'medium',
+            'quantization': None
         },
         'model_v3': {
             'filename': MODEL_FILES['model_v3'],
@@ -46,12 +57,115 @@ class Config:
             'name': 'Model V3 (ResNet50)',
             'description': 'High accuracy',
             'speed': 'slow',
-            'accuracy': 'high'
+            'accuracy': 'high',
+            'quantization': None
         }
     }
     
     DEFAULT_MODEL = 'model_v1'  # Change to model_v2 or model_v3 as needed
     
+    # Inference Configuration
+    MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'torch')  # 'torch' or 'onnx'
+    ONNX_DIR = MODEL_DIR / 'onnx'
+    ONNX_PARITY_ATOL = float(os.getenv('ONNX_PARITY_ATOL', 1e-3))
+    ONNX_INTRA_OP_THREADS = int(os.getenv('ONNX_INTRA_OP_THREADS', 0))  # 0 = onnxruntime default
+    
+    # Inference graph optimization (set OPTIMIZE_MODEL=False to debug the raw model)
+    OPTIMIZE_MODEL = os.getenv('OPTIMIZE_MODEL', 'True') == 'True'
+    CHANNELS_LAST = os.getenv('CHANNELS_LAST', 'True') == 'True'
+    MODEL_JIT = os.getenv('MODEL_JIT', 'none')  # 'none', 'freeze' or 'compile'
+    # Fold RGB replication + ImageNet normalization into the stem convs (1xHxW mask inputs)
+    GRAYSCALE_STEM = os.getenv('GRAYSCALE_STEM', 'False') == 'True'
+    
+    # INT8 quantization (enabled per model via MODELS[...]['quantization'])
+    QUANT_CALIBRATION_DIR = Path(os.getenv('QUANT_CALIBRATION_DIR', BASE_DIR / 'calibration'))
+    QUANT_CALIBRATION_SAMPLES = int(os.getenv('QUANT_CALIBRATION_SAMPLES', 32))
+    # Share of the samples kept out of static calibration to measure drift on
+    QUANT_HOLDOUT_FRACTION = float(os.getenv('QUANT_HOLDOUT_FRACTION', 0.25))
+    
+    MICRO_BATCHING = os.getenv('MICRO_BATCHING', 'True') == 'True'
+    BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 8))
+    BATCH_WINDOW_MS = float(os.getenv('BATCH_WINDOW_MS', 10))  # 5-20ms is a good range
+    
+    # Download the other models in the background at startup so /switch-model is near-instant
+    PREFETCH_MODELS = os.getenv('PREFETCH_MODELS', 'False') == 'True'
+    
+    # Model artifacts: hub revision to fetch, parallel downloads, and an optional local
+    # directory laid out like the hub repo that replaces it (offline installs, tests)
+    HF_REVISION = os.getenv('HF_REVISION', 'main')
+    HF_DOWNLOAD_WORKERS = int(os.getenv('HF_DOWNLOAD_WORKERS', 3))
+    HF_LOCAL_SOURCE_DIR = os.getenv('HF_LOCAL_SOURCE_DIR')
+    
+    # Model pool: models selected per request (?model= / X-Model) stay loaded up to this budget
+    MODEL_POOL_MEMORY_MB = int(os.getenv('MODEL_POOL_MEMORY_MB', 1024))
+    
+    # Bulk prediction (/predict-batch)
+    MAX_BATCH_ITEMS = int(os.getenv('MAX_BATCH_ITEMS', 64))
+    MAX_ARCHIVE_SIZE = int(os.getenv('MAX_ARCHIVE_SIZE_MB', 256)) * 1024 * 1024  # uncompressed images in one zip
+    MAX_BATCH_UPLOAD = int(os.getenv('MAX_BATCH_UPLOAD_MB', 256)) * 1024 * 1024  # files or zip in one request
+    SEGMENTATION_WORKERS = int(os.getenv('SEGMENTATION_WORKERS', 4))
+    
+    # rembg session pool: concurrent segmentations, threads per session (0 = cores / sessions)
+    SEGMENTATION_SESSIONS = int(os.getenv('SEGMENTATION_SESSIONS', 2))
+    SEGMENTATION_THREADS = int(os.getenv('SEGMENTATION_THREADS', 0))
+    SEGMENTATION_ENGINE = os.getenv('SEGMENTATION_ENGINE', 'native')  # 'native' (direct u2net) or 'rembg'
+    SEGMENTATION_CPU_SETS = None  # per-session CPU ids, set by the CPU budget when CPU_PINNING=True
+    
+    # CPU budget split between segmentation (onnxruntime) and measurement (torch / ONNX backend)
+    CPU_BUDGET = int(os.getenv('CPU_BUDGET', 0))  # cores to use, 0 = every core available to the process
+    CPU_SEGMENTATION_SHARE = float(os.getenv('CPU_SEGMENTATION_SHARE', 0.5))
+    CPU_PINNING = os.getenv('CPU_PINNING', 'False') == 'True'  # pin each stage to its own cores (Linux)
+    CPU_AUTOTUNE = os.getenv('CPU_AUTOTUNE', 'False') == 'True'  # benchmark a few splits at startup
+    CPU_AUTOTUNE_ROUNDS = int(os.getenv('CPU_AUTOTUNE_ROUNDS', 4))
+    
+    # Startup: run segmentation and measurement once at IMG_SIZE before /ready reports ready
+    STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'True') == 'True'
+    
+    # Segmentation mask cache (keyed by uploaded image bytes + target size)
+    MASK_CACHE_ENABLED = os.getenv('MASK_CACHE_ENABLED', 'True') == 'True'
+    MASK_CACHE_MAX_ENTRIES = int(os.getenv('MASK_CACHE_MAX_ENTRIES', 256))
+    MASK_CACHE_DIR = os.getenv('MASK_CACHE_DIR')  # unset = memory tier only
+    MASK_CACHE_DISK_MB = int(os.getenv('MASK_CACHE_DISK_MB', 512))
+    
+    # Measurement result cache (keyed by model, checkpoint and mask hashes)
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'True') == 'True'
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 1024))
+    RESULT_CACHE_TTL_S = float(os.getenv('RESULT_CACHE_TTL_S', 3600))
+    
+    # Admission control: concurrent requests per stage, bounded wait queues, per-request deadlines
+    ADMISSION_CONTROL = os.getenv('ADMISSION_CONTROL', 'True') == 'True'
+    REQUEST_TIMEOUT_S = float(os.getenv('REQUEST_TIMEOUT_S', 10))  # default deadline (X-Request-Timeout overrides)
+    REQUEST_TIMEOUT_MAX_S = float(os.getenv('REQUEST_TIMEOUT_MAX_S', REQUEST_TIMEOUT_S * 30))  # longest deadline a client may ask for
+    ADMISSION_MASK_CONCURRENCY = int(os.getenv('ADMISSION_MASK_CONCURRENCY', 8))  # decode + mask fast path
+    ADMISSION_MASK_QUEUE = int(os.getenv('ADMISSION_MASK_QUEUE', 32))
+    ADMISSION_SEGMENTATION_CONCURRENCY = int(os.getenv('ADMISSION_SEGMENTATION_CONCURRENCY', SEGMENTATION_SESSIONS))  # AI path
+    ADMISSION_SEGMENTATION_QUEUE = int(os.getenv('ADMISSION_SEGMENTATION_QUEUE', 8))
+    ADMISSION_INFERENCE_CONCURRENCY = int(os.getenv('ADMISSION_INFERENCE_CONCURRENCY', BATCH_MAX_SIZE))
+    ADMISSION_INFERENCE_QUEUE = int(os.getenv('ADMISSION_INFERENCE_QUEUE', 32))
+    # Priority lanes: share of freed slots per class, and the wait after which batch work goes first anyway
+    PRIORITY_INTERACTIVE_WEIGHT = int(os.getenv('PRIORITY_INTERACTIVE_WEIGHT', 4))  # /preview-mask
+    PRIORITY_BATCH_WEIGHT = int(os.getenv('PRIORITY_BATCH_WEIGHT', 1))  # /predict, /complete-analysis, jobs
+    PRIORITY_STARVATION_MS = float(os.getenv('PRIORITY_STARVATION_MS', 2000))
+    
+    # Asynchronous jobs (/jobs/...): worker threads, jobs waiting for one (each holds its
+    # uploads in memory) and how long finished results are kept
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', 16))
+    JOB_RESULT_TTL_S = float(os.getenv('JOB_RESULT_TTL_S', 600))
+    JOB_MAX_RETAINED = int(os.getenv('JOB_MAX_RETAINED', 1000))
+    
+    # Serving mode: 'inprocess' runs every stage in the API process; 'split' runs segmentation and
+    # measurement as separate stage_worker.py process groups that the API calls over sockets
+    SERVING_MODE = os.getenv('SERVING_MODE', 'inprocess')
+    SEGMENTATION_STAGE_ADDRESS = os.getenv('SEGMENTATION_STAGE_ADDRESS', '/tmp/body-measurement-segmentation.sock')  # Unix socket path or host:port
+    MEASUREMENT_STAGE_ADDRESS = os.getenv('MEASUREMENT_STAGE_ADDRESS', '/tmp/body-measurement-measurement.sock')
+    SEGMENTATION_STAGE_WORKERS = int(os.getenv('SEGMENTATION_STAGE_WORKERS', 2))  # processes per stage
+    MEASUREMENT_STAGE_WORKERS = int(os.getenv('MEASUREMENT_STAGE_WORKERS', 1))
+    STAGE_THREADS = int(os.getenv('STAGE_THREADS', 8))  # connections served at once by each stage process
+    STAGE_AUTOSTART = os.getenv('STAGE_AUTOSTART', 'True') == 'True'  # app.py launches stages that aren't running
+    STAGE_TIMEOUT_S = float(os.getenv('STAGE_TIMEOUT_S', 60))  # stage calls without a request deadline (jobs)
+    STAGE_START_TIMEOUT_S = float(os.getenv('STAGE_START_TIMEOUT_S', 300))
+    
     # Image Configuration
     IMG_SIZE = (512, 384)  # height, width
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
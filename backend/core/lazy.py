@@ -0,0 +1,59 @@
+import sys
+import threading
+import importlib
+
+
+def lazy_exports(package, exports):
+    """
+    Module-level __getattr__ / __dir__ that import a package's exports on first use (PEP 562)
+
+    Importing the package stays cheap; `from package import name` loads only the
+    submodule that defines name.
+
+    Args:
+        package: The package's __name__
+        exports: {exported name: submodule that defines it}
+
+    Returns:
+        (__getattr__, __dir__) for the package namespace
+    """
+    namespace = sys.modules[package].__dict__
+
+    def __getattr__(name):
+        submodule = exports.get(name)
+        if submodule is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(f'.{submodule}', package), name)
+        namespace[name] = value  # later lookups skip __getattr__
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(exports))
+
+    return __getattr__, __dir__
+
+
+def lazy_singletons(module, factories):
+    """
+    Module-level __getattr__ that creates global instances on first access
+
+    Args:
+        module: The module's __name__
+        factories: {global name: callable returning the instance}
+
+    Returns:
+        __getattr__ for the module namespace
+    """
+    namespace = sys.modules[module].__dict__
+    lock = threading.Lock()
+
+    def __getattr__(name):
+        factory = factories.get(name)
+        if factory is None:
+            raise AttributeError(f"module {module!r} has no attribute {name!r}")
+        with lock:
+            if name not in namespace:
+                namespace[name] = factory()
+        return namespace[name]
+
+    return __getattr__
@@ -0,0 +1,311 @@
+import os
+import sys
+import math
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Segmentation shares of the budget tried by autotune
+AUTOTUNE_SHARES = (0.25, 0.5, 0.75)
+
+
+def available_cpus():
+    """CPU ids this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def process_memory(pid=None):
+    """
+    Resident memory of a process, in MB
+
+    PSS splits pages shared with other processes (e.g. copy-on-write model
+    weights inherited from a pre-fork master) between them, so summing PSS
+    over workers gives their real total; RSS counts shared pages in full.
+
+    Args:
+        pid: Process id (None = this process)
+
+    Returns:
+        {'pid', 'rss_mb', 'pss_mb', 'shared_mb', 'private_mb'} (None values
+        where /proc/<pid>/smaps_rollup isn't available)
+    """
+    pid = pid or os.getpid()
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024  # kB -> MB
+    except OSError:
+        pass
+
+    def total(*names):
+        return round(sum(fields[name] for name in names), 1) if all(n in fields for n in names) else None
+
+    rss_mb = total('Rss')
+    if rss_mb is None and pid == os.getpid():
+        import resource
+        rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # peak, Linux kB
+
+    return {
+        'pid': pid,
+        'rss_mb': rss_mb,
+        'pss_mb': total('Pss'),
+        'shared_mb': total('Shared_Clean', 'Shared_Dirty'),
+        'private_mb': total('Private_Clean', 'Private_Dirty'),
+    }
+
+
+def worker_cpus(slot, per_worker, cpus=None):
+    """CPU ids of one pre-fork worker slot: its own per_worker cores (wraps when workers outnumber the cores)"""
+    cpus = list(cpus) if cpus else available_cpus()
+    return [cpus[(slot * per_worker + offset) % len(cpus)] for offset in range(per_worker)]
+
+
+def sibling_processes():
+    """Process ids of this process's parent's children (pre-fork workers), this one included"""
+    parent = os.getppid()
+    try:
+        with open(f'/proc/{parent}/task/{parent}/children') as f:
+            return sorted(int(pid) for pid in f.read().split())
+    except OSError:
+        return [os.getpid()]
+
+
+class ResourceManager:
+    """Split a CPU core budget between the segmentation and measurement stages"""
+
+    def __init__(self):
+        self.plan_applied = None
+        self.autotune_report = None
+        self._interop_configured = False
+        # Pre-fork master: keep torch single-threaded until each worker applies its
+        # own plan (libgomp thread pools started before fork hang in the children)
+        self.prefork = False
+        self.worker_slot = None
+        # Thread counts set explicitly in the environment win over the budget
+        self._explicit = {
+            'segmentation': Config.SEGMENTATION_THREADS,
+            'measurement': Config.ONNX_INTRA_OP_THREADS,
+        }
+
+    def plan(self, budget=None, segmentation_share=None, sessions=None, pin=None, cpus=None, stage=None):
+        """
+        Work out thread counts (and CPU sets) for both stages
+
+        Args:
+            budget: Cores to use (0/None = Config.CPU_BUDGET, then every available core)
+            segmentation_share: Fraction of the cores for segmentation
+            sessions: Segmentation sessions sharing those cores
+            pin: Pin each stage to its own CPUs
+            cpus: CPU ids to plan over (None = every CPU available to the process)
+            stage: 'segmentation' or 'measurement' for a process that runs only
+                that stage (stage_worker.py); it gets every core
+
+        Returns:
+            Plan dictionary for apply()
+        """
+        budget = budget or Config.CPU_BUDGET
+        share = Config.CPU_SEGMENTATION_SHARE if segmentation_share is None else segmentation_share
+        sessions = max(1, sessions or Config.SEGMENTATION_SESSIONS)
+        pin = Config.CPU_PINNING if pin is None else pin
+
+        cpus = list(cpus) if cpus else available_cpus()
+        cpus = cpus[:budget] if budget else cpus
+        total = len(cpus)
+
+        if stage is not None:
+            share = 1.0 if stage == 'segmentation' else 0.0
+
+        if total > 1 and stage is None:
+            segmentation_cores = min(total - 1, max(1, round(total * share)))
+            measurement_cpus = cpus[:total - segmentation_cores]
+            segmentation_cpus = cpus[total - segmentation_cores:]
+        else:
+            # One core or one stage: nothing to split, both stages get every core
+            segmentation_cores = total
+            measurement_cpus = segmentation_cpus = cpus
+
+        segmentation_threads = self._explicit['segmentation'] or max(1, segmentation_cores // sessions)
+        measurement_threads = self._explicit['measurement'] or len(measurement_cpus)
+
+        # Each session gets its own slice of the segmentation cores (wrapping if short)
+        segmentation_cpu_sets = None
+        if pin:
+            segmentation_cpu_sets = [
+                [segmentation_cpus[(index * segmentation_threads + offset) % len(segmentation_cpus)]
+                 for offset in range(segmentation_threads)]
+                for index in range(sessions)
+            ]
+
+        return {
+            'total_cores': total,
+            'stage': stage,
+            'segmentation_share': share,
+            'segmentation_sessions': sessions,
+            'segmentation_threads': segmentation_threads,
+            'measurement_threads': measurement_threads,
+            'pinned': bool(pin),
+            'segmentation_cpus': segmentation_cpus,
+            'measurement_cpus': measurement_cpus,
+            'segmentation_cpu_sets': segmentation_cpu_sets,
+        }
+
+    def apply(self, plan):
+        """
+        Configure torch, onnxruntime session settings and CPU affinity
+
+        Segmentation sessions created after this call (ImageProcessor.create_session_pool)
+        pick up the plan; existing ones keep their threads.
+        """
+        if plan.get('stage') != 'segmentation':
+            # The segmentation stage never runs torch, so it never imports it
+            import torch
+
+            torch.set_num_threads(1 if self.prefork else plan['measurement_threads'])
+            if not self._interop_configured:
+                try:
+                    # Requests are already concurrent; a second torch pool only adds threads
+                    torch.set_num_interop_threads(1)
+                except RuntimeError:
+                    pass  # inter-op pool already started
+                self._interop_configured = True
+
+        Config.SEGMENTATION_THREADS = plan['segmentation_threads']
+        Config.ONNX_INTRA_OP_THREADS = plan['measurement_threads']
+        Config.SEGMENTATION_CPU_SETS = plan['segmentation_cpu_sets']
+
+        if plan['pinned']:
+            self._pin_threads(plan['measurement_cpus'])
+
+        self.plan_applied = plan
+        return plan
+
+    @staticmethod
+    def _pin_threads(cpus):
+        """
+        Pin every existing thread (and so threads they start later) to the
+        measurement CPUs; segmentation worker threads are pinned by onnxruntime
+        """
+        if not hasattr(os, 'sched_setaffinity'):
+            logger.warning("⚠️ CPU pinning is not supported on this platform")
+            return
+
+        task_dir = f'/proc/{os.getpid()}/task'
+        thread_ids = [int(tid) for tid in os.listdir(task_dir)] if os.path.isdir(task_dir) else [0]
+        for thread_id in thread_ids:
+            try:
+                os.sched_setaffinity(thread_id, cpus)
+            except OSError:
+                pass  # thread exited
+
+    def _benchmark(self, image_processor, inference, rounds):
+        """Seconds to segment two views and measure them, `rounds` times, on both stages at once"""
+        from utils.image_utils import mask_to_tensor
+
+        pool = image_processor.session_pool
+        photo = np.random.default_rng(0).integers(0, 256, (*Config.IMG_SIZE, 3), dtype=np.uint8)
+        tensor = mask_to_tensor(
+            np.zeros(Config.IMG_SIZE, np.uint8), Config.IMG_SIZE, channels=inference.input_channels
+        ).unsqueeze(0)
+
+        # Warm-up (first runs allocate)
+        pool.predict_masks([photo], Config.IMG_SIZE)
+        inference.predict_batch(tensor, tensor)
+
+        segmentations = math.ceil(2 * rounds / pool.size)
+
+        def segment():
+            for _ in range(segmentations):
+                pool.predict_masks([photo], Config.IMG_SIZE)
+
+        def measure():
+            for _ in range(rounds):
+                inference.predict_batch(tensor, tensor)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=pool.size + 1) as executor:
+            futures = [executor.submit(segment) for _ in range(pool.size)]
+            futures.append(executor.submit(measure))
+            for future in futures:
+                future.result()
+        return time.perf_counter() - started
+
+    def autotune(self, image_processor, inference, shares=AUTOTUNE_SHARES, rounds=None):
+        """
+        Benchmark a few segmentation/measurement splits and keep the fastest
+
+        Rebuilds the segmentation session pool for each split. Measurement
+        threads apply to torch immediately; the ONNX backend picks them up on
+        its next model load.
+
+        Args:
+            image_processor: ImageProcessor whose session pool is tuned
+            inference: ModelInference used for the measurement stage
+            shares: Segmentation shares to try
+            rounds: Front/side pairs per trial
+
+        Returns:
+            The applied plan
+        """
+        rounds = rounds or Config.CPU_AUTOTUNE_ROUNDS
+        model_names = (image_processor.session_pool.model_name,)
+        trials = []
+        seen = set()
+        built = None  # thread split of the current session pool
+
+        for share in shares:
+            plan = self.plan(segmentation_share=share)
+            split = (plan['segmentation_threads'], plan['measurement_threads'])
+            if split in seen:
+                continue  # same thread counts as a previous share (small budgets)
+            seen.add(split)
+
+            self.apply(plan)
+            image_processor.session_pool = image_processor.create_session_pool(model_names)
+            built = split
+            seconds = self._benchmark(image_processor, inference, rounds)
+
+            trials.append({
+                'segmentation_share': share,
+                'segmentation_threads': plan['segmentation_threads'],
+                'measurement_threads': plan['measurement_threads'],
+                'pairs_per_second': round(rounds / seconds, 3),
+            })
+            logger.info(
+                f"⏱️ CPU split {plan['segmentation_threads']}x{plan['segmentation_sessions']} segmentation / "
+                f"{plan['measurement_threads']} measurement threads: {rounds / seconds:.2f} pairs/s"
+            )
+
+        best = max(trials, key=lambda trial: trial['pairs_per_second'])
+        plan = self.apply(self.plan(segmentation_share=best['segmentation_share']))
+        if (plan['segmentation_threads'], plan['measurement_threads']) != built:
+            image_processor.session_pool = image_processor.create_session_pool(model_names)
+
+        self.autotune_report = {'rounds': rounds, 'trials': trials, 'selected': best}
+        logger.info(f"✅ CPU autotune selected segmentation share {best['segmentation_share']}")
+        return plan
+
+    def get_stats(self):
+        """Applied plan, autotune results and current torch thread counts"""
+        torch = sys.modules.get('torch')  # None in the segmentation stage
+        return {
+            'plan': self.plan_applied,
+            'autotune': self.autotune_report,
+            'worker_slot': self.worker_slot,
+            'torch_threads': torch.get_num_threads() if torch else None,
+            'torch_interop_threads': torch.get_num_interop_threads() if torch else None,
+        }
+
+
+# Global instance
+resource_manager = ResourceManager()
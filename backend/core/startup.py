@@ -0,0 +1,114 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """Run startup steps concurrently, time each one and report readiness"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._components = OrderedDict()  # name -> status dict, in start order
+        self._ready_ms = None
+        self._finished = False
+
+    def _update(self, name, **fields):
+        with self._lock:
+            self._components.setdefault(name, {'status': 'pending'}).update(fields)
+
+    def step(self, name, fn, *args, **kwargs):
+        """
+        Run one startup step and record its timing
+
+        Returns:
+            fn's result
+
+        Raises:
+            Whatever fn raises (recorded as the step's error first)
+        """
+        self._update(name, status='running', started_ms=self._elapsed_ms())
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._update(name, status='failed', error=str(e), duration_ms=self._ms_since(started))
+            logger.error(f"❌ Startup step {name} failed after {self._ms_since(started):.0f} ms: {e}")
+            raise
+
+        self._update(name, status='ready', duration_ms=self._ms_since(started))
+        logger.info(f"⏱️ Startup step {name}: {self._ms_since(started):.0f} ms")
+        return result
+
+    def add_details(self, name, **details):
+        """Attach extra timings (e.g. the model's checkpoint / build split) to a step"""
+        self._update(name, **details)
+
+    def run_parallel(self, chains):
+        """
+        Run independent chains of steps side by side
+
+        Args:
+            chains: {chain name: callable()} - each callable runs its own steps
+                in order (e.g. load, then warm up)
+
+        Returns:
+            {chain name: result}, None for chains that failed
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=len(chains), thread_name_prefix='startup') as executor:
+            futures = {name: executor.submit(chain) for name, chain in chains.items()}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    results[name] = None  # already recorded by step()
+        return results
+
+    def finish(self):
+        """Mark startup done; the API is ready if every step succeeded"""
+        with self._lock:
+            self._finished = True
+            self._ready_ms = self._elapsed_ms()
+        status = self.get_status()
+        if status['ready']:
+            logger.info(f"✅ Ready after {status['total_ms']:.0f} ms")
+        else:
+            failed = [name for name, c in status['components'].items() if c['status'] == 'failed']
+            logger.error(f"❌ Startup finished with failed steps: {failed}")
+
+    @property
+    def ready(self):
+        with self._lock:
+            return self._finished and all(c['status'] == 'ready' for c in self._components.values())
+
+    def get_status(self):
+        """Readiness, total startup time and per-step status / timings"""
+        with self._lock:
+            components = {name: dict(c) for name, c in self._components.items()}
+            finished = self._finished
+            total_ms = self._ready_ms
+
+        return {
+            'ready': finished and all(c['status'] == 'ready' for c in components.values()),
+            'finished': finished,
+            'started_at': self.started_at,
+            'total_ms': total_ms,
+            'components': components,
+        }
+
+    def _elapsed_ms(self):
+        return self._ms_since(self._started)
+
+    @staticmethod
+    def _ms_since(started):
+        return round((time.perf_counter() - started) * 1000, 1)
+
+
+# Global instance
+startup = StartupTracker()
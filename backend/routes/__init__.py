@@ -1,18 +1,19 @@
-from routes.general_routes import general_bp, init_general_routes, register_error_handlers
-from routes.model_routes import model_bp, init_model_routes
-from routes.analysis_routes import analysis_bp, init_analysis_routes
-from routes.size_routes import size_bp, init_size_routes
-from routes.wardrobe_routes import wardrobe_bp, init_wardrobe_routes
+from core.lazy import lazy_exports
 
-__all__ = [
-    'general_bp',
-    'model_bp',
-    'analysis_bp',
-    'init_general_routes',
-    'init_model_routes',
-    'init_analysis_routes',
-    'init_size_routes',
-    'register_error_handlers',
-    'wardrobe_bp',
-    'init_wardrobe_routes',
-]
\ No newline at end of file
+# Blueprints are imported on first use, so an app that skips a blueprint
+# never loads its route module (or the services behind it)
+_EXPORTS = {
+    'general_bp': 'general_routes',
+    'model_bp': 'model_routes',
+    'analysis_bp': 'analysis_routes',
+    'job_bp': 'job_routes',
+    'init_general_routes': 'general_routes',
+    'init_model_routes': 'model_routes',
+    'init_analysis_routes': 'analysis_routes',
+    'init_job_routes': 'job_routes',
+    'register_error_handlers': 'general_routes',
+}
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
+
+__all__ = list(_EXPORTS)
@@ -3,11 +3,15 @@ import logging
 
 from utils import (
     allowed_file,
+    get_requested_model,
+    get_request_timeout,
     format_measurements,
     validate_measurements,
     create_error_response,
+    create_overload_response,
     create_success_response
 )
+from services.admission_service import admission, Overloaded, BATCH
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +20,14 @@ analysis_bp = Blueprint('analysis', __name__)
 
 # Will be set when blueprint is registered
 model_inference = None
+model_pool = None
 
 
-def init_analysis_routes(inference):
+def init_analysis_routes(inference, pool=None):
     """Initialize route dependencies"""
-    global model_inference
+    global model_inference, model_pool
     model_inference = inference
+    model_pool = pool
 
 
 @analysis_bp.route('/complete-analysis', methods=['POST'])
@@ -30,6 +36,13 @@ def complete_analysis():
         if model_inference is None:
             return create_error_response("Model not loaded", 500)
         
+        inference = model_inference
+        if model_pool is not None:
+            try:
+                inference = model_pool.get(get_requested_model(request))
+            except ValueError as e:
+                return create_error_response(str(e), 400)
+        
         if 'front_image' not in request.files or 'side_image' not in request.files:
             return create_error_response("Missing front_image or side_image files", 400)
         
@@ -39,22 +52,30 @@ def complete_analysis():
         if not allowed_file(front_file.filename) or not allowed_file(side_file.filename):
             return create_error_response("Invalid file type. Allowed: png, jpg, jpeg", 400)
         
+        try:
+            timeout = get_request_timeout(request)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+        
         front_bytes = front_file.read()
         side_bytes = side_file.read()
         
         # Get measurements
-        measurements = model_inference.predict(front_bytes, side_bytes)
+        with admission.request_scope(timeout, BATCH):
+            measurements = inference.predict(front_bytes, side_bytes)
         warnings = validate_measurements(measurements)
         formatted_measurements = format_measurements(measurements)
         
         complete_data = {
             'measurements': formatted_measurements,
-            'model': model_inference.model_config['name'],
+            'model': inference.model_config['name'],
             'warnings': warnings if warnings else None
         }
         
         return create_success_response(complete_data, "Complete analysis generated")
     
+    except Overloaded as e:
+        return create_overload_response(str(e), e.status_code, e.retry_after)
     except Exception as e:
         logger.error(f"❌ Error in /complete-analysis: {str(e)}")
         return create_error_response(f"Analysis error: {str(e)}", 500)
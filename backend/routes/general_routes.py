@@ -1,8 +1,11 @@
 from flask import Blueprint, jsonify
 from datetime import datetime
+import os
 
 from core.config import Config
-from utils import create_error_response
+from core.resources import resource_manager, process_memory, sibling_processes
+from core.startup import startup
+from utils import create_error_response, create_success_response
 
 # Create blueprint
 general_bp = Blueprint('general', __name__)
@@ -26,11 +29,23 @@ def home():
         'status': 'running',
         'endpoints': {
             'predict': '/predict [POST]',
+            'predict_batch': '/predict-batch [POST]',
             'preview_mask': '/preview-mask [POST]',
             'complete_analysis': '/complete-analysis [POST]',
+            'predict_job': '/jobs/predict [POST]',
+            'complete_analysis_job': '/jobs/complete-analysis [POST]',
+            'job_status': '/jobs/<job_id> [GET]',
+            'job_events': '/jobs/<job_id>/events [GET, SSE]',
             'model_info': '/model-info [GET]',
             'switch_model': '/switch-model [POST]',
-            'health_check': '/health [GET]'
+            'batching_stats': '/batching-stats [GET]',
+            'model_pool': '/model-pool [GET]',
+            'cache_stats': '/cache-stats [GET]',
+            'admission_stats': '/admission-stats [GET]',
+            'cpu_budget': '/cpu-budget [GET]',
+            'memory': '/memory [GET]',
+            'health_check': '/health [GET]',
+            'readiness_check': '/ready [GET]'
         }
     })
 
@@ -45,6 +60,42 @@ def health_check():
     }), 200
 
 
+@general_bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness probe: 200 once every model is loaded and warmed up, 503 if a startup step failed
+    
+    app.py loads everything before the server starts listening, so while
+    starting up the probe gets no connection rather than a 'starting' answer.
+    """
+    status = startup.get_status()
+    ready = status['ready'] and model_inference is not None
+    
+    return jsonify({
+        'status': 'ready' if ready else 'failed',
+        'ready': ready,
+        'total_ms': status['total_ms'],
+        'components': status['components'],
+        'timestamp': datetime.utcnow().isoformat()
+    }), 200 if ready else 503
+
+
+@general_bp.route('/memory', methods=['GET'])
+def memory():
+    """Resident memory of this process, and of every worker when running under serve.py"""
+    data = {'process': process_memory(), 'worker_slot': resource_manager.worker_slot}
+    
+    if resource_manager.worker_slot is not None:
+        # PSS counts the master's shared pages once across all workers
+        workers = [process_memory(pid) for pid in sibling_processes()]
+        master = process_memory(os.getppid())
+        data['master'] = master
+        data['workers'] = workers
+        data['total_pss_mb'] = round(sum(p['pss_mb'] or 0 for p in workers + [master]), 1)
+    
+    return create_success_response(data, "Memory usage retrieved")
+
+
 # Error handlers
 def register_error_handlers(app):
     """Register error handlers"""
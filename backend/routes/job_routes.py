@@ -0,0 +1,221 @@
+from flask import Blueprint, Response, request, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+import json
+import logging
+
+from utils import (
+    allowed_file,
+    get_requested_model,
+    get_content_hint,
+    check_content_length,
+    read_upload,
+    format_measurements,
+    validate_measurements,
+    create_error_response,
+    create_overload_response,
+    create_success_response
+)
+from core.config import Config
+from services.admission_service import Overloaded
+
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+job_bp = Blueprint('jobs', __name__)
+
+# These will be set when blueprint is registered
+job_manager = None
+model_inference = None
+image_processor = None
+model_pool = None
+
+# Seconds between SSE keep-alive comments (keeps proxies from closing idle streams)
+SSE_KEEPALIVE_S = 15
+
+
+def init_job_routes(manager, inference, img_processor, pool=None):
+    """Initialize route dependencies"""
+    global job_manager, model_inference, image_processor, model_pool
+    job_manager = manager
+    model_inference = inference
+    image_processor = img_processor
+    model_pool = pool
+
+
+def _resolve_model(model_name):
+    """Model for a job (loaded in the worker, not the request thread)"""
+    if model_pool is None:
+        return model_inference
+    return model_pool.get(model_name)
+
+
+def _measurement_result(inference, measurements):
+    """Same payload as the synchronous endpoints"""
+    warnings = validate_measurements(measurements)
+    return {
+        'measurements': format_measurements(measurements),
+        'model': inference.model_config['name'],
+        'warnings': warnings if warnings else None
+    }
+
+
+def _run_predict(report, model_name, front_bytes, side_bytes, content):
+    """Job body for /jobs/predict: segment, then measure"""
+    inference = _resolve_model(model_name)
+    
+    front_mask, side_mask = image_processor.process_pair(
+        front_bytes, side_bytes, Config.IMG_SIZE, content
+    )
+    report('segmented')
+    
+    measurements = inference.predict_masks(front_mask, side_mask)
+    report('measured')
+    
+    return _measurement_result(inference, measurements)
+
+
+def _run_complete_analysis(report, model_name, front_bytes, side_bytes):
+    """Job body for /jobs/complete-analysis: measure the uploaded masks"""
+    inference = _resolve_model(model_name)
+    
+    measurements = inference.predict(front_bytes, side_bytes)
+    report('measured')
+    
+    return _measurement_result(inference, measurements)
+
+
+def _read_pair():
+    """Validated (front_bytes, side_bytes, model_name) from a multipart request"""
+    check_content_length(request, 2 * Config.MAX_FILE_SIZE)
+    
+    if 'front_image' not in request.files or 'side_image' not in request.files:
+        raise ValueError("Missing front_image or side_image files")
+    
+    front_file = request.files['front_image']
+    side_file = request.files['side_image']
+    
+    if not allowed_file(front_file.filename) or not allowed_file(side_file.filename):
+        raise ValueError("Invalid file type. Allowed: png, jpg, jpeg")
+    
+    model_name = get_requested_model(request)
+    if model_name is not None and model_name not in Config.MODELS:
+        raise ValueError(f"Model '{model_name}' not found. Available: {list(Config.MODELS.keys())}")
+    
+    return read_upload(front_file), read_upload(side_file), model_name
+
+
+def _accepted(job):
+    """202 response pointing at the status and event stream URLs"""
+    job['status_url'] = f"/jobs/{job['job_id']}"
+    job['events_url'] = f"/jobs/{job['job_id']}/events"
+    body, _ = create_success_response(job, "Job accepted")
+    return body, 202, {'Location': job['status_url']}
+
+
+@job_bp.route('/jobs/predict', methods=['POST'])
+def submit_predict():
+    """Queue segmentation + measurement (asynchronous /predict)"""
+    if job_manager is None or model_inference is None:
+        return create_error_response("Model not loaded", 500)
+    
+    try:
+        front_bytes, side_bytes, model_name = _read_pair()
+        content = get_content_hint(request)
+    except RequestEntityTooLarge as e:
+        return create_error_response(e.description, 413)
+    except ValueError as e:
+        return create_error_response(str(e), 400)
+    
+    try:
+        job = job_manager.submit('predict', _run_predict, model_name, front_bytes, side_bytes, content)
+    except Overloaded as e:
+        return create_overload_response(str(e), e.status_code, e.retry_after)
+    
+    logger.info(f"📥 Queued predict job {job['job_id']}")
+    return _accepted(job)
+
+
+@job_bp.route('/jobs/complete-analysis', methods=['POST'])
+def submit_complete_analysis():
+    """Queue a measurement of uploaded masks (asynchronous /complete-analysis)"""
+    if job_manager is None or model_inference is None:
+        return create_error_response("Model not loaded", 500)
+    
+    try:
+        front_bytes, side_bytes, model_name = _read_pair()
+    except RequestEntityTooLarge as e:
+        return create_error_response(e.description, 413)
+    except ValueError as e:
+        return create_error_response(str(e), 400)
+    
+    try:
+        job = job_manager.submit('complete-analysis', _run_complete_analysis, model_name, front_bytes, side_bytes)
+    except Overloaded as e:
+        return create_overload_response(str(e), e.status_code, e.retry_after)
+    
+    logger.info(f"📥 Queued complete-analysis job {job['job_id']}")
+    return _accepted(job)
+
+
+@job_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Poll a job: status, current stage and (once completed) the result"""
+    if job_manager is None:
+        return create_error_response("Job manager not initialized", 500)
+    
+    job = job_manager.get(job_id)
+    if job is None:
+        return create_error_response("Job not found or expired", 404)
+    
+    return create_success_response(job, f"Job {job['status']}")
+
+
+@job_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events stream of stage updates, closed after completed/failed"""
+    if job_manager is None:
+        return create_error_response("Job manager not initialized", 500)
+    
+    if job_manager.get(job_id) is None:
+        return create_error_response("Job not found or expired", 404)
+    
+    # Reconnecting EventSource clients resume after the last event they saw
+    # (ids start at 1, so anything below 1 means "from the beginning")
+    try:
+        after = max(0, int(request.headers.get('Last-Event-ID') or request.args.get('after', 0)))
+    except ValueError:
+        after = 0
+    
+    def stream():
+        seen = after
+        while True:
+            events, done = job_manager.wait_for_events(job_id, seen, SSE_KEEPALIVE_S)
+            if events is None:
+                yield "event: expired\ndata: {}\n\n"
+                return
+            
+            if not events and not done:
+                yield ": keep-alive\n\n"
+                continue
+            
+            for event in events:
+                seen = event['id']
+                yield f"id: {event['id']}\nevent: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+            
+            if done:
+                return
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@job_bp.route('/jobs', methods=['GET'])
+def job_stats():
+    """Worker pool size, retention settings and job counts"""
+    if job_manager is None:
+        return create_error_response("Job manager not initialized", 500)
+    
+    return create_success_response(job_manager.get_stats(), "Job statistics retrieved")
@@ -1,15 +1,28 @@
 from flask import Blueprint, request
+from werkzeug.exceptions import RequestEntityTooLarge
 import logging
+import zipfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
 from utils import (
     allowed_file, 
     decode_base64_image, 
+    extract_image_pairs,
+    get_requested_model,
+    get_content_hint,
+    get_request_timeout,
+    check_content_length,
+    read_upload,
+    mask_to_tensor,
     format_measurements,
     validate_measurements,
     create_error_response,
+    create_overload_response,
     create_success_response
 )
 from core.config import Config
+from services.admission_service import admission, Overloaded, INTERACTIVE, BATCH
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +32,24 @@ model_bp = Blueprint('model', __name__)
 # These will be set when blueprint is registered
 model_inference = None
 image_processor = None
+model_pool = None
+model_switch = None
 
 
-def init_model_routes(inference, img_processor):
+def init_model_routes(inference, img_processor, pool=None, switch_broadcast=None):
     """Initialize route dependencies"""
-    global model_inference, image_processor
+    global model_inference, image_processor, model_pool, model_switch
     model_inference = inference
     image_processor = img_processor
+    model_pool = pool
+    model_switch = switch_broadcast
+
+
+def _select_model():
+    """Model for this request (?model= / X-Model header), default model otherwise"""
+    if model_pool is None:
+        return model_inference
+    return model_pool.get(get_requested_model(request))
 
 
 @model_bp.route('/model-info', methods=['GET'])
@@ -38,12 +62,67 @@ def model_info():
     info = model_inference.get_model_info()
     info['current_model'] = model_inference.model_name
     info['available_models'] = ModelInference.get_available_models()
+    if model_switch is not None:
+        info['worker_switch'] = model_switch.get_status()
     return create_success_response(info, "Model information retrieved")
 
 
+@model_bp.route('/batching-stats', methods=['GET'])
+def batching_stats():
+    """Get micro-batching queue depth and batch-size statistics"""
+    if model_inference is None:
+        return create_error_response("Model not loaded", 500)
+    
+    return create_success_response(
+        model_inference.get_batching_stats(),
+        "Batching statistics retrieved"
+    )
+
+
+@model_bp.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Get mask and measurement result cache hit/miss counters"""
+    if image_processor is None or model_inference is None:
+        return create_error_response("Services not initialized", 500)
+    
+    return create_success_response(
+        {
+            'mask_cache': image_processor.get_cache_stats(),
+            'result_cache': model_inference.get_cache_stats()
+        },
+        "Cache statistics retrieved"
+    )
+
+
+@model_bp.route('/admission-stats', methods=['GET'])
+def admission_stats():
+    """Get per-stage concurrency and per-priority queue wait and rejection counters"""
+    return create_success_response(admission.get_stats(), "Admission statistics retrieved")
+
+
+@model_bp.route('/cpu-budget', methods=['GET'])
+def cpu_budget():
+    """Get the CPU split between segmentation and measurement (and autotune results)"""
+    from core.resources import resource_manager
+    
+    stats = resource_manager.get_stats()
+    if image_processor is not None and image_processor.session_pool is not None:
+        stats['segmentation_pool'] = image_processor.session_pool.get_stats()
+    return create_success_response(stats, "CPU budget retrieved")
+
+
+@model_bp.route('/model-pool', methods=['GET'])
+def model_pool_stats():
+    """Get resident models, their memory use and hit counts"""
+    if model_pool is None:
+        return create_error_response("Model pool not enabled", 404)
+    
+    return create_success_response(model_pool.get_stats(), "Model pool statistics retrieved")
+
+
 @model_bp.route('/switch-model', methods=['POST'])
 def switch_model():
-    """Switch to a different model without restarting"""
+    """Switch to a different model without restarting (loads in background)"""
     if model_inference is None:
         return create_error_response("Model not initialized", 500)
     
@@ -54,18 +133,62 @@ def switch_model():
         if not new_model:
             return create_error_response("model_name is required", 400)
         
-        result = model_inference.switch_model(new_model)
-        logger.info(f"✅ Switched to model: {new_model}")
+        # Default is non-blocking: poll /model-info for progress
+        wait = bool(data.get('wait', False))
+        if model_switch is not None:
+            return _switch_all_workers(new_model, wait)
+        
+        result = model_inference.switch_model(new_model, wait=wait)
         
+        if result['status'] == 'failed':
+            return create_error_response(result['message'], 500)
+        
+        if result['status'] == 'switching':
+            logger.info(f"🔄 Switching to model in background: {new_model}")
+            body, _ = create_success_response(result, f"Switching to {new_model}")
+            return body, 202
+        
+        logger.info(f"✅ Switched to model: {new_model}")
         return create_success_response(result, f"Successfully switched to {new_model}")
         
     except ValueError as e:
         return create_error_response(str(e), 400)
+    except RuntimeError as e:
+        return create_error_response(str(e), 409)
     except Exception as e:
         logger.error(f"❌ Error switching model: {e}")
         return create_error_response(f"Failed to switch model: {str(e)}", 500)
 
 
+def _switch_all_workers(new_model, wait):
+    """/switch-model under serve.py: every worker loads the new model, not only this one"""
+    if new_model not in Config.MODELS:
+        raise ValueError(f"Model '{new_model}' not found. Available: {list(Config.MODELS.keys())}")
+    
+    request_id = model_switch.publish(new_model)
+    if not wait:
+        logger.info(f"🔄 Switching all workers to model in background: {new_model}")
+        body, _ = create_success_response(
+            {'status': 'switching', 'model': new_model, 'request_id': request_id},
+            f"Switching all workers to {new_model}"
+        )
+        return body, 202
+    
+    done, acks = model_switch.wait(request_id, Config.MODEL_SWITCH_TIMEOUT_S)
+    failed = [ack for ack in acks.values() if ack is not None and ack['status'] == 'failed']
+    if failed:
+        return create_error_response(failed[0]['message'], 500)
+    if not done:
+        pending = [slot for slot, ack in acks.items() if ack is None]
+        return create_error_response(f"Workers {pending} have not switched to {new_model} yet", 504)
+    
+    logger.info(f"✅ Switched all workers to model: {new_model}")
+    return create_success_response(
+        {'status': 'success', 'model': new_model, 'workers': acks},
+        f"Successfully switched all workers to {new_model}"
+    )
+
+
 @model_bp.route('/predict', methods=['POST'])
 def predict():
     """Predict body measurements from images"""
@@ -73,55 +196,240 @@ def predict():
         if model_inference is None:
             return create_error_response("Model not loaded", 500)
         
-        # Get images from request
-        if request.is_json:
-            data = request.get_json()
-            
-            if 'front_image' not in data or 'side_image' not in data:
-                return create_error_response("Missing front_image or side_image", 400)
-            
-            try:
-                front_bytes = decode_base64_image(data['front_image'])
-                side_bytes = decode_base64_image(data['side_image'])
-            except Exception as e:
-                return create_error_response(f"Invalid image format: {str(e)}", 400)
-        
-        else:
-            if 'front_image' not in request.files or 'side_image' not in request.files:
-                return create_error_response("Missing front_image or side_image files", 400)
-            
-            front_file = request.files['front_image']
-            side_file = request.files['side_image']
-            
-            if not allowed_file(front_file.filename) or not allowed_file(side_file.filename):
-                return create_error_response("Invalid file type. Allowed: png, jpg, jpeg", 400)
+        try:
+            inference = _select_model()
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+        
+        try:
+            timeout = get_request_timeout(request)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+        
+        # Segmentation and inference wait for free slots up to the request deadline,
+        # behind interactive previews
+        with admission.request_scope(timeout, BATCH):
+            # Get images from request
+            if request.is_json:
+                data = request.get_json()
+                
+                if 'front_image' not in data or 'side_image' not in data:
+                    return create_error_response("Missing front_image or side_image", 400)
+                
+                try:
+                    front_bytes = decode_base64_image(data['front_image'])
+                    side_bytes = decode_base64_image(data['side_image'])
+                except Exception as e:
+                    return create_error_response(f"Invalid image format: {str(e)}", 400)
+                
+                # Run inference (base64 uploads are already masks)
+                measurements = inference.predict(front_bytes, side_bytes)
             
-            front_bytes_raw = front_file.read()
-            side_bytes_raw = side_file.read()
-
-            logger.info("🔄 Processing images to create body masks...")
-            front_bytes = image_processor.process_image(front_bytes_raw, Config.IMG_SIZE)
-            side_bytes = image_processor.process_image(side_bytes_raw, Config.IMG_SIZE)
-            logger.info("✅ Masks created successfully")
+            else:
+                if 'front_image' not in request.files or 'side_image' not in request.files:
+                    return create_error_response("Missing front_image or side_image files", 400)
+                
+                front_file = request.files['front_image']
+                side_file = request.files['side_image']
+                
+                if not allowed_file(front_file.filename) or not allowed_file(side_file.filename):
+                    return create_error_response("Invalid file type. Allowed: png, jpg, jpeg", 400)
+                
+                try:
+                    content = get_content_hint(request)
+                except ValueError as e:
+                    return create_error_response(str(e), 400)
+                
+                front_bytes_raw = front_file.read()
+                side_bytes_raw = side_file.read()
+                
+                logger.info("🔄 Processing images to create body masks...")
+                front_mask, side_mask = image_processor.process_pair(
+                    front_bytes_raw, side_bytes_raw, Config.IMG_SIZE, content
+                )
+                logger.info("✅ Masks created successfully")
+                
+                # Run inference (masks stay in memory, no PNG round-trip)
+                measurements = inference.predict_masks(front_mask, side_mask)
         
-        # Run inference
-        measurements = model_inference.predict(front_bytes, side_bytes)
         warnings = validate_measurements(measurements)
         formatted_measurements = format_measurements(measurements)
         
         response_data = {
             'measurements': formatted_measurements,
-            'model': model_inference.model_config['name'],
+            'model': inference.model_config['name'],
             'warnings': warnings if warnings else None
         }
         
         return create_success_response(response_data, "Measurements predicted successfully")
     
+    except Overloaded as e:
+        return create_overload_response(str(e), e.status_code, e.retry_after)
     except Exception as e:
         logger.error(f"❌ Error in /predict: {str(e)}")
         return create_error_response(f"Prediction error: {str(e)}", 500)
 
 
+def _prepare_pair(front_bytes_raw, side_bytes_raw, channels=3, content=None):
+    """Segment (both views in one AI run) and preprocess a front/side pair into model tensors"""
+    front_mask, side_mask = image_processor.segment_images(
+        [front_bytes_raw, side_bytes_raw], Config.IMG_SIZE, content
+    )
+    return (
+        mask_to_tensor(front_mask, Config.IMG_SIZE, channels=channels),
+        mask_to_tensor(side_mask, Config.IMG_SIZE, channels=channels)
+    )
+
+
+def _collect_batch_pairs():
+    """Read (item_id, front_bytes, side_bytes, error) tuples from the request"""
+    if 'archive' in request.files:
+        return extract_image_pairs(read_upload(request.files['archive'], Config.MAX_BATCH_UPLOAD))
+    
+    front_files = request.files.getlist('front_images')
+    side_files = request.files.getlist('side_images')
+    
+    if len(front_files) != len(side_files):
+        raise ValueError("front_images and side_images must have the same number of files")
+    if len(front_files) > Config.MAX_BATCH_ITEMS:
+        raise ValueError(f"Too many pairs: {len(front_files)} (max {Config.MAX_BATCH_ITEMS})")
+    
+    pairs = []
+    total = 0
+    for index, (front_file, side_file) in enumerate(zip(front_files, side_files)):
+        item_id = front_file.filename or str(index)
+        
+        if not allowed_file(front_file.filename) or not allowed_file(side_file.filename):
+            pairs.append((item_id, None, None, "Invalid file type. Allowed: png, jpg, jpeg"))
+            continue
+        
+        try:
+            front_bytes, side_bytes = read_upload(front_file), read_upload(side_file)
+        except RequestEntityTooLarge as e:
+            pairs.append((item_id, None, None, e.description))
+            continue
+        
+        # Chunked uploads have no Content-Length to check up front
+        total += len(front_bytes) + len(side_bytes)
+        if total > Config.MAX_BATCH_UPLOAD:
+            raise RequestEntityTooLarge(
+                f"Uploaded images are larger than {Config.MAX_BATCH_UPLOAD // (1024 * 1024)} MB"
+            )
+        pairs.append((item_id, front_bytes, side_bytes, None))
+    
+    return pairs
+
+
+@model_bp.route('/predict-batch', methods=['POST'])
+def predict_batch():
+    """Predict body measurements for many front/side pairs in one request"""
+    try:
+        if model_inference is None:
+            return create_error_response("Model not loaded", 500)
+        
+        try:
+            inference = _select_model()
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+        
+        try:
+            # Checked before the form is parsed, so an oversized body is never spooled
+            check_content_length(request, Config.MAX_BATCH_UPLOAD)
+            content = get_content_hint(request)
+            pairs = _collect_batch_pairs()
+            timeout = get_request_timeout(request)
+        except RequestEntityTooLarge as e:
+            return create_error_response(e.description, 413)
+        except zipfile.BadZipFile:
+            return create_error_response("Invalid zip archive", 400)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+        
+        if not pairs:
+            return create_error_response(
+                "No image pairs found. Send front_images/side_images files or a zip archive", 400
+            )
+        
+        if len(pairs) > Config.MAX_BATCH_ITEMS:
+            return create_error_response(
+                f"Too many pairs: {len(pairs)} (max {Config.MAX_BATCH_ITEMS})", 400
+            )
+        
+        results = [
+            {'id': item_id, 'success': False, 'error': error}
+            for item_id, _, _, error in pairs
+        ]
+        
+        # A batch has a deadline too (the longest one a client may ask for, unless it sets
+        # its own); each segmentation thread runs in a copy of this request's context
+        with admission.request_scope(timeout or Config.REQUEST_TIMEOUT_MAX_S, BATCH):
+            # Segment all pairs concurrently; failures stay local to their item
+            logger.info(f"🔄 Processing {len(pairs)} image pairs...")
+            ready = []
+            with ThreadPoolExecutor(max_workers=Config.SEGMENTATION_WORKERS) as executor:
+                futures = [
+                    (index, executor.submit(
+                        contextvars.copy_context().run,
+                        _prepare_pair, front_bytes, side_bytes, inference.input_channels, content
+                    ))
+                    for index, (_, front_bytes, side_bytes, error) in enumerate(pairs)
+                    if error is None
+                ]
+                for index, future in futures:
+                    try:
+                        front_img, side_img = future.result()
+                        ready.append((index, front_img, side_img))
+                    except Overloaded:
+                        raise
+                    except Exception as e:
+                        results[index]['error'] = f"Image processing error: {str(e)}"
+            
+            # Batched inference in chunks
+            chunk_size = Config.BATCH_MAX_SIZE
+            for start in range(0, len(ready), chunk_size):
+                chunk = ready[start:start + chunk_size]
+                
+                try:
+                    with admission.limit('inference'):
+                        batch_measurements = inference.predict_batch(
+                            [front_img for _, front_img, _ in chunk],
+                            [side_img for _, _, side_img in chunk]
+                        )
+                except Overloaded:
+                    raise
+                except Exception as e:
+                    logger.error(f"❌ Batch chunk failed: {str(e)}")
+                    for index, _, _ in chunk:
+                        results[index]['error'] = f"Prediction error: {str(e)}"
+                    continue
+                
+                for (index, _, _), measurements in zip(chunk, batch_measurements):
+                    warnings = validate_measurements(measurements)
+                    results[index].update({
+                        'success': True,
+                        'error': None,
+                        'measurements': format_measurements(measurements),
+                        'warnings': warnings if warnings else None
+                    })
+            
+            succeeded = sum(1 for result in results if result['success'])
+            logger.info(f"✅ Batch complete: {succeeded}/{len(results)} succeeded")
+            
+            return create_success_response({
+                'results': results,
+                'total': len(results),
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded,
+                'model': inference.model_config['name']
+            }, f"Predicted measurements for {succeeded}/{len(results)} pairs")
+    
+    except Overloaded as e:
+        return create_overload_response(str(e), e.status_code, e.retry_after)
+    except Exception as e:
+        logger.error(f"❌ Error in /predict-batch: {str(e)}")
+        return create_error_response(f"Batch prediction error: {str(e)}", 500)
+
+
 @model_bp.route('/preview-mask', methods=['POST'])
 def preview_mask():
     """Preview the mask that will be generated from uploaded image"""
@@ -134,8 +442,20 @@ def preview_mask():
         if not allowed_file(image_file.filename):
             return create_error_response("Invalid file type", 400)
         
+        try:
+            content = get_content_hint(request)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+        
+        try:
+            timeout = get_request_timeout(request)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+        
         image_bytes = image_file.read()
-        result = image_processor.process_and_preview(image_bytes, Config.IMG_SIZE)
+        # User-facing: served ahead of queued /predict work
+        with admission.request_scope(timeout, INTERACTIVE):
+            result = image_processor.process_and_preview(image_bytes, Config.IMG_SIZE, content)
         
         import base64
         preview_base64 = base64.b64encode(result['preview_bytes']).decode('utf-8')
@@ -146,6 +466,8 @@ def preview_mask():
             'mask': f"data:image/png;base64,{mask_base64}"
         }, "Preview generated")
     
+    except Overloaded as e:
+        return create_overload_response(str(e), e.status_code, e.retry_after)
     except Exception as e:
         logger.error(f"❌ Error in /preview-mask: {str(e)}")
         return create_error_response(f"Preview error: {str(e)}", 500)
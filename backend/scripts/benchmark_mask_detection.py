@@ -0,0 +1,84 @@
+"""
+Benchmark ImageProcessor.is_already_mask against the previous full-resolution check
+
+Usage:
+    python scripts/benchmark_mask_detection.py
+    python scripts/benchmark_mask_detection.py --images photo.jpg mask.png --repeats 20
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.image_service import image_processor
+
+
+def legacy_is_already_mask(img):
+    """Previous implementation: np.unique + calcHist over every pixel"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if len(img.shape) == 3 else img
+    if len(np.unique(gray)) <= 5:
+        return True
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).flatten()
+    hist = hist / hist.sum()
+    return (hist[0:30].sum() + hist[226:256].sum()) > 0.85
+
+
+def synthetic_images():
+    """12MP photo-like image, 12MP anti-aliased mask and a model-size mask"""
+    rng = np.random.default_rng(0)
+    photo = cv2.GaussianBlur(rng.integers(0, 256, (4000, 3000, 3), dtype=np.uint8), (5, 5), 0)
+
+    mask = np.zeros((4000, 3000), np.uint8)
+    cv2.ellipse(mask, (1500, 2000), (500, 1600), 0, 0, 360, 255, -1, lineType=cv2.LINE_AA)
+    mask = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
+
+    return {
+        'photo 3000x4000': photo,
+        'mask 3000x4000': mask,
+        'mask 384x512': cv2.resize(mask, (384, 512), interpolation=cv2.INTER_NEAREST),
+    }
+
+
+def best_ms(fn, repeats):
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = fn()
+            timings.append((time.perf_counter() - started) * 1000)
+    return result, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mask detection benchmark")
+    parser.add_argument('--images', nargs='*', help="Image files (default: synthetic 12MP images)")
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.images:
+        images = {Path(path).name: cv2.imread(path, cv2.IMREAD_COLOR) for path in args.images}
+    else:
+        images = synthetic_images()
+
+    print(f"\n{'image':<20} {'legacy':>10} {'subsampled':>11} {'hint':>8} {'speedup':>8}  agree")
+    for name, img in images.items():
+        legacy, legacy_ms = best_ms(lambda: legacy_is_already_mask(img), args.repeats)
+        fast, fast_ms = best_ms(lambda: image_processor.is_already_mask(img), args.repeats)
+        hint = 'mask' if fast else 'photo'
+        _, hint_ms = best_ms(lambda: image_processor.is_already_mask(img, content=hint), args.repeats)
+
+        print(f"{name:<20} {legacy_ms:>8.2f}ms {fast_ms:>9.2f}ms {hint_ms:>6.3f}ms "
+              f"{legacy_ms / fast_ms:>7.1f}x  {'✅' if legacy == fast else '❌'}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
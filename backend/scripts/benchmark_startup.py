@@ -0,0 +1,53 @@
+"""
+Measure model startup time and peak RSS in a fresh process
+
+Usage:
+    python scripts/benchmark_startup.py model_v1 [--runs 3]
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, {backend!r})
+from services.model_service import ModelInference
+started = time.perf_counter()
+inference = ModelInference(model_name={model!r}, device='cpu')
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'startup_s': round(elapsed, 3),
+    'load_time_ms': inference.load_time_ms,
+    'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model startup time / peak RSS benchmark")
+    parser.add_argument('model', nargs='?', default='model_v1')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    code = CHILD.format(backend=str(BACKEND_DIR), model=args.model)
+    results = []
+
+    for run in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"Run {run + 1}: {result['startup_s']}s total, model load {result['load_time_ms']} ms, "
+              f"peak RSS {result['peak_rss_mb']} MB")
+
+    best = min(results, key=lambda r: r['startup_s'])
+    print(f"\n✅ Best of {args.runs}: {best['startup_s']}s, peak RSS {min(r['peak_rss_mb'] for r in results)} MB")
+
+
+if __name__ == '__main__':
+    main()
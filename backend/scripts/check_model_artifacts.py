@@ -0,0 +1,220 @@
+"""
+Offline check of model artifact fetching (services/hf_service.py)
+
+Builds a fake hub in a temporary directory, serves it through
+LocalDirectorySource and runs the download manager through interrupted,
+truncated and corrupted downloads. No network or real checkpoints needed.
+
+Usage:
+    python scripts/check_model_artifacts.py
+    python scripts/check_model_artifacts.py --size-mb 8 --keep /tmp/artifacts
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.hf_service import HuggingFaceModelManager, LocalDirectorySource, file_sha256, MANIFEST_FILE
+
+
+class FlakySource(LocalDirectorySource):
+    """Drops the connection after a few chunks"""
+
+    def read(self, filename, offset=0):
+        for index, chunk in enumerate(super().read(filename, offset)):
+            if index == 2:
+                raise ConnectionError('connection dropped')
+            yield chunk
+
+
+class OfflineSource(LocalDirectorySource):
+    """Hub that can't be reached: describe() times out"""
+
+    def describe(self, filename):
+        time.sleep(1)
+        raise ConnectionError('hub unreachable')
+
+
+def _fetch_in_process(models_dir, source_dir, model_key, results):
+    manager = HuggingFaceModelManager(models_dir, LocalDirectorySource(source_dir))
+    results.put(str(manager.download_model(model_key)))
+
+
+def run_checks(root, size_mb):
+    source_dir, models_dir = root / 'hub', root / 'models'
+    source_dir.mkdir(parents=True)
+    files = [info['filename'] for info in HuggingFaceModelManager.AVAILABLE_MODELS.values()]
+    for index, filename in enumerate(files):
+        (source_dir / filename).write_bytes(os.urandom(int((size_mb + index) * 1024 * 1024) + 123))
+
+    manager = HuggingFaceModelManager(models_dir, LocalDirectorySource(source_dir))
+
+    def matches(filename):
+        path = models_dir / filename
+        return path.exists() and file_sha256(path) == file_sha256(source_dir / filename)
+
+    def drop_manifest_entry(filename):
+        manifest = json.loads((models_dir / MANIFEST_FILE).read_text())
+        del manifest['files'][filename]
+        (models_dir / MANIFEST_FILE).write_text(json.dumps(manifest))
+
+    first, second, third = files
+    checks = []
+
+    def check(name, fn):
+        try:
+            ok, detail = fn()
+        except Exception as e:
+            ok, detail = False, f"{type(e).__name__}: {e}"
+        checks.append({'check': name, 'ok': ok, 'detail': detail})
+        print(f"{'✅' if ok else '❌'} {name}: {detail}")
+
+    def concurrent_download():
+        started = time.perf_counter()
+        results = manager.download_models()
+        failed = {key: str(result) for key, result in results.items() if isinstance(result, Exception)}
+        parts = list(models_dir.glob('*.part'))
+        ok = not failed and not parts and all(matches(f) for f in files)
+        return ok, f"{len(results)} files in {time.perf_counter() - started:.2f}s, failed={failed}, parts={len(parts)}"
+
+    def resume_good_partial():
+        (models_dir / first).unlink()
+        (models_dir / f"{first}.part").write_bytes((source_dir / first).read_bytes()[:2_000_000])
+        manager.download_model('model_v1')
+        return matches(first), "resumed from 2 MB"
+
+    def restart_bad_partial():
+        (models_dir / first).unlink()
+        (models_dir / f"{first}.part").write_bytes(os.urandom(2_000_000))
+        manager.download_model('model_v1')
+        return matches(first), "bad partial discarded after hash mismatch"
+
+    def truncated_with_entry():
+        with open(models_dir / first, 'r+b') as f:
+            f.truncate(1000)
+        exists = manager.check_model_exists('model_v1')
+        path = manager.download_model('model_v1')
+        return not exists and matches(first), f"check_model_exists={exists}, returned {path.stat().st_size} bytes"
+
+    def truncated_legacy():
+        drop_manifest_entry(second)
+        with open(models_dir / second, 'r+b') as f:
+            f.truncate(100)
+        path = manager.download_model('model_v2')
+        size = path.stat().st_size  # what ModelInference would load
+        return size == (source_dir / second).stat().st_size and matches(second), f"returned {size} bytes"
+
+    def corrupt_legacy():
+        drop_manifest_entry(second)
+        size = (models_dir / second).stat().st_size
+        (models_dir / second).write_bytes(os.urandom(size))
+        thread = manager.verify_in_background([second])
+        thread.join(30)
+        quarantined = (models_dir / f"{second}.corrupt").exists() and not (models_dir / second).exists()
+        manager.download_model('model_v2')
+        return quarantined and matches(second), "moved aside by background hash, re-downloaded"
+
+    def hash_mismatch():
+        (models_dir / third).unlink()
+        size = (source_dir / third).stat().st_size
+        (source_dir / MANIFEST_FILE).write_text(json.dumps({'files': {third: {'size': size, 'sha256': '0' * 64}}}))
+        try:
+            manager.download_model('model_v3')
+            return False, "download accepted a file with the wrong sha256"
+        except RuntimeError:
+            return not (models_dir / third).exists(), "rejected, nothing placed in models_dir"
+        finally:
+            (source_dir / MANIFEST_FILE).unlink()
+
+    def offline_legacy():
+        drop_manifest_entry(first)
+        offline = HuggingFaceModelManager(models_dir, OfflineSource(source_dir))
+        timings = []
+        for _ in range(2):
+            started = time.perf_counter()
+            offline.download_model('model_v1')
+            timings.append(time.perf_counter() - started)
+        recorded = json.loads((models_dir / MANIFEST_FILE).read_text())['files'][first]
+        verified = manager.verify(first)
+        entry = json.loads((models_dir / MANIFEST_FILE).read_text())['files'][first]
+        ok = timings[1] < 0.5 and recorded.get('checked') is False and verified and 'checked' not in entry
+        return ok, f"loads took {timings[0]:.2f}s then {timings[1]:.2f}s, confirmed once the source was back"
+
+    def interrupted_transfer():
+        flaky = HuggingFaceModelManager(models_dir, FlakySource(source_dir))
+        try:
+            flaky.download_model('model_v3')
+            return False, "flaky download did not fail"
+        except RuntimeError:
+            kept = (models_dir / f"{third}.part").stat().st_size
+        manager.download_model('model_v3')
+        return kept > 0 and matches(third), f"{kept} bytes kept in .part, resumed"
+
+    def concurrent_processes():
+        (models_dir / third).unlink()
+        results = multiprocessing.get_context('fork').Queue()
+        processes = [
+            multiprocessing.get_context('fork').Process(
+                target=_fetch_in_process, args=(models_dir, source_dir, 'model_v3', results)
+            )
+            for _ in range(3)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+        codes = [process.exitcode for process in processes]
+        return codes == [0, 0, 0] and matches(third), f"exit codes {codes}"
+
+    check('concurrent download', concurrent_download)
+    check('resume from partial', resume_good_partial)
+    check('restart from bad partial', restart_bad_partial)
+    check('truncated file with manifest entry', truncated_with_entry)
+    check('truncated file without manifest entry', truncated_legacy)
+    check('corrupt file without manifest entry', corrupt_legacy)
+    check('offline file without manifest entry', offline_legacy)
+    check('sha256 mismatch', hash_mismatch)
+    check('interrupted transfer', interrupted_transfer)
+    if hasattr(os, 'fork'):
+        check('three processes, one file', concurrent_processes)
+
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline check of model artifact downloads')
+    parser.add_argument('--size-mb', type=float, default=3, help='Size of the fake checkpoints')
+    parser.add_argument('--keep', help='Run in this directory and keep it (default: a temporary one)')
+    parser.add_argument('--verbose', action='store_true', help='Show the download manager logs')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.CRITICAL,
+        format='%(threadName)s - %(message)s'
+    )
+
+    root = Path(args.keep) if args.keep else Path(tempfile.mkdtemp(prefix='model-artifacts-'))
+    if args.keep and root.exists():
+        shutil.rmtree(root)
+    try:
+        checks = run_checks(root, args.size_mb)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    failed = [c['check'] for c in checks if not c['ok']]
+    print(f"\n{len(checks) - len(failed)}/{len(checks)} checks passed")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Export body measurement checkpoints to ONNX and verify parity with PyTorch
+
+Usage:
+    python scripts/export_onnx.py                 # all models in Config.MODELS
+    python scripts/export_onnx.py model_v2 --force
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.config import Config
+from services.model_service import ModelInference
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export models to ONNX")
+    parser.add_argument('models', nargs='*', default=list(Config.MODELS.keys()))
+    parser.add_argument('--force', action='store_true', help="Re-export even if the graph is up to date")
+    args = parser.parse_args()
+
+    Config.MODEL_BACKEND = 'onnx'
+    failed = []
+
+    for model_name in args.models:
+        if args.force:
+            for suffix in ('', '_gray'):
+                (Config.ONNX_DIR / f"{model_name}{suffix}.onnx").unlink(missing_ok=True)
+
+        print(f"\n📦 {model_name}")
+        try:
+            inference = ModelInference(model_name=model_name, device='cpu')
+        except Exception as e:
+            print(f"❌ Export failed: {e}")
+            failed.append(model_name)
+            continue
+
+        suffix = '_gray' if inference.input_channels == 1 else ''
+        onnx_path = Config.ONNX_DIR / f"{model_name}{suffix}.onnx"
+        parity = inference.onnx_parity
+        status = "✅" if parity['passed'] else "❌"
+        print(f"{status} {onnx_path} max diff {parity['max_abs_diff']:.2e} "
+              f"(mean {parity['mean_abs_diff']:.2e}, atol {parity['atol']:.0e})")
+        if not parity['passed']:
+            failed.append(model_name)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Check that grayscale-stem models (GRAYSCALE_STEM=True) match the RGB path
+
+Loads each model twice - 3-channel replicated RGB input and folded
+1-channel stems - and compares measurements (cm) on the same masks.
+
+Usage:
+    python scripts/grayscale_parity.py                  # all models
+    python scripts/grayscale_parity.py model_v2 --atol 0.01
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.config import Config
+from services.model_service import ModelInference
+from utils.image_utils import mask_to_tensor, allowed_file
+
+
+def load_masks(count):
+    """Calibration masks if available, otherwise synthetic silhouettes"""
+    masks = []
+    if Config.QUANT_CALIBRATION_DIR.is_dir():
+        for path in sorted(Config.QUANT_CALIBRATION_DIR.rglob('*')):
+            if path.is_file() and allowed_file(path.name):
+                mask = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+                if mask is not None:
+                    masks.append(mask)
+            if len(masks) >= count:
+                return masks
+
+    height, width = Config.IMG_SIZE
+    rng = np.random.default_rng(0)
+    while len(masks) < count:
+        mask = np.zeros((height, width), np.uint8)
+        center = (int(rng.integers(width // 3, 2 * width // 3)), height // 2)
+        axes = (int(rng.integers(width // 8, width // 4)), int(rng.integers(height // 4, height // 2 - 8)))
+        cv2.ellipse(mask, center, axes, 0, 0, 360, 255, -1)
+        masks.append(mask)
+    return masks
+
+
+def run(inference, masks):
+    """Measurements (N, 14) in cm and median batch latency (ms)"""
+    channels = inference.input_channels
+    batch = torch.stack([mask_to_tensor(mask, Config.IMG_SIZE, channels=channels) for mask in masks])
+
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        results = inference.predict_batch(batch, batch.flip(-1))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    values = np.array([[row[col] for col in Config.MEASUREMENT_COLUMNS] for row in results])
+    return values, sorted(timings)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grayscale stem parity check")
+    parser.add_argument('models', nargs='*', default=list(Config.MODELS.keys()))
+    parser.add_argument('--samples', type=int, default=8)
+    parser.add_argument('--atol', type=float, default=0.01, help="Max allowed difference (cm)")
+    args = parser.parse_args()
+
+    Config.MODEL_BACKEND = 'torch'
+    Config.MICRO_BATCHING = False
+    Config.RESULT_CACHE_ENABLED = False
+    masks = load_masks(args.samples)
+    failed = []
+
+    for model_name in args.models:
+        print(f"\n🔬 {model_name}")
+        try:
+            Config.GRAYSCALE_STEM = False
+            rgb_values, rgb_ms = run(ModelInference(model_name=model_name, device='cpu'), masks)
+
+            Config.GRAYSCALE_STEM = True
+            gray_inference = ModelInference(model_name=model_name, device='cpu')
+            if gray_inference.input_channels != 1:
+                raise RuntimeError("grayscale stem was not applied (see log above)")
+            gray_values, gray_ms = run(gray_inference, masks)
+        except Exception as e:
+            print(f"❌ Failed: {e}")
+            failed.append(model_name)
+            continue
+
+        max_diff = float(np.abs(rgb_values - gray_values).max())
+        status = "✅" if max_diff <= args.atol else "❌"
+        print(f"{status} max diff {max_diff:.2e} cm over {len(masks)} masks "
+              f"(RGB {rgb_ms:.1f} ms, grayscale {gray_ms:.1f} ms per batch)")
+        if max_diff > args.atol:
+            failed.append(model_name)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
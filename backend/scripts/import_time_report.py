@@ -0,0 +1,140 @@
+"""
+Summarize `python -X importtime` for each deployment role
+
+Each role's imports run in a fresh interpreter. The report shows the total
+import time, the packages that cost the most, and any heavy package the
+role is not supposed to load (e.g. torch in the segmentation stage).
+
+Usage:
+    python scripts/import_time_report.py
+    python scripts/import_time_report.py segmentation measurement --top 15
+    python scripts/import_time_report.py --json --strict   # exit 1 on unexpected heavy imports
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Role -> statement run in the fresh interpreter
+ROLES = {
+    'services': 'import services',
+    'utils': 'import utils',
+    'routes': 'import routes',
+    'segmentation': 'from services.image_service import image_processor',
+    'measurement': 'from services.model_service import ModelInference',
+    'stage_client': 'from services.stage_service import connect_stages',
+}
+
+# Packages that take hundreds of milliseconds (or more) to import
+HEAVY_PACKAGES = ('torch', 'timm', 'torchvision', 'cv2', 'rembg', 'onnxruntime', 'huggingface_hub', 'scipy', 'skimage')
+
+# Heavy packages each role may load; anything else heavy is reported as unexpected
+ROLE_ALLOWED = {
+    'services': (),
+    'utils': (),
+    'routes': ('cv2',),
+    'segmentation': ('cv2', 'rembg', 'onnxruntime', 'scipy', 'skimage'),
+    'measurement': ('torch', 'timm', 'torchvision', 'cv2', 'huggingface_hub'),  # timm imports huggingface_hub
+    'stage_client': (),
+}
+
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)')
+
+
+def measure(statement):
+    """Run one import statement under -X importtime; returns parsed entries and wall time"""
+    code = f"import sys; sys.path.insert(0, {str(BACKEND_DIR)!r}); {statement}"
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=str(BACKEND_DIR)
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    entries = []
+    errors = []
+    for line in process.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, module = match.groups()
+            entries.append({
+                'module': module,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+            })
+        elif not line.startswith('import time:'):
+            errors.append(line)
+
+    error = errors[-1] if process.returncode != 0 and errors else None
+    return entries, wall_ms, error
+
+
+def summarize(role, statement, top):
+    """Import cost of one role, by root package"""
+    entries, wall_ms, error = measure(statement)
+
+    by_package = defaultdict(int)
+    for entry in entries:
+        by_package[entry['module'].split('.')[0]] += entry['self_us']
+
+    loaded = set(by_package)
+    heavy = [name for name in HEAVY_PACKAGES if name in loaded]
+    unexpected = [name for name in heavy if name not in ROLE_ALLOWED.get(role, HEAVY_PACKAGES)]
+
+    return {
+        'role': role,
+        'statement': statement,
+        'error': error,
+        'wall_ms': round(wall_ms, 1),
+        'import_ms': round(sum(by_package.values()) / 1000, 1),
+        'modules': len(entries),
+        'heavy_packages': heavy,
+        'unexpected_heavy': unexpected,
+        'top_packages': [
+            {'package': name, 'ms': round(us / 1000, 1)}
+            for name, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report per deployment role")
+    parser.add_argument('roles', nargs='*', help=f"Roles to measure: {', '.join(ROLES)} (default: all)")
+    parser.add_argument('--top', type=int, default=10, help='Packages listed per role')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--strict', action='store_true', help='Exit 1 if a role imports an unexpected heavy package')
+    args = parser.parse_args()
+
+    unknown = [role for role in args.roles if role not in ROLES]
+    if unknown:
+        parser.error(f"Unknown roles: {', '.join(unknown)}")
+
+    reports = [summarize(role, ROLES[role], args.top) for role in (args.roles or ROLES)]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print(f"\n📦 {report['role']}: {report['statement']}")
+            if report['error']:
+                print(f"   ❌ {report['error']}")
+            print(f"   {report['import_ms']} ms importing {report['modules']} modules "
+                  f"({report['wall_ms']} ms wall, interpreter start included)")
+            print(f"   Heavy packages: {', '.join(report['heavy_packages']) or 'none'}")
+            if report['unexpected_heavy']:
+                print(f"   ⚠️ Unexpected for this role: {', '.join(report['unexpected_heavy'])}")
+            for package in report['top_packages']:
+                print(f"   {package['ms']:>9.1f} ms  {package['package']}")
+
+    if args.strict and any(report['unexpected_heavy'] or report['error'] for report in reports):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
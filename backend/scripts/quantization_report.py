@@ -0,0 +1,59 @@
+"""
+Compare INT8 quantized models against fp32: latency speedup and MAE drift
+
+Usage:
+    python scripts/quantization_report.py                       # all models, both modes
+    python scripts/quantization_report.py model_v1 --modes static
+
+Static mode calibrates on masks in Config.QUANT_CALIBRATION_DIR
+(or <dir>/front + <dir>/side).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.config import Config
+from services.model_service import ModelInference
+from services.quantization_service import QUANTIZATION_MODES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 quantization speedup/drift report")
+    parser.add_argument('models', nargs='*', default=list(Config.MODELS.keys()))
+    parser.add_argument('--modes', nargs='+', default=list(QUANTIZATION_MODES), choices=QUANTIZATION_MODES)
+    args = parser.parse_args()
+
+    Config.MODEL_BACKEND = 'torch'
+    Config.MICRO_BATCHING = False
+
+    rows = []
+    for model_name in args.models:
+        for mode in args.modes:
+            Config.MODELS[model_name]['quantization'] = mode
+            print(f"\n🔬 {model_name} ({mode})")
+            try:
+                report = ModelInference(model_name=model_name, device='cpu').quantization_report
+            except Exception as e:
+                print(f"❌ Failed: {e}")
+                continue
+
+            if report is None:
+                print("⚠️ Quantization was skipped")
+                continue
+
+            rows.append((model_name, mode, report))
+            worst = sorted(report['mae_cm'].items(), key=lambda item: -item[1])[:3]
+            print("   worst drift: " + ", ".join(f"{col} {mae} cm" for col, mae in worst))
+
+    print(f"\n{'='*72}")
+    print(f"{'model':<10} {'mode':<8} {'fp32 ms':>9} {'int8 ms':>9} {'speedup':>8} {'max MAE cm':>11} {'inputs':>12}")
+    for model_name, mode, report in rows:
+        print(f"{model_name:<10} {mode:<8} {report['fp32_latency_ms']:>9} {report['quantized_latency_ms']:>9} "
+              f"{report['speedup']:>7}x {report['max_mae_cm']:>11} {report['inputs']:>12}")
+    print('='*72)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Production server: load the models once in a master process, then fork
+gunicorn workers that share the weights copy-on-write
+
+Usage:
+    python serve.py
+    WORKERS=4 WORKER_THREADS=4 python serve.py
+"""
+import gc
+import os
+import atexit
+import shutil
+import logging
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+from core.config import Config
+from core.resources import resource_manager, available_cpus, process_memory, worker_cpus
+
+logger = logging.getLogger(__name__)
+
+
+def _cores_per_worker():
+    """CPU budget of one worker (CPU_BUDGET, or the machine split evenly)"""
+    return Config.CPU_BUDGET or max(1, len(available_cpus()) // Config.WORKERS)
+
+
+def pre_fork(server, worker):
+    """Master: give the new worker the lowest free slot (its share of the cores)"""
+    used = {getattr(w, 'slot', None) for w in server.WORKERS.values()}
+    worker.slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+
+
+def post_fork(server, worker):
+    """Worker: apply this worker's CPU plan; model weights stay shared with the master"""
+    gc.enable()
+
+    from services.image_service import image_processor
+
+    resource_manager.prefork = False
+    resource_manager.worker_slot = worker.slot
+    plan = resource_manager.apply(resource_manager.plan(cpus=worker_cpus(worker.slot, _cores_per_worker())))
+
+    if plan['pinned'] and image_processor.session_pool is not None:
+        # Session thread affinities are per worker, so pinned workers get their own sessions
+        image_processor.session_pool = image_processor.create_session_pool(
+            (image_processor.session_pool.model_name,)
+        )
+
+    from app import model_inference, model_switch
+    if model_switch is not None:
+        model_switch.watch(model_inference, worker.slot)
+
+    logger.info(
+        f"👷 Worker {worker.slot} (pid {os.getpid()}): "
+        f"{plan['measurement_threads']} torch threads, "
+        f"{plan['segmentation_sessions']}x{plan['segmentation_threads']} segmentation threads"
+    )
+
+
+def post_worker_init(worker):
+    """Worker: report memory once the worker is ready to serve"""
+    memory = process_memory()
+    logger.info(
+        f"📊 Worker {worker.slot} memory: RSS {memory['rss_mb']} MB, PSS {memory['pss_mb']} MB "
+        f"(private {memory['private_mb']} MB)"
+    )
+
+
+def when_ready(server):
+    """Master: report memory after the models are loaded"""
+    memory = process_memory()
+    logger.info(f"✅ Master ready (pid {os.getpid()}): RSS {memory['rss_mb']} MB")
+
+
+class PreforkApplication(BaseApplication):
+    """gunicorn application that imports app.py once, in the master"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # preload_app: this runs in the master before any worker is forked
+        resource_manager.prefork = True
+        Config.CPU_BUDGET = _cores_per_worker()
+
+        # Each worker keeps its own jobs and model; with several workers they share
+        # job state and /switch-model requests through this directory
+        if Config.WORKERS > 1 and not Config.SERVE_STATE_DIR:
+            Config.SERVE_STATE_DIR = tempfile.mkdtemp(prefix='serve-state-')
+            master_pid = os.getpid()
+            atexit.register(
+                lambda: os.getpid() == master_pid and shutil.rmtree(Config.SERVE_STATE_DIR, ignore_errors=True)
+            )
+
+        # No collections while loading; freezing afterwards keeps the GC from
+        # touching (and so copying) the master's objects in every worker
+        gc.disable()
+        from app import app
+        gc.freeze()
+
+        return app
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    options = {
+        'bind': f"{Config.HOST}:{Config.PORT}",
+        'workers': Config.WORKERS,
+        'threads': Config.WORKER_THREADS,
+        'worker_class': 'gthread',
+        'timeout': Config.WORKER_TIMEOUT_S,
+        'preload_app': True,
+        'pre_fork': pre_fork,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'when_ready': when_ready,
+    }
+
+    logger.info(
+        f"🚀 Serving {Config.API_TITLE} with {Config.WORKERS} workers x "
+        f"{Config.WORKER_THREADS} threads ({_cores_per_worker()} cores each)"
+    )
+    PreforkApplication(options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,17 @@
 """
 Business logic services
+
+Exports are imported on first use, so `import services` (or importing one
+service) does not pull in torch or rembg.
 """
-from .model_service import ModelInference
-from .image_service import image_processor
-from .hf_service import hf_manager
-from .size_matching_service import size_matching_service, SizeMatchingService
-from .wardrobe_model_service import WardrobeModelService
+from core.lazy import lazy_exports
+
+_EXPORTS = {
+    'ModelInference': 'model_service',
+    'image_processor': 'image_service',
+    'hf_manager': 'hf_service',
+}
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
 
-__all__ = [
-    'ModelInference',
-    'image_processor',
-    'hf_manager',
-    'size_matching_service',
-    'SizeMatchingService',
-    'WardrobeModelService',
-]
\ No newline at end of file
+__all__ = list(_EXPORTS)
@@ -0,0 +1,327 @@
+import math
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+from core.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Priority classes: user-facing requests ahead of bulk / background work
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+DEFAULT_WEIGHTS = {INTERACTIVE: 4, BATCH: 1}
+
+# Absolute time.monotonic() deadline of the request being served (None = background work)
+_request_deadline = contextvars.ContextVar('request_deadline', default=None)
+_request_priority = contextvars.ContextVar('request_priority', default=BATCH)
+
+
+class Overloaded(Exception):
+    """Request rejected by admission control"""
+
+    def __init__(self, message, status_code=503, retry_after=1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class AdmissionLimiter:
+    """Concurrency limit with bounded per-priority wait queues for one pipeline stage"""
+
+    def __init__(self, name, max_concurrent, max_queue, weights=None, starvation_s=2.0):
+        """
+        Initialize limiter
+
+        Args:
+            name: Stage name used in messages and stats
+            max_concurrent: Requests allowed in the stage at once
+            max_queue: Requests of one priority class allowed to wait for a slot
+                (more are rejected with 429)
+            weights: {priority class: share of freed slots while several classes wait}
+            starvation_s: A class whose oldest waiter has waited this long is served next
+        """
+        self.name = name
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.weights = {priority: max(1, int(weight)) for priority, weight in (weights or DEFAULT_WEIGHTS).items()}
+        self.starvation = float(starvation_s)
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._service_s = 0.0  # moving average of time spent holding a slot
+        # Per class: waiters as (threading.Event, enqueued_at), oldest first
+        self._waiters = {priority: deque() for priority in self.weights}
+        self._credit = dict.fromkeys(self.weights, 0)  # smooth weighted round robin state
+        self._stats = {priority: self._new_class_stats() for priority in self.weights}
+
+    @staticmethod
+    def _new_class_stats():
+        return {
+            'admitted': 0,
+            'queued': 0,
+            'rejected_queue_full': 0,
+            'rejected_deadline': 0,
+            'timed_out': 0,
+            'starvation_grants': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'recent_wait_ms': deque(maxlen=512),
+        }
+
+    def _waiting(self):
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _expected_wait(self, priority):
+        """Estimated seconds until a new request of this class gets a slot"""
+        waiting = len(self._waiters[priority])
+        total_weight = sum(w for p, w in self.weights.items() if self._waiters[p] or p == priority)
+        # Weighted sharing: this class gets weight / total_weight of freed slots
+        slots_ahead = (waiting + 1) * total_weight / self.weights[priority]
+        return self._service_s * slots_ahead / self.max_concurrent
+
+    @contextmanager
+    def slot(self, deadline=None, priority=None):
+        """
+        Hold a slot in this stage
+
+        Args:
+            deadline: time.monotonic() deadline; defaults to the current
+                request's. None waits as long as needed (background work)
+            priority: Priority class; defaults to the current request's
+
+        Raises:
+            Overloaded: 429 if the queue is full, 503 if the deadline can't be met
+        """
+        if deadline is None:
+            deadline = _request_deadline.get()
+        if priority is None:
+            priority = _request_priority.get()
+        if priority not in self.weights:
+            priority = BATCH
+
+        waited = self._acquire(deadline, priority)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self._release(time.monotonic() - started)
+
+    def _acquire(self, deadline, priority):
+        """Take a free slot or queue for one; returns seconds waited"""
+        requested = time.monotonic()
+        stats = self._stats[priority]
+
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiting():
+                self._active += 1
+                stats['admitted'] += 1
+                stats['recent_wait_ms'].append(0.0)
+                return 0.0
+
+            expected = self._expected_wait(priority)
+
+            if deadline is not None:
+                if len(self._waiters[priority]) >= self.max_queue:
+                    stats['rejected_queue_full'] += 1
+                    raise Overloaded(
+                        f"Server busy: {self.name} {priority} queue is full "
+                        f"({len(self._waiters[priority])} waiting)",
+                        429, expected
+                    )
+
+                remaining = deadline - requested
+                if remaining <= 0 or expected > remaining:
+                    stats['rejected_deadline'] += 1
+                    raise Overloaded(
+                        f"Server busy: {self.name} wait (~{expected:.1f}s) exceeds the request deadline",
+                        503, expected
+                    )
+
+            waiter = (threading.Event(), requested)
+            self._waiters[priority].append(waiter)
+            stats['queued'] += 1
+
+        try:
+            # Deadlines from other processes (stage headers) aren't validated; Event.wait
+            # raises OverflowError above TIMEOUT_MAX
+            timeout = None if deadline is None else min(max(0.0, deadline - time.monotonic()), threading.TIMEOUT_MAX)
+            granted = waiter[0].wait(timeout)
+        except BaseException:
+            with self._lock:
+                if waiter[0].is_set():
+                    self._pass_slot()  # granted as we failed: hand it on
+                else:
+                    self._waiters[priority].remove(waiter)
+            raise
+
+        with self._lock:
+            if not granted and not waiter[0].is_set():
+                self._waiters[priority].remove(waiter)
+                stats['timed_out'] += 1
+                raise Overloaded(
+                    f"Server busy: timed out waiting for {self.name}",
+                    503, self._expected_wait(priority)
+                )
+
+            waited_ms = (time.monotonic() - requested) * 1000
+            stats['admitted'] += 1
+            stats['total_wait_ms'] += waited_ms
+            stats['max_wait_ms'] = max(stats['max_wait_ms'], waited_ms)
+            stats['recent_wait_ms'].append(waited_ms)
+            return waited_ms / 1000
+
+    def _next_class(self):
+        """Class to hand a freed slot to (caller holds the lock and waiters exist)"""
+        ready = [priority for priority, waiters in self._waiters.items() if waiters]
+
+        # Starvation protection: an overdue class goes first, oldest waiter wins
+        now = time.monotonic()
+        starved = [p for p in ready if now - self._waiters[p][0][1] >= self.starvation]
+        if starved:
+            priority = min(starved, key=lambda p: self._waiters[p][0][1])
+            self._stats[priority]['starvation_grants'] += 1
+            return priority
+
+        if len(ready) == 1:
+            return ready[0]
+
+        # Smooth weighted round robin among the classes that are waiting
+        for p in ready:
+            self._credit[p] += self.weights[p]
+        priority = max(ready, key=lambda p: self._credit[p])
+        self._credit[priority] -= sum(self.weights[p] for p in ready)
+        return priority
+
+    def _release(self, held_s):
+        """Hand the slot to the next waiter by priority, or free it"""
+        with self._lock:
+            self._service_s = held_s if self._service_s == 0.0 else 0.8 * self._service_s + 0.2 * held_s
+            self._pass_slot()
+
+    def _pass_slot(self):
+        """Give a held slot to the next waiter, or free it (caller holds the lock)"""
+        if self._waiting():
+            event, _ = self._waiters[self._next_class()].popleft()
+            event.set()  # slot passes on, active count unchanged
+        else:
+            self._active -= 1
+
+    def get_stats(self):
+        """Occupancy, rejections and queue wait per priority class"""
+        with self._lock:
+            active = self._active
+            service_s = self._service_s
+            classes = {}
+            for priority, stats in self._stats.items():
+                waits = sorted(stats['recent_wait_ms'])
+                classes[priority] = {
+                    'weight': self.weights[priority],
+                    'waiting': len(self._waiters[priority]),
+                    'admitted': stats['admitted'],
+                    'queued': stats['queued'],
+                    'rejected_queue_full': stats['rejected_queue_full'],
+                    'rejected_deadline': stats['rejected_deadline'],
+                    'timed_out': stats['timed_out'],
+                    'starvation_grants': stats['starvation_grants'],
+                    'avg_wait_ms': round(stats['total_wait_ms'] / stats['admitted'], 2) if stats['admitted'] else 0.0,
+                    'p95_wait_ms': round(waits[int(0.95 * (len(waits) - 1))], 2) if waits else 0.0,
+                    'max_wait_ms': round(stats['max_wait_ms'], 2),
+                }
+
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'active': active,
+            'waiting': sum(c['waiting'] for c in classes.values()),
+            'avg_service_ms': round(service_s * 1000, 2),
+            'starvation_ms': self.starvation * 1000,
+            'classes': classes,
+        }
+
+
+class AdmissionController:
+    """Per-stage limiters shared by every request thread, with one priority policy"""
+
+    def __init__(self, limits, default_timeout_s=10.0, enabled=True, weights=None, starvation_s=2.0):
+        """
+        Initialize admission control
+
+        Args:
+            limits: {stage: (max_concurrent, max_queue)}
+            default_timeout_s: Request deadline when the client doesn't send one
+            enabled: False admits everything immediately
+            weights: {priority class: weight}, shared by every stage
+            starvation_s: Maximum queue wait before a lower-weight class is served anyway
+        """
+        self.enabled = enabled
+        self.default_timeout = float(default_timeout_s)
+        self.limiters = {
+            stage: AdmissionLimiter(stage, max_concurrent, max_queue, weights, starvation_s)
+            for stage, (max_concurrent, max_queue) in limits.items()
+        }
+
+    @contextmanager
+    def request_scope(self, timeout_s=None, priority=BATCH):
+        """
+        Give the work done in this context (and contexts copied from it) a deadline and priority
+
+        Args:
+            timeout_s: Seconds the client is willing to wait (None = default)
+            priority: INTERACTIVE or BATCH
+        """
+        timeout = self.default_timeout if timeout_s is None else timeout_s
+        deadline_token = _request_deadline.set(time.monotonic() + timeout)
+        priority_token = _request_priority.set(priority)
+        try:
+            yield
+        finally:
+            _request_priority.reset(priority_token)
+            _request_deadline.reset(deadline_token)
+
+    def current_scope(self):
+        """
+        Deadline and priority of the request being served, for handing to another process
+
+        Returns:
+            (seconds left before the deadline or None for background work, priority)
+        """
+        deadline = _request_deadline.get()
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return remaining, _request_priority.get()
+
+    @contextmanager
+    def limit(self, stage):
+        """Hold a slot of one stage for the duration of the block"""
+        if not self.enabled:
+            yield 0.0
+            return
+
+        with self.limiters[stage].slot() as waited:
+            yield waited
+
+    def get_stats(self):
+        """Limiter statistics per stage"""
+        return {
+            'enabled': self.enabled,
+            'default_timeout_s': self.default_timeout,
+            'stages': {stage: limiter.get_stats() for stage, limiter in self.limiters.items()},
+        }
+
+
+# Global instance
+# mask: decode + mask detection / fast path, segmentation: u2net, inference: model forward
+admission = AdmissionController(
+    limits={
+        'mask': (Config.ADMISSION_MASK_CONCURRENCY, Config.ADMISSION_MASK_QUEUE),
+        'segmentation': (Config.ADMISSION_SEGMENTATION_CONCURRENCY, Config.ADMISSION_SEGMENTATION_QUEUE),
+        'inference': (Config.ADMISSION_INFERENCE_CONCURRENCY, Config.ADMISSION_INFERENCE_QUEUE),
+    },
+    default_timeout_s=Config.REQUEST_TIMEOUT_S,
+    enabled=Config.ADMISSION_CONTROL,
+    weights={INTERACTIVE: Config.PRIORITY_INTERACTIVE_WEIGHT, BATCH: Config.PRIORITY_BATCH_WEIGHT},
+    starvation_s=Config.PRIORITY_STARVATION_MS / 1000,
+)
@@ -0,0 +1,207 @@
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collect concurrent inference requests into batched forward passes"""
+
+    def __init__(self, batch_fn, max_batch_size=8, window_ms=10):
+        """
+        Initialize micro-batcher
+
+        Args:
+            batch_fn: Callable taking (front_batch, side_batch) tensors and
+                returning one result per batch row
+            max_batch_size: Flush as soon as this many requests are queued
+            window_ms: Maximum time the first queued request waits for company
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.window = max(0.0, float(window_ms)) / 1000.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._running = True
+        self._buffers = [None, None]  # reused (max_batch_size, C, H, W) input buffers
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'errors': 0,
+            'max_queue_depth': 0,
+            'total_wait_ms': 0.0,
+            'total_forward_ms': 0.0,
+            'batch_sizes': {},
+        }
+
+    def _ensure_worker(self):
+        """Start the worker thread on first use"""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name='micro-batcher', daemon=True
+            )
+            self._worker.start()
+
+    def submit(self, front_tensor, side_tensor):
+        """
+        Queue a single front/side pair
+
+        Args:
+            front_tensor: Preprocessed front tensor (C, H, W)
+            side_tensor: Preprocessed side tensor (C, H, W)
+
+        Returns:
+            Future resolving to this pair's result
+        """
+        future = Future()
+
+        with self._cond:
+            running = self._running
+            if running:
+                self._ensure_worker()
+                self._queue.append((front_tensor, side_tensor, future, time.perf_counter()))
+                depth = len(self._queue)
+                self._cond.notify()
+
+        if running:
+            with self._stats_lock:
+                self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], depth)
+        else:
+            # Shut down (e.g. model evicted while this request held it): run unbatched
+            try:
+                future.set_result(self.batch_fn(front_tensor.unsqueeze(0), side_tensor.unsqueeze(0))[0])
+            except Exception as e:
+                future.set_exception(e)
+
+        return future
+
+    def predict(self, front_tensor, side_tensor):
+        """Submit a pair and block until its result is ready"""
+        return self.submit(front_tensor, side_tensor).result()
+
+    def _collect_batch(self):
+        """Wait for work, then gather up to max_batch_size items within the window"""
+        with self._cond:
+            while self._running and not self._queue:
+                self._cond.wait()
+
+            if not self._queue:
+                return []
+
+            deadline = self._queue[0][3] + self.window
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self._running:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self):
+        """Worker loop: one batched forward per input shape in each collected batch"""
+        while True:
+            batch = self._collect_batch()
+            if not batch:
+                if not self._running:
+                    return
+                continue
+
+            # Requests preprocessed for different models (e.g. 1- and 3-channel input
+            # around a grayscale/RGB switch) can't be stacked together
+            groups = {}
+            for item in batch:
+                key = (item[0].shape, item[0].dtype, item[1].shape, item[1].dtype)
+                groups.setdefault(key, []).append(item)
+
+            for group in groups.values():
+                self._forward(group)
+
+    def _forward(self, batch):
+        """Run one batched forward over same-shaped items and resolve their futures"""
+        started = time.perf_counter()
+
+        try:
+            front_batch = self._stack(0, [item[0] for item in batch])
+            side_batch = self._stack(1, [item[1] for item in batch])
+            results = self.batch_fn(front_batch, side_batch)
+
+            for item, result in zip(batch, results):
+                item[2].set_result(result)
+
+        except Exception as e:
+            logger.error(f"❌ Batched inference failed ({len(batch)} items): {e}")
+            for item in batch:
+                if not item[2].done():
+                    item[2].set_exception(e)
+            with self._stats_lock:
+                self._stats['errors'] += 1
+
+        self._record_batch(batch, started)
+
+    def _stack(self, slot, tensors):
+        """Stack into this input's reused batch buffer (worker thread only)"""
+        buffer = self._buffers[slot]
+        if buffer is None or buffer.shape[1:] != tensors[0].shape or buffer.dtype != tensors[0].dtype:
+            buffer = torch.empty((self.max_batch_size, *tensors[0].shape), dtype=tensors[0].dtype)
+            self._buffers[slot] = buffer
+
+        return torch.stack(tensors, out=buffer[:len(tensors)])
+
+    def _record_batch(self, batch, started):
+        """Update queueing and batch-size statistics"""
+        finished = time.perf_counter()
+        size = len(batch)
+
+        with self._stats_lock:
+            self._stats['requests'] += size
+            self._stats['batches'] += 1
+            self._stats['total_forward_ms'] += (finished - started) * 1000
+            self._stats['total_wait_ms'] += sum((started - item[3]) * 1000 for item in batch)
+            self._stats['batch_sizes'][size] = self._stats['batch_sizes'].get(size, 0) + 1
+
+    def get_stats(self):
+        """
+        Get queue depth and batch-size statistics
+
+        Returns:
+            Dictionary of batching statistics
+        """
+        with self._cond:
+            queue_depth = len(self._queue)
+
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['batch_sizes'] = dict(sorted(self._stats['batch_sizes'].items()))
+
+        requests = stats['requests']
+        batches = stats['batches']
+
+        return {
+            'max_batch_size': self.max_batch_size,
+            'window_ms': self.window * 1000,
+            'queue_depth': queue_depth,
+            'max_queue_depth': stats['max_queue_depth'],
+            'requests': requests,
+            'batches': batches,
+            'errors': stats['errors'],
+            'avg_batch_size': round(requests / batches, 2) if batches else 0.0,
+            'avg_queue_wait_ms': round(stats['total_wait_ms'] / requests, 2) if requests else 0.0,
+            'avg_forward_ms': round(stats['total_forward_ms'] / batches, 2) if batches else 0.0,
+            'batch_size_histogram': stats['batch_sizes'],
+        }
+
+    def shutdown(self):
+        """Stop batching; the worker drains the queue and later submits run inline"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
@@ -0,0 +1,243 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data):
+    """SHA-256 hex digest of raw bytes (or a numpy array's buffer)"""
+    if isinstance(data, np.ndarray):
+        data = np.ascontiguousarray(data).data
+    return hashlib.sha256(data).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional TTL"""
+
+    def __init__(self, max_entries=256, ttl_seconds=None):
+        """
+        Initialize cache
+
+        Args:
+            max_entries: Maximum number of entries before LRU eviction
+            ttl_seconds: Entry lifetime (None = no expiry)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl_seconds
+
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value or None (counts a hit/miss)"""
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and self.ttl is not None and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """Store a value, evicting least recently used entries if full"""
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        """Hit/miss counters and occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class DiskCache:
+    """Bytes cache in a directory with size-based (least recently used) eviction"""
+
+    def __init__(self, directory, max_bytes, suffix='.bin'):
+        """
+        Initialize disk cache
+
+        Args:
+            directory: Cache directory (created if missing)
+            max_bytes: Total size budget for cached files
+            suffix: File extension for entries
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.suffix = suffix
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Index existing entries (oldest access first)
+        files = sorted(self.directory.glob(f'*{suffix}'), key=lambda p: p.stat().st_mtime)
+        self._sizes = OrderedDict((p.stem, p.stat().st_size) for p in files)
+        self._total = sum(self._sizes.values())
+
+    def _path(self, key):
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key):
+        """Return cached bytes or None (counts a hit/miss)"""
+        path = self._path(key)
+
+        with self._lock:
+            if key not in self._sizes:
+                self.misses += 1
+                return None
+
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # mark as recently used
+        except OSError:
+            with self._lock:
+                self._total -= self._sizes.pop(key, 0)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+            self.hits += 1
+        return data
+
+    def set(self, key, data):
+        """Store bytes atomically, then evict oldest entries over budget"""
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Disk cache write failed: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._total += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                victim, size = self._sizes.popitem(last=False)
+                self._total -= size
+                self.evictions += 1
+                self._path(victim).unlink(missing_ok=True)
+
+    def get_stats(self):
+        """Hit/miss counters and disk usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'directory': str(self.directory),
+                'entries': len(self._sizes),
+                'size_mb': round(self._total / 1024 / 1024, 2),
+                'max_size_mb': round(self.max_bytes / 1024 / 1024, 2),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class MaskCache:
+    """Two-tier cache of final segmentation masks keyed by raw image content"""
+
+    def __init__(self, max_entries=256, disk_dir=None, disk_max_mb=512):
+        """
+        Initialize mask cache
+
+        Args:
+            max_entries: In-memory LRU capacity (masks)
+            disk_dir: Directory for the on-disk tier (None disables it)
+            disk_max_mb: Size budget for the on-disk tier
+        """
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskCache(disk_dir, disk_max_mb * 1024 * 1024, suffix='.png') if disk_dir else None
+
+    @staticmethod
+    def make_key(image_bytes, target_size, content=None):
+        """
+        Cache key: hash of the uploaded bytes plus output size
+
+        A client content hint ('mask' / 'photo') overrides detection and can
+        produce a different mask for the same bytes, so it is part of the key.
+        """
+        key = f"{content_hash(image_bytes)}_{target_size[0]}x{target_size[1]}"
+        return f"{key}_{content}" if content is not None else key
+
+    def get(self, key):
+        """Return the cached uint8 mask or None"""
+        mask = self.memory.get(key)
+        if mask is not None or self.disk is None:
+            return mask
+
+        data = self.disk.get(key)
+        if data is None:
+            return None
+
+        mask = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if mask is not None:
+            self.memory.set(key, mask)
+        return mask
+
+    def put(self, key, mask):
+        """Store a final mask in both tiers"""
+        self.memory.set(key, mask)
+
+        if self.disk is not None:
+            ok, buffer = cv2.imencode('.png', mask)
+            if ok:
+                self.disk.set(key, buffer.tobytes())
+
+    def get_stats(self):
+        """Per-tier hit/miss counters"""
+        return {
+            'memory': self.memory.get_stats(),
+            'disk': self.disk.get_stats() if self.disk else None,
+        }
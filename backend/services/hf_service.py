@@ -1,13 +1,26 @@
-import torch
+import os
 import json
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import logging
-from huggingface_hub import hf_hub_download
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: downloads are only serialized within a process
+
+from core.lazy import lazy_singletons
 
 # Import config to get model mappings
 try:
     from core.config import Config
     MODEL_FILES = Config.MODEL_FILES
+    HF_REVISION = Config.HF_REVISION
+    HF_DOWNLOAD_WORKERS = Config.HF_DOWNLOAD_WORKERS
+    HF_LOCAL_SOURCE_DIR = Config.HF_LOCAL_SOURCE_DIR
 except ImportError:
     # Fallback if config not available
     MODEL_FILES = {
@@ -15,12 +28,130 @@ except ImportError:
         'model_v2': 'mobilenetv3_model.pth',
         'model_v3': 'resnet50_model.pth',
     }
+    HF_REVISION = 'main'
+    HF_DOWNLOAD_WORKERS = 3
+    HF_LOCAL_SOURCE_DIR = None
 
 logger = logging.getLogger(__name__)
 
+# Expected size / sha256 of every artifact in models_dir (also read by LocalDirectorySource)
+MANIFEST_FILE = 'manifest.json'
+CHUNK_BYTES = 1024 * 1024
+
+
+def file_sha256(path):
+    """Hex sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(directory):
+    """{filename: entry} from a directory's manifest.json ({} if missing or unreadable)"""
+    try:
+        with open(Path(directory) / MANIFEST_FILE, 'r') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError):
+        return {}
+
+
+class HubSource:
+    """Files of the Hugging Face repository at a fixed revision"""
+    
+    def __init__(self, repo_id, revision='main', timeout_s=30):
+        self.repo_id = repo_id
+        self.revision = revision
+        self.timeout_s = timeout_s
+    
+    def __str__(self):
+        return f"{self.repo_id}@{self.revision}"
+    
+    def _url(self, filename):
+        from huggingface_hub import hf_hub_url
+        return hf_hub_url(self.repo_id, filename, revision=self.revision)
+    
+    def describe(self, filename):
+        """
+        Expected size and sha256 of a file
+        
+        Returns:
+            {'size', 'sha256', 'revision'}; sha256 is None for files not stored
+            in LFS (their etag is a git blob hash)
+        """
+        from huggingface_hub import get_hf_file_metadata
+        
+        metadata = get_hf_file_metadata(self._url(filename), timeout=self.timeout_s)
+        etag = (metadata.etag or '').strip('"')
+        return {
+            'size': metadata.size,
+            'sha256': etag if len(etag) == 64 else None,
+            'revision': metadata.commit_hash or self.revision,
+        }
+    
+    def read(self, filename, offset=0):
+        """Yield the file's bytes from offset on (HTTP range request)"""
+        import requests
+        from huggingface_hub.utils import build_hf_headers
+        
+        headers = build_hf_headers()
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+        
+        with requests.get(self._url(filename), headers=headers, stream=True, timeout=self.timeout_s) as response:
+            response.raise_for_status()
+            skip = offset if response.status_code != 206 else 0  # range ignored: whole file sent
+            for chunk in response.iter_content(CHUNK_BYTES):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk, skip = chunk[dropped:], skip - dropped
+                if chunk:
+                    yield chunk
+
+
+class LocalDirectorySource:
+    """
+    A local directory laid out like the hub repository (offline installs, tests)
+    
+    Expected sizes and hashes come from the directory's manifest.json when it
+    has one (so another server's models directory works as a source),
+    otherwise from the files themselves.
+    """
+    
+    def __init__(self, root):
+        self.root = Path(root)
+    
+    def __str__(self):
+        return str(self.root)
+    
+    def describe(self, filename):
+        entry = read_manifest(self.root).get(filename)
+        if entry:
+            return {'size': entry['size'], 'sha256': entry.get('sha256'), 'revision': entry.get('revision', 'local')}
+        
+        path = self.root / filename
+        if not path.exists():
+            raise FileNotFoundError(f"{filename} not found in {self.root}")
+        return {'size': path.stat().st_size, 'sha256': file_sha256(path), 'revision': 'local'}
+    
+    def read(self, filename, offset=0):
+        with open(self.root / filename, 'rb') as f:
+            f.seek(offset)
+            for chunk in iter(lambda: f.read(CHUNK_BYTES), b''):
+                yield chunk
+
 
 class HuggingFaceModelManager:
-    """Simple manager for downloading models using version aliases"""
+    """
+    Downloads models using version aliases
+    
+    Files are written to <name>.part (resumed after an interrupted download),
+    checked against the source's size and sha256, then renamed into
+    models_dir, so a model file that exists is complete. manifest.json records
+    what each file should be; a file found without an entry is size-checked
+    against the source before use and hashed in the background.
+    """
     
     # Hugging Face repository
     HF_REPO_ID = "manamendra/body-measurement-ai"
@@ -44,12 +175,15 @@ class HuggingFaceModelManager:
         }
     }
     
-    def __init__(self, models_dir=None):
+    def __init__(self, models_dir=None, source=None, download_workers=None):
         """
         Initialize model manager
         
         Args:
             models_dir: Local directory to store models (default: backend/models)
+            source: Where artifacts come from (default: HF_LOCAL_SOURCE_DIR if set,
+                otherwise the hub repository at HF_REVISION)
+            download_workers: Files downloaded at once by download_models()
         """
         if models_dir is None:
             # Use Config.MODEL_DIR if available, otherwise calculate it
@@ -61,9 +195,24 @@ class HuggingFaceModelManager:
                 self.models_dir = Path(__file__).parent.parent / 'models'
         else:
             self.models_dir = Path(models_dir)
-            
+        
+        if source is None:
+            source = LocalDirectorySource(HF_LOCAL_SOURCE_DIR) if HF_LOCAL_SOURCE_DIR else HubSource(self.HF_REPO_ID, HF_REVISION)
+        self.source = source
+        self.download_workers = max(1, download_workers or HF_DOWNLOAD_WORKERS)
+        
+        self._init_locks()
+        if hasattr(os, 'register_at_fork'):
+            # A download or verification thread may hold a lock when serve.py forks
+            os.register_at_fork(after_in_child=self._init_locks)
+        
         self.models_dir.mkdir(parents=True, exist_ok=True)
-        logger.info(f"📁 Models directory: {self.models_dir}")
+        logger.info(f"📁 Models directory: {self.models_dir} (source: {self.source})")
+    
+    def _init_locks(self):
+        self._lock = threading.Lock()  # manifest and lock table
+        self._file_locks = defaultdict(threading.Lock)
+        self._verifying = set()
     
     def get_available_models(self):
         """
@@ -74,58 +223,295 @@ class HuggingFaceModelManager:
         """
         return self.AVAILABLE_MODELS.copy()
     
-    def download_model(self, model_key_or_filename):
+    def _resolve_filename(self, model_key_or_filename):
+        if model_key_or_filename in self.AVAILABLE_MODELS:
+            return self.AVAILABLE_MODELS[model_key_or_filename]['filename']
+        return model_key_or_filename
+    
+    def download_model(self, model_key_or_filename, force=False):
         """
         Download a specific model from Hugging Face
         
         Args:
             model_key_or_filename: Model key (e.g., 'efficientnet-b3') or filename (e.g., 'efficientnet-b3_model.pth')
+            force: Move the local copy aside and download it again (e.g. it
+                could not be read)
         
         Returns:
             Path to downloaded file
         """
-        # Determine filename
-        if model_key_or_filename in self.AVAILABLE_MODELS:
-            filename = self.AVAILABLE_MODELS[model_key_or_filename]['filename']
-            model_info = self.AVAILABLE_MODELS[model_key_or_filename]
-        else:
-            # Assume it's a filename
-            filename = model_key_or_filename
-            model_info = None
+        filename = self._resolve_filename(model_key_or_filename)
+        model_info = self.AVAILABLE_MODELS.get(model_key_or_filename)
+        
+        description = f"{model_info['description']} ({model_info['size_mb']}MB)" if model_info else None
+        
+        try:
+            return self.fetch(filename, description, force)
+        except Exception as e:
+            logger.error(f"❌ Download failed: {e}")
+            raise RuntimeError(
+                f"Failed to download {filename} from Hugging Face.\n"
+                f"Repository: {self.source}\n"
+                f"Error: {e}"
+            )
+    
+    def fetch(self, filename, description=None, force=False):
+        """
+        Local path of a complete artifact, downloading (or resuming) it if needed
+        
+        A local file whose size doesn't match the manifest (or, without a
+        manifest entry, the source) is never returned; it is downloaded again.
         
+        Returns:
+            Path in models_dir
+        """
         local_path = self.models_dir / filename
         
-        # Already exists? Return it
-        if local_path.exists():
-            logger.info(f"✅ Using cached model: {filename}")
+        with self._file_lock(filename):
+            if local_path.exists() and force:
+                logger.warning(f"⚠️ Downloading {filename} again")
+                self._quarantine(local_path)
+            
+            if local_path.exists() and self._usable(filename, local_path):
+                return local_path
+            
+            logger.info(f"⬇️  Downloading {description or filename} from {self.source}...")
+            self._download(filename)
+            logger.info(f"✅ Downloaded: {filename}")
             return local_path
+    
+    def _usable(self, filename, local_path):
+        """Size check of an existing file; moves it aside if it is incomplete"""
+        size = local_path.stat().st_size
+        entry = self.get_manifest().get(filename)
         
-        # Download from Hugging Face
-        if model_info:
-            logger.info(f"⬇️  Downloading {model_info['description']} ({model_info['size_mb']}MB)...")
+        if entry is None:
+            # Placed by hand or by an older version: the source says how big it should be
+            try:
+                expected = self.source.describe(filename)
+            except Exception as e:
+                # Offline: trust the file and remember it, so later loads don't wait on the
+                # source again (a checkpoint that fails to load is downloaded again by
+                # ModelInference; the background check compares it once the source is back)
+                logger.warning(f"⚠️ Using unverified {filename}, {self.source} unreachable: {e}")
+                self._record(filename, {
+                    'size': size,
+                    'sha256': None,
+                    'revision': None,
+                    'verified': False,
+                    'checked': False,
+                })
+                return True
+            
+            if size == expected['size']:
+                self._record(filename, dict(expected, size=size, verified=False))
+                logger.info(f"✅ Using cached model: {filename} (hashing in background)")
+                self.verify_in_background([filename])
+                return True
+            
+            logger.warning(f"⚠️ {filename} is {size} bytes, {self.source} has {expected['size']}: downloading again")
+        elif size == entry['size']:
+            logger.info(f"✅ Using cached model: {filename}")
+            if entry.get('checked') is False:
+                self.verify_in_background([filename])  # recorded offline: size not confirmed by the source yet
+            return True
         else:
-            logger.info(f"⬇️  Downloading {filename} from Hugging Face...")
+            logger.warning(f"⚠️ {filename} is {size} bytes, manifest expects {entry['size']}: downloading again")
         
+        self._quarantine(local_path)
+        return False
+    
+    def _download(self, filename):
+        """Fetch into <name>.part, verify, then rename into place"""
+        local_path = self.models_dir / filename
+        part_path = local_path.with_name(f"{local_path.name}.part")
+        expected = self.source.describe(filename)
+        
+        with open(part_path, 'ab') as part:
+            if fcntl is not None:
+                fcntl.flock(part, fcntl.LOCK_EX)  # another process may be downloading it too
+                if local_path.exists() and not part_path.exists():
+                    return  # it finished while we waited; our handle is on the renamed file
+            
+            for attempt in range(2):
+                offset = part.seek(0, os.SEEK_END)
+                if offset > expected['size']:
+                    part.truncate(0)
+                    offset = 0
+                
+                digest = hashlib.sha256()
+                if offset:
+                    logger.info(f"⏯️ Resuming {filename} at {offset / 1e6:.1f} MB")
+                    with open(part_path, 'rb') as existing:
+                        for chunk in iter(lambda: existing.read(CHUNK_BYTES), b''):
+                            digest.update(chunk)
+                
+                for chunk in self.source.read(filename, offset):
+                    part.write(chunk)
+                    digest.update(chunk)
+                part.flush()
+                os.fsync(part.fileno())
+                
+                size = part.tell()
+                sha256 = digest.hexdigest()
+                if size == expected['size'] and expected['sha256'] in (None, sha256):
+                    break
+                
+                part.truncate(0)
+                if attempt or not offset:
+                    raise ValueError(
+                        f"{filename}: got {size} bytes / sha256 {sha256}, "
+                        f"expected {expected['size']} bytes / sha256 {expected['sha256']}"
+                    )
+                logger.warning(f"⚠️ Resumed {filename} failed verification, downloading from scratch")
+            
+            os.replace(part_path, local_path)
+        
+        self._record(filename, {
+            'size': size,
+            'sha256': sha256,
+            'revision': expected['revision'],
+            'verified': expected['sha256'] is not None,
+        })
+    
+    def _quarantine(self, path):
+        """Move a bad file aside (a loaded model may still be reading it)"""
         try:
-            # Download file (directly to repo root, no "models/" prefix)
-            downloaded_path = hf_hub_download(
-                repo_id=self.HF_REPO_ID,
-                filename=filename,  # ← Direct filename at repo root
-                cache_dir=str(self.models_dir / '.cache'),
-                local_dir=str(self.models_dir),
-                local_dir_use_symlinks=False
-            )
+            os.replace(path, path.with_name(f"{path.name}.corrupt"))
+        except OSError as e:
+            logger.warning(f"⚠️ Could not move {path.name} aside: {e}")
+    
+    def _file_lock(self, filename):
+        with self._lock:
+            return self._file_locks[filename]
+    
+    def get_manifest(self):
+        """{filename: {'size', 'sha256', 'revision', 'verified'[, 'checked']}} for models_dir"""
+        return read_manifest(self.models_dir)
+    
+    def _record(self, filename, entry):
+        """Update one manifest entry (written atomically)"""
+        with self._lock:
+            files = self.get_manifest()
+            files[filename] = entry
             
-            logger.info(f"✅ Downloaded: {filename}")
-            return Path(downloaded_path)
+            tmp_path = self.models_dir / f"{MANIFEST_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'files': files}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.models_dir / MANIFEST_FILE)
+    
+    def verify(self, filename):
+        """
+        Hash a local file and check it against the source
+        
+        Unknown files are added to the manifest. A file that doesn't match is
+        moved aside (<name>.corrupt) so the next download_model() fetches it again.
+        
+        Returns:
+            True if it matches, False if it was moved aside, None if it couldn't
+            be checked (no local file, source unreachable, or the file was
+            replaced while it was being hashed)
+        """
+        local_path = self.models_dir / filename
+        try:
+            stat = local_path.stat()
+        except FileNotFoundError:
+            return None
+        
+        size = stat.st_size
+        sha256 = file_sha256(local_path)
+        entry = self.get_manifest().get(filename)
+        
+        if entry is None or not entry.get('verified'):
+            try:
+                expected = self.source.describe(filename)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not verify {filename} against {self.source}: {e}")
+                return None
+        else:
+            expected = entry
+        
+        matches = size == expected['size'] and expected['sha256'] in (None, sha256)
+        
+        with self._file_lock(filename):
+            try:
+                current = local_path.stat()
+            except FileNotFoundError:
+                return None
+            if (current.st_ino, current.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+                return None  # replaced (e.g. re-downloaded) while it was being hashed
             
-        except Exception as e:
-            logger.error(f"❌ Download failed: {e}")
-            raise RuntimeError(
-                f"Failed to download {filename} from Hugging Face.\n"
-                f"Repository: {self.HF_REPO_ID}\n"
-                f"Error: {e}"
-            )
+            if matches:
+                self._record(filename, {
+                    'size': size,
+                    'sha256': sha256,
+                    'revision': expected.get('revision'),
+                    'verified': expected['sha256'] is not None,
+                })
+                logger.info(f"✅ Verified {filename}")
+                return True
+            
+            logger.error(f"❌ {filename} does not match {self.source} ({size} bytes, sha256 {sha256}); moved aside")
+            self._quarantine(local_path)
+            return False
+    
+    def verify_in_background(self, filenames=None):
+        """
+        Verify local files on a daemon thread
+        
+        Args:
+            filenames: Files to check (default: every available model present locally)
+        
+        Returns:
+            The started thread, or None if there was nothing new to check
+        """
+        if filenames is None:
+            filenames = [info['filename'] for info in self.AVAILABLE_MODELS.values()]
+        
+        with self._lock:
+            pending = [name for name in filenames if name not in self._verifying]
+            self._verifying.update(pending)
+        if not pending:
+            return None
+        
+        def _verify():
+            for filename in pending:
+                try:
+                    self.verify(filename)
+                except Exception as e:
+                    logger.warning(f"⚠️ Verification of {filename} failed: {e}")
+                finally:
+                    with self._lock:
+                        self._verifying.discard(filename)
+        
+        thread = threading.Thread(target=_verify, name='hf-verify', daemon=True)
+        thread.start()
+        return thread
+    
+    def download_models(self, model_keys=None):
+        """
+        Download several models concurrently (download_workers at a time)
+        
+        Args:
+            model_keys: Model keys or filenames (default: all available models)
+        
+        Returns:
+            {model key: Path or the exception that stopped it}
+        """
+        model_keys = list(model_keys or self.AVAILABLE_MODELS)
+        results = {}
+        if not model_keys:
+            return results
+        
+        workers = min(self.download_workers, len(model_keys))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hf-download') as executor:
+            futures = {key: executor.submit(self.download_model, key) for key in model_keys}
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    results[key] = e
+        return results
     
     def download_all_models(self):
         """
@@ -137,17 +523,41 @@ class HuggingFaceModelManager:
         logger.info("📥 Downloading all models...")
         downloaded = []
         
-        for model_key, model_info in self.AVAILABLE_MODELS.items():
-            try:
-                path = self.download_model(model_key)
-                downloaded.append(path)
-                logger.info(f"✅ {model_key}: {model_info['description']}")
-            except Exception as e:
-                logger.error(f"❌ Failed to download {model_key}: {e}")
+        for model_key, result in self.download_models().items():
+            if isinstance(result, Exception):
+                logger.error(f"❌ Failed to download {model_key}: {result}")
+            else:
+                downloaded.append(result)
+                logger.info(f"✅ {model_key}: {self.AVAILABLE_MODELS[model_key]['description']}")
         
         logger.info(f"✅ Downloaded {len(downloaded)}/{len(self.AVAILABLE_MODELS)} models")
         return downloaded
     
+    def prefetch_models(self, exclude=None):
+        """
+        Download models in a background thread so later switches skip the download
+        
+        Args:
+            exclude: Model keys to skip (e.g. the one already loaded)
+        
+        Returns:
+            The started daemon thread
+        """
+        exclude = set(exclude or [])
+        
+        def _prefetch():
+            missing = [
+                model_key for model_key in self.AVAILABLE_MODELS
+                if model_key not in exclude and not self.check_model_exists(model_key)
+            ]
+            for model_key, result in self.download_models(missing).items():
+                if isinstance(result, Exception):
+                    logger.warning(f"⚠️ Prefetch of {model_key} failed: {result}")
+        
+        thread = threading.Thread(target=_prefetch, name='hf-prefetch', daemon=True)
+        thread.start()
+        return thread
+    
     def load_normalization_stats(self):
         """
         Load normalization statistics JSON file
@@ -156,28 +566,10 @@ class HuggingFaceModelManager:
             Dictionary with normalization stats
         """
         stats_file = 'normalization_stats.json'
-        local_path = self.models_dir / stats_file
         
-        # Try local first
-        if local_path.exists():
-            logger.info(f"✅ Using local {stats_file}")
-            with open(local_path, 'r') as f:
-                return json.load(f)
-        
-        # Download from Hugging Face
-        logger.info(f"⬇️  Downloading {stats_file}...")
         try:
-            downloaded_path = hf_hub_download(
-                repo_id=self.HF_REPO_ID,
-                filename=stats_file,  # ← Direct filename at repo root
-                cache_dir=str(self.models_dir / '.cache'),
-                local_dir=str(self.models_dir),
-                local_dir_use_symlinks=False
-            )
-            
-            with open(downloaded_path, 'r') as f:
+            with open(self.fetch(stats_file), 'r') as f:
                 return json.load(f)
-                
         except Exception as e:
             logger.error(f"❌ Failed to load normalization stats: {e}")
             raise
@@ -190,14 +582,15 @@ class HuggingFaceModelManager:
             model_key_or_filename: Model key or filename
         
         Returns:
-            Boolean indicating if model exists locally
+            Boolean indicating if a complete model file exists locally
         """
-        if model_key_or_filename in self.AVAILABLE_MODELS:
-            filename = self.AVAILABLE_MODELS[model_key_or_filename]['filename']
-        else:
-            filename = model_key_or_filename
+        filename = self._resolve_filename(model_key_or_filename)
+        local_path = self.models_dir / filename
+        if not local_path.exists():
+            return False
         
-        return (self.models_dir / filename).exists()
+        entry = self.get_manifest().get(filename)
+        return entry is None or local_path.stat().st_size == entry['size']
     
     def get_model_status(self):
         """
@@ -206,21 +599,29 @@ class HuggingFaceModelManager:
         Returns:
             Dictionary with model status
         """
+        manifest = self.get_manifest()
         status = {}
         for model_key, model_info in self.AVAILABLE_MODELS.items():
             filename = model_info['filename']
             local_path = self.models_dir / filename
+            part_path = local_path.with_name(f"{filename}.part")
+            entry = manifest.get(filename, {})
+            downloaded = self.check_model_exists(model_key)
             
             status[model_key] = {
                 'filename': filename,
                 'description': model_info['description'],
                 'size_mb': model_info['size_mb'],
-                'downloaded': local_path.exists(),
-                'path': str(local_path) if local_path.exists() else None
+                'downloaded': downloaded,
+                'path': str(local_path) if downloaded else None,
+                'verified': entry.get('verified', False) if downloaded else False,
+                'sha256': entry.get('sha256'),
+                'revision': entry.get('revision'),
+                'partial_bytes': part_path.stat().st_size if part_path.exists() else 0,
             }
         
         return status
 
 
-# Global instance
-hf_manager = HuggingFaceModelManager()
+# Global instance, created on first access
+__getattr__ = lazy_singletons(__name__, {'hf_manager': HuggingFaceModelManager})
@@ -2,54 +2,156 @@ import cv2
 import numpy as np
 from PIL import Image
 import io
-from rembg import remove, new_session
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from rembg import remove
+
+from core.config import Config
+from core.lazy import lazy_singletons
+from services.admission_service import admission
+from services.cache_service import MaskCache
+from services.segmentation_service import SessionPool
+from utils.image_utils import decode_image
 
 class ImageProcessor:
     """Professional-grade body segmentation using rembg AI"""
     
-    def __init__(self):
-        try:
-            print("🔄 Loading rembg AI model (u2net_human_seg)...")
-            print("   This model is specialized for human body segmentation")
-            print("   First run will download ~60MB model file...")
-            
-            # Use u2net_human_seg - BEST model for human bodies
-            self.session = new_session("u2net_human_seg")
-            
-            print("✅ rembg AI model loaded successfully!")
-            print("   Model: u2net_human_seg (Human-specialized)")
+    # Mask detection inspects at most this many pixels, whatever the resolution
+    MASK_DETECTION_SAMPLES = 256 * 256
+    
+    def __init__(self, load=True):
+        """
+        Args:
+            load: Build the segmentation sessions now; otherwise load() builds
+                them (at startup, in parallel with the model) or the first
+                AI segmentation does
+        """
+        self.session_pool = None
+        self._load_lock = threading.Lock()
+        self._load_attempted = False
+        
+        # Runs the second view of a pair while the caller segments the first
+        self.executor = ThreadPoolExecutor(
+            max_workers=Config.SEGMENTATION_SESSIONS, thread_name_prefix='segmentation'
+        )
+        
+        # Cache of final masks so retries and /preview-mask -> /predict skip segmentation
+        self.mask_cache = None
+        if Config.MASK_CACHE_ENABLED:
+            self.mask_cache = MaskCache(
+                max_entries=Config.MASK_CACHE_MAX_ENTRIES,
+                disk_dir=Config.MASK_CACHE_DIR,
+                disk_max_mb=Config.MASK_CACHE_DISK_MB
+            )
+        
+        if load:
+            self.load()
+    
+    def load(self):
+        """
+        Build the rembg session pool (once; later calls return the same pool)
+        
+        Returns:
+            The session pool, or None if no segmentation model could be loaded
+        """
+        with self._load_lock:
+            if self._load_attempted:
+                return self.session_pool
+            self._load_attempted = True
             
-        except Exception as e:
-            print(f"⚠️ u2net_human_seg failed: {e}")
-            print("   Falling back to u2net (general model)...")
             try:
-                self.session = new_session("u2net")
-                print("✅ rembg u2net model loaded!")
-            except Exception as e2:
-                print(f"❌ Failed to initialize rembg: {e2}")
-                self.session = None
+                print("🔄 Loading rembg AI model (u2net_human_seg)...")
+                print("   This model is specialized for human body segmentation")
+                print("   First run will download ~60MB model file...")
+                
+                # Use u2net_human_seg - BEST model for human bodies (u2net as fallback).
+                # Several sessions so concurrent requests/views don't serialize on one
+                self.session_pool = self.create_session_pool()
+                
+                print("✅ rembg AI model loaded successfully!")
+                print(f"   Model: {self.session_pool.model_name} x {self.session_pool.size} sessions")
+                
+            except Exception as e:
+                print(f"❌ Failed to initialize rembg: {e}")
+                self.session_pool = None
+            
+            return self.session_pool
     
-    def is_already_mask(self, img):
+    def warm_up(self, target_size=(512, 384)):
+        """
+        Run every segmentation session once at target_size so the first
+        request doesn't pay onnxruntime's first-run allocations
+        """
+        if self.load() is None:
+            raise RuntimeError("rembg AI model not loaded")
+        
+        self.session_pool.warm_up(target_size)
+        self.refine_mask(np.zeros(target_size, np.uint8))
+    
+    def create_session_pool(self, model_names=("u2net_human_seg", "u2net")):
+        """
+        Build a segmentation session pool from the current Config
+        (thread count and CPU sets come from the CPU budget)
+        """
+        return SessionPool(
+            model_names=model_names,
+            size=Config.SEGMENTATION_SESSIONS,
+            intra_op_threads=Config.SEGMENTATION_THREADS,
+            cpu_sets=Config.SEGMENTATION_CPU_SETS
+        )
+    
+    def get_cached_mask(self, image_bytes, target_size, content=None):
+        """
+        Look up a previously computed mask (for the same content hint)
+        
+        Returns:
+            (cache_key, mask) - mask is None on a miss (key is None if caching is off)
+        """
+        if self.mask_cache is None:
+            return None, None
+        
+        key = MaskCache.make_key(image_bytes, target_size, content)
+        return key, self.mask_cache.get(key)
+    
+    def get_cache_stats(self):
+        """Mask cache hit/miss counters"""
+        if self.mask_cache is None:
+            return {'enabled': False}
+        
+        return {'enabled': True, **self.mask_cache.get_stats()}
+    
+    def is_already_mask(self, img, content=None):
         """
         Smart detection: Is this already a binary mask?
+        One histogram over a strided subsample, so the cost is bounded
+        regardless of resolution. content='mask' / 'photo' (client hint)
+        skips detection entirely.
         Returns True if image is already processed
         """
-        if len(img.shape) == 3:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if content is not None:
+            print(f"🏷️  Client hint: content={content} (skipping detection)")
+            return content == 'mask'
+        
+        # Subsample to at most MASK_DETECTION_SAMPLES pixels before any conversion
+        height, width = img.shape[:2]
+        step = max(1, int(np.ceil(np.sqrt(height * width / self.MASK_DETECTION_SAMPLES))))
+        sample = np.ascontiguousarray(img[::step, ::step])
+        
+        if len(sample.shape) == 3:
+            gray = cv2.cvtColor(sample, cv2.COLOR_BGR2GRAY)
         else:
-            gray = img
+            gray = sample
         
-        # Check unique values
-        unique_values = np.unique(gray)
+        hist = np.bincount(gray.ravel(), minlength=256)
         
         # Binary mask has very few unique values
-        if len(unique_values) <= 5:
+        if np.count_nonzero(hist) <= 5:
             print("🎭 Smart Detection: Image is already a mask (skipping AI)")
             return True
         
         # Histogram check
-        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-        hist = hist.flatten() / hist.sum()
+        hist = hist / hist.sum()
         
         dark_pixels = hist[0:30].sum()
         bright_pixels = hist[226:256].sum()
@@ -61,14 +163,18 @@ class ImageProcessor:
         print("📸 Smart Detection: Color photo detected (applying AI segmentation)")
         return False
     
-    def remove_background_ai(self, image_bytes):
+    def remove_background_ai(self, image):
         """
-        Remove background using state-of-the-art AI
+        Remove background using state-of-the-art AI (rembg)
+        image: raw image bytes or an RGB uint8 array
         Returns RGBA image with transparent background
         """
         try:
             # Load image
-            input_image = Image.open(io.BytesIO(image_bytes))
+            if isinstance(image, np.ndarray):
+                input_image = Image.fromarray(image)
+            else:
+                input_image = Image.open(io.BytesIO(image))
             
             # Convert to RGB
             if input_image.mode != 'RGB':
@@ -87,15 +193,16 @@ class ImageProcessor:
             print("🤖 AI is removing background...")
             
             # Remove background with best quality settings
-            output_image = remove(
-                input_image,
-                session=self.session,
-                only_mask=False,  # Return full RGBA image
-                post_process_mask=True,  # Clean up mask edges
-                alpha_matting=False,  # Faster, still good quality
-                alpha_matting_foreground_threshold=240,
-                alpha_matting_background_threshold=10,
-            )
+            with self.session_pool.acquire() as session:
+                output_image = remove(
+                    input_image,
+                    session=session,
+                    only_mask=False,  # Return full RGBA image
+                    post_process_mask=True,  # Clean up mask edges
+                    alpha_matting=False,  # Faster, still good quality
+                    alpha_matting_foreground_threshold=240,
+                    alpha_matting_background_threshold=10,
+                )
             
             print("✅ Background removed successfully!")
             
@@ -156,13 +263,122 @@ class ImageProcessor:
             interpolation=cv2.INTER_LINEAR
         )
     
-    def process_image(self, image_bytes, target_size=(512, 384)):
+    def mask_from_image(self, img, target_size=(512, 384)):
+        """
+        Fast path for inputs that are already masks: binarize and resize
+        """
+        if len(img.shape) == 3:
+            mask = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        else:
+            mask = img
+        
+        # Just ensure binary
+        _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+        return self.resize_mask(mask, target_size)
+    
+    def segment_ai(self, images, target_size=(512, 384)):
+        """
+        AI body masks for decoded color photos
+        
+        The native engine runs u2net directly on the arrays (one session run
+        for all images) and refines at target_size; rembg is the fallback.
+        
+        Args:
+            images: List of BGR uint8 arrays
+            target_size: Output size (height, width)
+        
+        Returns:
+            List of binary masks at target_size
+        """
+        if self.load() is None:
+            raise RuntimeError("rembg AI model not loaded")
+        
+        rgb_images = [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in images]
+        
+        if Config.SEGMENTATION_ENGINE == 'native':
+            try:
+                print(f"🤖 AI is segmenting {len(images)} image(s) (native u2net)...")
+                masks = []
+                for soft_mask in self.session_pool.predict_masks(rgb_images, target_size):
+                    _, mask = cv2.threshold(soft_mask, 127, 255, cv2.THRESH_BINARY)
+                    masks.append(self.refine_mask(mask))
+                return masks
+            except Exception as e:
+                print(f"⚠️ Native segmentation failed ({e}), falling back to rembg")
+        
+        masks = []
+        for rgb in rgb_images:
+            img_no_bg = self.remove_background_ai(rgb)
+            mask = self.refine_mask(self.create_clean_mask(img_no_bg))
+            masks.append(self.resize_mask(mask, target_size))
+        return masks
+    
+    def segment_images(self, images, target_size=(512, 384), content=None):
+        """
+        Process several images, segmenting all color photos in one AI run
+        
+        Args:
+            images: List of raw image bytes
+            target_size: Output size (height, width)
+            content: Optional client hint for all images ('mask' or 'photo')
+        
+        Returns:
+            List of uint8 masks (H, W) - no PNG encoding
+        """
+        masks = [None] * len(images)
+        computed = {}  # index -> cache key of masks produced by this call
+        pending = []
+        
+        for index, image_bytes in enumerate(images):
+            cache_key, masks[index] = self.get_cached_mask(image_bytes, target_size, content)
+            if masks[index] is not None:
+                print("⚡ Cache hit: reusing segmentation mask")
+                continue
+            
+            computed[index] = cache_key
+            with admission.limit('mask'):
+                # Decoded once (reduced-scale for large JPEGs) and shared by every stage
+                img = decode_image(image_bytes, min_size=target_size)
+                print(f"📐 Input image size: {img.shape[1]}x{img.shape[0]} pixels")
+                
+                # SMART DETECTION
+                if self.is_already_mask(img, content):
+                    print("⚡ Fast path: Using existing mask")
+                    masks[index] = self.mask_from_image(img, target_size)
+                else:
+                    pending.append((index, img))
+        
+        if pending:
+            # Color photos - apply full AI pipeline
+            print(f"🚀 AI path: Processing {len(pending)} color photo(s)")
+            with admission.limit('segmentation'):
+                ai_masks = self.segment_ai([img for _, img in pending], target_size)
+            for (index, _), mask in zip(pending, ai_masks):
+                masks[index] = mask
+        
+        for index, cache_key in computed.items():
+            if cache_key is not None:
+                self.mask_cache.put(cache_key, masks[index])
+        
+        return masks
+    
+    def process_images(self, images, target_size=(512, 384), content=None):
+        """
+        Process several images into PNG masks (for clients that want the bytes)
+        
+        Returns:
+            List of processed masks as PNG bytes
+        """
+        return [cv2.imencode('.png', mask)[1].tobytes() for mask in self.segment_images(images, target_size, content)]
+    
+    def process_image(self, image_bytes, target_size=(512, 384), content=None):
         """
         Complete AI processing pipeline
         
         Args:
             image_bytes: Raw image bytes
             target_size: Output size (height, width)
+            content: Optional client hint ('mask' or 'photo')
         
         Returns:
             Processed mask as PNG bytes
@@ -172,49 +388,7 @@ class ImageProcessor:
             print("🎯 Starting Image Processing Pipeline")
             print("="*60)
             
-            # Load image for detection
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                raise ValueError("Invalid image - cannot decode")
-            
-            print(f"📐 Input image size: {img.shape[1]}x{img.shape[0]} pixels")
-            
-            # SMART DETECTION
-            if self.is_already_mask(img):
-                # Already a mask - minimal processing
-                print("⚡ Fast path: Using existing mask")
-                
-                if len(img.shape) == 3:
-                    mask = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                else:
-                    mask = img
-                
-                # Just ensure binary
-                _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
-                
-            else:
-                # Color photo - apply full AI pipeline
-                print("🚀 AI path: Processing color photo")
-                
-                if self.session is None:
-                    raise RuntimeError("rembg AI model not loaded")
-                
-                # Step 1: Remove background with AI
-                img_no_bg = self.remove_background_ai(image_bytes)
-                
-                # Step 2: Extract mask from alpha channel
-                print("🎭 Extracting body mask...")
-                mask = self.create_clean_mask(img_no_bg)
-                
-                # Step 3: Refine edges
-                print("✨ Refining mask edges...")
-                mask = self.refine_mask(mask)
-            
-            # Step 4: Resize to target
-            print(f"📏 Resizing to {target_size[1]}x{target_size[0]} pixels...")
-            mask = self.resize_mask(mask, target_size)
+            mask = self.segment_images([image_bytes], target_size, content)[0]
             
             # Convert to PNG bytes
             _, buffer = cv2.imencode('.png', mask)
@@ -231,7 +405,24 @@ class ImageProcessor:
             traceback.print_exc()
             raise
     
-    def process_and_preview(self, image_bytes, target_size=(512, 384)):
+    def process_pair(self, front_bytes, side_bytes, target_size=(512, 384), content=None):
+        """
+        Process front and side images concurrently
+        
+        onnxruntime releases the GIL, so the two views segment in parallel
+        on separate pooled sessions.
+        
+        Returns:
+            (front_mask, side_mask) uint8 arrays, ready for mask_to_tensor
+        """
+        # Copy the context so the worker sees this request's admission deadline
+        front_future = self.executor.submit(
+            contextvars.copy_context().run, self.segment_images, [front_bytes], target_size, content
+        )
+        side_mask = self.segment_images([side_bytes], target_size, content)[0]
+        return front_future.result()[0], side_mask
+    
+    def process_and_preview(self, image_bytes, target_size=(512, 384), content=None):
         """
         Generate preview with original, overlay, and final mask
         """
@@ -239,39 +430,36 @@ class ImageProcessor:
             print("\n🖼️  Generating preview...")
             
             # Load original
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            original = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            cache_key, mask_resized = self.get_cached_mask(image_bytes, target_size, content)
+            cache_miss = mask_resized is None
             
-            if original is None:
-                raise ValueError("Invalid image")
+            with admission.limit('mask'):
+                original = decode_image(image_bytes, min_size=target_size)
+                is_mask = self.is_already_mask(original, content)
+                if is_mask and cache_miss:
+                    mask_resized = self.mask_from_image(original, target_size)
             
             # Process based on type
-            if self.is_already_mask(original):
+            if is_mask:
                 # Already mask
-                if len(original.shape) == 3:
-                    mask = cv2.cvtColor(original, cv2.COLOR_BGR2GRAY)
-                else:
-                    mask = original
-                
-                _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
-                original_for_preview = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
+                original_for_preview = cv2.cvtColor(mask_resized, cv2.COLOR_GRAY2BGR)
                 
             else:
-                # Apply AI
-                if self.session is None:
-                    raise RuntimeError("rembg not initialized")
-                
-                img_no_bg = self.remove_background_ai(image_bytes)
-                mask = self.create_clean_mask(img_no_bg)
-                mask = self.refine_mask(mask)
+                if cache_miss:
+                    # Apply AI
+                    with admission.limit('segmentation'):
+                        mask_resized = self.segment_ai([original], target_size)[0]
+                else:
+                    print("⚡ Cache hit: reusing segmentation mask")
                 original_for_preview = original
             
+            if cache_miss and cache_key is not None:
+                self.mask_cache.put(cache_key, mask_resized)
+            
             # Resize everything
             original_resized = cv2.resize(original_for_preview, (target_size[1], target_size[0]))
-            mask_resized = self.resize_mask(mask, target_size)
             
             # Create green overlay preview
-            mask_3ch = cv2.cvtColor(mask_resized, cv2.COLOR_GRAY2BGR)
             green_overlay = np.zeros_like(original_resized)
             green_overlay[:, :, 1] = mask_resized  # Green channel
             
@@ -301,5 +489,6 @@ class ImageProcessor:
             traceback.print_exc()
             raise
 
-# Global instance
-image_processor = ImageProcessor()
\ No newline at end of file
+# Global instance, created on first access (sessions are built by load() at
+# startup, or on first use)
+__getattr__ = lazy_singletons(__name__, {'image_processor': lambda: ImageProcessor(load=False)})
\ No newline at end of file
@@ -0,0 +1,334 @@
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from services.admission_service import Overloaded
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+# Seconds between store reads while streaming events of a job another process runs
+STORE_POLL_S = 0.25
+
+
+class Job:
+    """One queued measurement request and its stage history"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'  # queued -> running -> completed / failed
+        self.stage = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []  # stage updates, ids increase from 1
+
+    @property
+    def done(self):
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self):
+        """JSON-serializable snapshot"""
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'stage': self.stage,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'events': [event['stage'] for event in self.events],
+        }
+
+
+class JobStore:
+    """Job snapshots and events in a sqlite file shared by the serve.py workers"""
+
+    def __init__(self, path):
+        """
+        Initialize job store
+
+        Args:
+            path: sqlite database file (created if missing)
+        """
+        self.path = str(path)
+        with self._db() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS jobs '
+                '(id TEXT PRIMARY KEY, status TEXT, finished_at REAL, data TEXT)'
+            )
+
+    @contextmanager
+    def _db(self):
+        """Connection for one transaction (connections are never shared across threads or forks)"""
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def put(self, job):
+        """Save a job's snapshot and event history"""
+        data = json.dumps({'job': job.to_dict(), 'events': job.events})
+        with self._db() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)',
+                (job.id, job.status, job.finished_at, data)
+            )
+
+    def get(self, job_id):
+        """{'job': snapshot, 'events': [...]} or None"""
+        with self._db() as db:
+            row = db.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def purge(self, ttl, max_jobs):
+        """Drop expired finished jobs, then the oldest finished ones over max_jobs"""
+        with self._db() as db:
+            db.execute('DELETE FROM jobs WHERE finished_at < ?', (time.time() - ttl,))
+            db.execute(
+                'DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished_at IS NOT NULL '
+                'ORDER BY finished_at LIMIT MAX(0, (SELECT COUNT(*) FROM jobs) - ?))',
+                (max_jobs,)
+            )
+
+    def count_by_status(self):
+        """{status: jobs} across every process using the store"""
+        with self._db() as db:
+            return dict(db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+
+class JobManager:
+    """Run measurement requests on a local worker pool and keep results for a while"""
+
+    def __init__(self, workers=2, ttl_seconds=600, max_jobs=1000, max_queued=16, store_path=None):
+        """
+        Initialize job manager
+
+        Args:
+            workers: Worker threads running jobs
+            ttl_seconds: How long finished jobs stay retrievable
+            max_jobs: Maximum retained jobs (oldest finished ones are dropped first)
+            max_queued: Jobs allowed to wait for a worker (each holds its uploads in memory)
+            store_path: sqlite file shared with other processes, so each of them can
+                report jobs that another one runs (None keeps jobs in this process only)
+        """
+        self.workers = max(1, int(workers))
+        self.ttl = float(ttl_seconds)
+        self.max_jobs = max(1, int(max_jobs))
+        self.max_queued = max(0, int(max_queued))
+        self.store = JobStore(store_path) if store_path else None
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()  # job_id -> Job, oldest first
+        self._cond = threading.Condition()
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'expired': 0, 'rejected': 0}
+        self._queued = 0
+        self._run_s = 0.0  # moving average of job run time
+
+    def submit(self, kind, fn, *args):
+        """
+        Queue a job
+
+        Args:
+            kind: Job type reported to clients (e.g. 'predict')
+            fn: Callable(report, *args) returning the JSON-serializable result;
+                report(stage, **data) publishes an intermediate stage
+            *args: Arguments for fn
+
+        Returns:
+            Snapshot of the new job
+
+        Raises:
+            Overloaded: 429 if max_queued jobs are already waiting for a worker,
+                503 if max_jobs unfinished jobs are already retained
+        """
+        job = Job(kind)
+
+        with self._cond:
+            self._purge(reserve=1)
+            if self._queued >= self.max_queued:
+                self._stats['rejected'] += 1
+                raise Overloaded(
+                    f"Server busy: {self._queued} jobs already queued, retry later", 429, self._expected_wait()
+                )
+            if len(self._jobs) >= self.max_jobs:
+                self._stats['rejected'] += 1
+                raise Overloaded(f"Too many pending jobs ({len(self._jobs)}), retry later", 503, self._expected_wait())
+
+            self._jobs[job.id] = job
+            self._queued += 1
+            self._stats['submitted'] += 1
+            self._publish(job, 'queued')
+            snapshot = job.to_dict()
+
+        self._executor.submit(self._run, job, fn, args)
+        return snapshot
+
+    def _expected_wait(self):
+        """Seconds until the queued jobs have started (caller holds the lock)"""
+        return self._run_s * (self._queued + 1) / self.workers
+
+    def _run(self, job, fn, args):
+        """Worker: run one job and record its outcome"""
+        with self._cond:
+            self._queued -= 1
+            job.status = 'running'
+            job.started_at = time.time()
+            self._publish(job, 'started')
+
+        def report(stage, **data):
+            with self._cond:
+                self._publish(job, stage, data)
+
+        try:
+            result = fn(report, *args)
+        except Exception as e:
+            logger.error(f"❌ Job {job.id} ({job.kind}) failed: {e}")
+            with self._cond:
+                self._record_run_time(job)
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = time.time()
+                self._stats['failed'] += 1
+                self._publish(job, 'failed', {'error': job.error})
+            return
+
+        with self._cond:
+            self._record_run_time(job)
+            job.status = 'completed'
+            job.result = result
+            job.finished_at = time.time()
+            self._stats['completed'] += 1
+            self._publish(job, 'completed', {'result': result})
+
+    def _record_run_time(self, job):
+        """Update the run time average (caller holds the lock)"""
+        run_s = time.time() - job.started_at
+        self._run_s = run_s if self._run_s == 0.0 else 0.8 * self._run_s + 0.2 * run_s
+
+    def _publish(self, job, stage, data=None):
+        """Append a stage event and wake stream readers (caller holds the lock)"""
+        job.stage = stage
+        job.events.append({
+            'id': len(job.events) + 1,
+            'stage': stage,
+            'status': job.status,
+            'timestamp': time.time(),
+            **(data or {}),
+        })
+        if self.store is not None:
+            self.store.put(job)
+        self._cond.notify_all()
+
+    def _purge(self, reserve=0):
+        """Drop expired finished jobs, then the oldest finished ones over max_jobs (caller holds the lock)"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and now - job.finished_at > self.ttl
+        ]
+
+        overflow = len(self._jobs) - len(expired) + reserve - self.max_jobs
+        if overflow > 0:
+            finished = [job_id for job_id, job in self._jobs.items() if job.done and job_id not in expired]
+            expired.extend(finished[:overflow])
+
+        for job_id in expired:
+            del self._jobs[job_id]
+        self._stats['expired'] += len(expired)
+
+        if self.store is not None:
+            self.store.purge(self.ttl, self.max_jobs)
+
+    def get(self, job_id):
+        """Snapshot of a job, or None if unknown or expired"""
+        with self._cond:
+            self._purge()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+
+        # Run by another serve.py worker
+        stored = self.store.get(job_id) if self.store is not None else None
+        return stored['job'] if stored else None
+
+    def wait_for_events(self, job_id, after=0, timeout=15.0):
+        """
+        Block until a job has events newer than `after`, finishes, or the timeout passes
+
+        Args:
+            job_id: Job to watch
+            after: Last event id the caller has seen
+            timeout: Maximum seconds to wait
+
+        Returns:
+            (new events, job finished) or (None, True) if the job is unknown
+        """
+        deadline = time.monotonic() + timeout
+        after = max(0, int(after))  # a negative slice start would replay only the last events
+
+        with self._cond:
+            while job_id in self._jobs:
+                job = self._jobs[job_id]
+                events = job.events[after:]
+                remaining = deadline - time.monotonic()
+                if events or job.done or remaining <= 0:
+                    return [dict(event) for event in events], job.done
+
+                self._cond.wait(remaining)
+
+        # Run by another serve.py worker: poll the shared store
+        while self.store is not None:
+            stored = self.store.get(job_id)
+            if stored is None:
+                break
+
+            events = stored['events'][after:]
+            done = stored['job']['status'] in TERMINAL_STATUSES
+            remaining = deadline - time.monotonic()
+            if events or done or remaining <= 0:
+                return events, done
+
+            time.sleep(min(STORE_POLL_S, remaining))
+
+        return None, True
+
+    def get_stats(self):
+        """Job counts by status (across all processes with a shared store) and this process's totals"""
+        with self._cond:
+            self._purge()
+            by_status = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            if self.store is not None:
+                by_status = self.store.count_by_status()
+
+            return {
+                'workers': self.workers,
+                'result_ttl_seconds': self.ttl,
+                'max_jobs': self.max_jobs,
+                'max_queued': self.max_queued,
+                'retained': len(self._jobs),
+                'shared_store': self.store.path if self.store is not None else None,
+                'by_status': by_status,
+                **self._stats,
+            }
+
+    def shutdown(self, wait=False):
+        """Stop accepting work; queued jobs are abandoned unless wait=True"""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
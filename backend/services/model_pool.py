@@ -0,0 +1,150 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+from core.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ModelPool:
+    """Keep several ModelInference instances resident with LRU eviction"""
+
+    def __init__(self, primary, memory_budget_mb=None, device='cpu', factory=None):
+        """
+        Initialize model pool
+
+        Args:
+            primary: The app's main ModelInference (serves requests without a
+                model selection; never evicted, follows /switch-model)
+            memory_budget_mb: Total resident budget for all models
+            device: Device for models loaded on demand
+            factory: Callable(model_name, device) -> ModelInference
+        """
+        if factory is None:
+            from services.model_service import ModelInference
+            factory = ModelInference
+
+        self.primary = primary
+        self.memory_budget = (memory_budget_mb or Config.MODEL_POOL_MEMORY_MB) * 1024 * 1024
+        self.device = device
+        self.factory = factory
+
+        self._models = OrderedDict()  # model_name -> ModelInference, least recent first
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._stats = {}
+
+        if hasattr(primary, 'add_switch_listener'):
+            primary.add_switch_listener(self._release_primary_duplicate)
+
+    def _record(self, model_name, key):
+        stats = self._stats.setdefault(
+            model_name, {'hits': 0, 'loads': 0, 'evictions': 0, 'last_used': None}
+        )
+        stats[key] += 1
+        stats['last_used'] = time.time()
+
+    def get(self, model_name=None):
+        """
+        Get a loaded model, loading (and evicting others) if needed
+
+        Args:
+            model_name: Config.MODELS key, or None for the primary model
+
+        Returns:
+            ModelInference serving that model
+        """
+        if model_name is not None and model_name not in Config.MODELS:
+            available = list(Config.MODELS.keys())
+            raise ValueError(f"Model '{model_name}' not found. Available: {available}")
+
+        with self._lock:
+            primary_name = self.primary.model_name
+            if model_name is None or model_name == primary_name:
+                self._record(primary_name, 'hits')
+                return self.primary
+
+            inference = self._models.get(model_name)
+            if inference is not None:
+                self._models.move_to_end(model_name)
+                self._record(model_name, 'hits')
+                return inference
+
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # Load outside the pool lock; concurrent requests for the same model wait here
+        with load_lock:
+            with self._lock:
+                inference = self._models.get(model_name)
+                if inference is not None:
+                    self._models.move_to_end(model_name)
+                    self._record(model_name, 'hits')
+                    return inference
+
+            logger.info(f"📥 Loading {model_name} into model pool...")
+            inference = self.factory(model_name=model_name, device=self.device)
+
+            with self._lock:
+                self._models[model_name] = inference
+                self._record(model_name, 'loads')
+                if model_name == self.primary.model_name:
+                    # The primary switched to this model while it was loading
+                    self._evict(model_name, 'now served by the primary')
+                self._evict_over_budget(protect=model_name)
+
+            return inference
+
+    def _release_primary_duplicate(self):
+        """After a primary switch: drop the pooled copy of the model it now serves"""
+        with self._lock:
+            if self.primary.model_name in self._models:
+                self._evict(self.primary.model_name, 'now served by the primary')
+
+    def _evict_over_budget(self, protect):
+        """Evict least recently used models until the pool fits its budget"""
+        while self._resident_bytes() > self.memory_budget:
+            victim = next((name for name in self._models if name != protect), None)
+            if victim is None:
+                break
+
+            self._evict(victim, 'memory budget')
+
+    def _evict(self, model_name, reason):
+        """Remove one pooled model and stop its background work (caller holds the lock)"""
+        inference = self._models.pop(model_name)
+        self._record(model_name, 'evictions')
+        inference.close()
+        logger.info(f"♻️ Evicted {model_name} from model pool ({reason})")
+
+    def _resident_bytes(self):
+        total = self.primary.get_resident_bytes()
+        return total + sum(inference.get_resident_bytes() for inference in self._models.values())
+
+    def get_stats(self):
+        """
+        Get per-model resident size and hit counts
+
+        Returns:
+            Dictionary of pool statistics
+        """
+        with self._lock:
+            resident = {self.primary.model_name: self.primary}
+            resident.update(self._models)
+
+            models = {}
+            for name in set(resident) | set(self._stats):
+                stats = dict(self._stats.get(name, {'hits': 0, 'loads': 0, 'evictions': 0, 'last_used': None}))
+                inference = resident.get(name)
+                stats['resident'] = inference is not None
+                stats['primary'] = name == self.primary.model_name
+                stats['resident_mb'] = round(inference.get_resident_bytes() / 1024 / 1024, 1) if inference else 0.0
+                models[name] = stats
+
+            return {
+                'memory_budget_mb': round(self.memory_budget / 1024 / 1024, 1),
+                'resident_mb': round(self._resident_bytes() / 1024 / 1024, 1),
+                'lru_order': list(self._models.keys()),
+                'models': models
+            }
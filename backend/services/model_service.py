@@ -3,18 +3,36 @@ import torch.nn as nn
 import timm
 import numpy as np
 from pathlib import Path
+import inspect
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from core.config import Config
-from utils.image_utils import preprocess_image
-from services.hf_service import hf_manager
+from utils.image_utils import preprocess_image, mask_to_tensor
+from services import hf_service
+from services.batching_service import MicroBatcher
+from services.admission_service import admission
+from services.cache_service import LRUCache, content_hash
+from services.onnx_service import OnnxModelRunner, export_model_to_onnx, check_onnx_parity
+from services.quantization_service import quantize_model, load_calibration_batches, split_holdout, evaluate_quantization
+from services.optimization_service import optimize_for_inference, gray_to_rgb_input, rgb_to_gray_input
+
+# Pooled feature size of each backbone (avoids a dummy forward to discover it)
+BACKBONE_FEATURE_DIMS = {
+    'efficientnet_b3': 1536,
+    'mobilenetv3_large_100': 1280,
+    'resnet50': 2048,
+}
 
 class DualInputBodyModel(nn.Module):
     """Dual-input CNN model for body measurement prediction"""
     
-    def __init__(self, backbone_name='efficientnet_b3', num_measurements=14, pretrained=False):
+    def __init__(self, backbone_name='efficientnet_b3', num_measurements=14, pretrained=False, feature_dim=None):
         super().__init__()
         self.backbone_name = backbone_name
         self.num_measurements = num_measurements
+        self.input_channels = 3  # 1 after fold_grayscale_stems (masks fed as 1xHxW)
         
         # Two encoders for front and side views
         self.front_encoder = timm.create_model(
@@ -30,10 +48,13 @@ class DualInputBodyModel(nn.Module):
             global_pool='avg'
         )
         
-        # Get feature dimension
-        with torch.no_grad():
-            dummy = torch.randn(1, 3, 512, 384)
-            feature_dim = self.front_encoder(dummy).shape[1]
+        # Get feature dimension (dummy forward only for unknown backbones)
+        if feature_dim is None:
+            feature_dim = BACKBONE_FEATURE_DIMS.get(backbone_name)
+        if feature_dim is None:
+            with torch.no_grad():
+                dummy = torch.randn(1, 3, 512, 384)
+                feature_dim = self.front_encoder(dummy).shape[1]
         
         # Regression head
         self.regression_head = nn.Sequential(
@@ -58,74 +79,373 @@ class DualInputBodyModel(nn.Module):
         combined = torch.cat([front_features, side_features], dim=1)
         return self.regression_head(combined)
 
+class ModelState:
+    """Everything tied to one loaded model; swapped as a unit on model switch"""
+    
+    def __init__(self, model_name, model_config):
+        self.model_name = model_name
+        self.model_config = model_config
+        self.model = None
+        self.target_mean = None
+        self.target_std = None
+        self.channels_last = False
+        self.input_channels = 3
+        self.num_parameters = 0
+        self.onnx_parity = None
+        self.quantization_report = None
+        self.optimization_report = None
+        self.load_time_ms = None
+        self.load_timings = None
+        self.checkpoint_id = None
+
 class ModelInference:
     """Handle model loading and inference"""
     
     def __init__(self, model_name='efficientnet-b3', device='cpu'):
-        self.model_name = model_name
         self.device = torch.device(device if torch.cuda.is_available() else 'cpu')
-        self.model_config = Config.MODELS.get(model_name)
+        self.backend = Config.MODEL_BACKEND
+        model_config = Config.MODELS.get(model_name)
         
-        if not self.model_config:
+        if not model_config:
             raise ValueError(f"Model {model_name} not found in config")
         
-        # Load model
-        self.model = self._load_model()
-        self.model.eval()
+        if self.backend not in ('torch', 'onnx'):
+            raise ValueError(f"Unknown MODEL_BACKEND '{self.backend}'. Use 'torch' or 'onnx'")
+        
+        # Load normalization stats and model from a single checkpoint read
+        self._state = self._load(ModelState(model_name, model_config))
+        
+        # Background model switching
+        self._switch_lock = threading.Lock()
+        self._switch_thread = None
+        self._switch_listeners = []
+        self.switch_status = {'state': 'idle'}
+        
+        # Measurement results for previously seen mask pairs
+        self.result_cache = None
+        if Config.RESULT_CACHE_ENABLED:
+            self.result_cache = LRUCache(
+                max_entries=Config.RESULT_CACHE_MAX_ENTRIES,
+                ttl_seconds=Config.RESULT_CACHE_TTL_S
+            )
+        
+        # Per-thread input buffers reused across requests (see predict_masks)
+        self._buffers = threading.local()
+        
+        # Micro-batching queue in front of the forward pass
+        self.batcher = None
+        if Config.MICRO_BATCHING:
+            self.batcher = MicroBatcher(
+                self.predict_batch,
+                max_batch_size=Config.BATCH_MAX_SIZE,
+                window_ms=Config.BATCH_WINDOW_MS
+            )
+        
+        print(f"✅ Model loaded: {self.model_config['name']} on {self.device} ({self.load_time_ms} ms)")
+    
+    # Current model state (read-only views; replaced atomically by switch_model)
+    model_name = property(lambda self: self._state.model_name)
+    model_config = property(lambda self: self._state.model_config)
+    model = property(lambda self: self._state.model)
+    target_mean = property(lambda self: self._state.target_mean)
+    target_std = property(lambda self: self._state.target_std)
+    channels_last = property(lambda self: self._state.channels_last)
+    input_channels = property(lambda self: self._state.input_channels)
+    num_parameters = property(lambda self: self._state.num_parameters)
+    onnx_parity = property(lambda self: self._state.onnx_parity)
+    quantization_report = property(lambda self: self._state.quantization_report)
+    optimization_report = property(lambda self: self._state.optimization_report)
+    load_time_ms = property(lambda self: self._state.load_time_ms)
+    load_timings = property(lambda self: self._state.load_timings)
+    
+    def _load(self, state, progress=None):
+        """
+        Read the checkpoint once; normalization stats and weights both come from it
         
-        # Load normalization stats
-        self.load_normalization_stats()
+        Args:
+            state: ModelState to fill in
+            progress: Optional callable(stage) for switch progress reporting
+        
+        Returns:
+            The loaded ModelState
+        """
+        progress = progress or (lambda stage: None)
+        load_started = time.perf_counter()
         
-        print(f"✅ Model loaded: {self.model_config['name']} on {self.device}")
+        # The weightless skeleton doesn't need the checkpoint: build it while
+        # the checkpoint is downloaded / read
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-skeleton') as executor:
+            skeleton_future = executor.submit(self._build_skeleton, state)
+            
+            progress('reading_checkpoint')
+            checkpoint, model_path = self._read_checkpoint(state)
+            checkpoint_ms = (time.perf_counter() - load_started) * 1000
+            state.checkpoint_id = self._checkpoint_identity(state, model_path)
+            
+            try:
+                skeleton, skeleton_ms = skeleton_future.result()
+            except Exception as e:
+                print(f"⚠️ Meta-device skeleton failed ({e}), building model after the checkpoint")
+                skeleton, skeleton_ms = None, None
+        
+        # Stats first (needed to report quantization drift in cm)
+        progress('building_model')
+        build_started = time.perf_counter()
+        self.load_normalization_stats(checkpoint, state)
+        state.model = self._load_model(state, checkpoint, model_path, skeleton)
+        
+        state.load_time_ms = round((time.perf_counter() - load_started) * 1000, 1)
+        state.load_timings = {
+            'checkpoint_ms': round(checkpoint_ms, 1),
+            'skeleton_ms': round(skeleton_ms, 1) if skeleton_ms is not None else None,
+            'build_ms': round((time.perf_counter() - build_started) * 1000, 1),
+        }
+        return state
     
-    def _load_model(self):
-        """Load trained model from checkpoint (auto-downloads from HuggingFace if missing)"""
-        model_path = self.model_config['path']
+    def _resolve_model_path(self, state):
+        """
+        Local checkpoint path (auto-downloads from HuggingFace if missing)
+        
+        Checkpoints in the models directory always go through the download
+        manager, which re-downloads a file that doesn't match its manifest
+        entry, so a truncated .pth is never loaded.
+        """
+        model_path = state.model_config['path']
+        hf_manager = hf_service.hf_manager
+        
+        if model_path.exists() and model_path.parent != hf_manager.models_dir:
+            return model_path  # outside the managed directory: no manifest to check against
         
         if not model_path.exists():
-            # Auto-download from Hugging Face using model key
             print(f"⬇️  Model not found locally, downloading from Hugging Face...")
+        try:
+            # Use model_name (key) to download the correct model
+            return hf_manager.download_model(state.model_name)
+        except Exception as e:
+            raise FileNotFoundError(
+                f"Failed to download model: {e}\n"
+                f"Please check Hugging Face repository: {hf_manager.HF_REPO_ID}"
+            )
+    
+    def _read_checkpoint(self, state):
+        """
+        Read the checkpoint file once, memory-mapping the weights when supported
+        
+        Returns:
+            (checkpoint dict, checkpoint path)
+        """
+        model_path = self._resolve_model_path(state)
+        
+        try:
+            checkpoint = self._torch_load(model_path)
+        except Exception as e:
+            hf_manager = hf_service.hf_manager
+            if Path(model_path).parent != hf_manager.models_dir:
+                raise
+            # A file nothing could vouch for (e.g. truncated, source unreachable at startup)
+            print(f"⚠️ Could not read {Path(model_path).name} ({e}), downloading it again")
             try:
-                # Use model_name (key) to download the correct model
-                downloaded_path = hf_manager.download_model(self.model_name)
-                model_path = downloaded_path
-                print(f"✅ Model downloaded: {self.model_name}")
-            except Exception as e:
-                raise FileNotFoundError(
-                    f"Failed to download model: {e}\n"
-                    f"Please check Hugging Face repository: {hf_manager.HF_REPO_ID}"
-                )
+                model_path = hf_manager.download_model(state.model_name, force=True)
+            except Exception as download_error:
+                raise FileNotFoundError(f"Unreadable checkpoint {model_path}: {download_error}") from e
+            checkpoint = self._torch_load(model_path)
+        
+        return checkpoint, model_path
+    
+    @staticmethod
+    def _torch_load(model_path):
+        """torch.load on CPU, memory-mapping the weights when supported"""
+        load_kwargs = {'map_location': 'cpu'}
+        load_params = inspect.signature(torch.load).parameters
+        if 'weights_only' in load_params:
+            load_kwargs['weights_only'] = False  # checkpoints also carry numpy stats
+        if 'mmap' in load_params:
+            load_kwargs['mmap'] = True
         
-        # Load checkpoint
-        checkpoint = torch.load(model_path, map_location=self.device)
+        try:
+            return torch.load(model_path, **load_kwargs)
+        except RuntimeError:
+            # Legacy (non-zipfile) checkpoints cannot be memory-mapped
+            load_kwargs.pop('mmap', None)
+            return torch.load(model_path, **load_kwargs)
+    
+    def _checkpoint_identity(self, state, model_path):
+        """Identify the exact weights/stats being served (for result caching)"""
+        stat = Path(model_path).stat()
+        quantization = state.model_config.get('quantization') or 'fp32'
+        return f"{Path(model_path).name}:{stat.st_size}:{stat.st_mtime_ns}:{self.backend}:{quantization}"
+    
+    def _build_skeleton(self, state):
+        """
+        DualInputBodyModel on the meta device (module structure only, no memory)
         
-        # Create model
-        model = DualInputBodyModel(
-            backbone_name=self.model_config['backbone'],
-            num_measurements=len(Config.MEASUREMENT_COLUMNS),
-            pretrained=False
-        )
+        Returns:
+            (model, milliseconds taken)
+        """
+        started = time.perf_counter()
+        with torch.device('meta'):
+            model = DualInputBodyModel(
+                backbone_name=state.model_config['backbone'],
+                num_measurements=len(Config.MEASUREMENT_COLUMNS),
+                pretrained=False
+            )
+        return model, (time.perf_counter() - started) * 1000
+    
+    def _build_model(self, state, state_dict, skeleton=None):
+        """
+        Build DualInputBodyModel directly from a state dict
+        
+        Modules are created on the meta device so encoders are never randomly
+        initialized; the checkpoint tensors are then assigned (or copied) in.
+        
+        Args:
+            skeleton: Meta-device model from _build_skeleton (built here if None)
+        """
+        backbone = state.model_config['backbone']
+        num_measurements = len(Config.MEASUREMENT_COLUMNS)
+        
+        try:
+            model = skeleton if skeleton is not None else self._build_skeleton(state)[0]
+            
+            if 'assign' in inspect.signature(model.load_state_dict).parameters:
+                # Keep the (memory-mapped) checkpoint tensors instead of copying
+                model.load_state_dict(state_dict, assign=True)
+            else:
+                model.to_empty(device='cpu')
+                model.load_state_dict(state_dict)
+            
+            tensors = list(model.parameters()) + list(model.buffers())
+            if any(t.is_meta for t in tensors):
+                raise RuntimeError("state dict did not cover every tensor")
+        
+        except (RuntimeError, NotImplementedError) as e:
+            print(f"⚠️ Meta-device build failed ({e}), building model eagerly")
+            model = DualInputBodyModel(
+                backbone_name=backbone,
+                num_measurements=num_measurements,
+                pretrained=False
+            )
+            model.load_state_dict(state_dict)
+        
+        return model.to(self.device).eval()
+    
+    def _load_model(self, state, checkpoint, model_path, skeleton=None):
+        """Build the serving model from an already-read checkpoint"""
+        state_dict = checkpoint['model_state_dict']
+        model = self._build_model(state, state_dict, skeleton)
+        
+        state.num_parameters = sum(p.numel() for p in model.parameters())
+        quantization = state.model_config.get('quantization')
+        
+        # Freeze for inference; layout/JIT changes only when eager fp32 PyTorch serves
+        if Config.OPTIMIZE_MODEL:
+            serve_eager = self.backend == 'torch' and not quantization
+            model, state.optimization_report = optimize_for_inference(
+                model,
+                channels_last=serve_eager and Config.CHANNELS_LAST,
+                jit_mode=Config.MODEL_JIT if serve_eager else 'none',
+                img_size=Config.IMG_SIZE,
+                grayscale=Config.GRAYSCALE_STEM and not quantization
+            )
+            state.channels_last = state.optimization_report['applied'] and state.optimization_report['channels_last']
+            if state.optimization_report['applied'] and state.optimization_report['grayscale_stem']:
+                state.input_channels = 1
+            
+            if not state.optimization_report['applied']:
+                print("⚠️ Optimized model diverged, rebuilding unoptimized model")
+                model = self._build_model(state, state_dict)
         
-        # Load weights
-        model.load_state_dict(checkpoint['model_state_dict'])
-        model.to(self.device)
+        if quantization:
+            return self._quantize(state, model, quantization)
+        
+        if self.backend == 'onnx':
+            return self._load_onnx_backend(state, model, model_path)
         
         return model
     
-    def load_normalization_stats(self):
-        """Load mean and std for denormalization (auto-downloads if missing)"""
-        # Try to load from model checkpoint first
-        model_path = self.model_config['path']
+    def _quantize(self, state, model, mode):
+        """Serve an int8 copy of the model and record its speedup/drift vs fp32"""
+        if self.device.type != 'cpu' or self.backend != 'torch':
+            print(f"⚠️ '{mode}' quantization only applies to the PyTorch CPU backend, skipping")
+            return model
+        
+        samples = load_calibration_batches(
+            Config.QUANT_CALIBRATION_DIR, Config.IMG_SIZE, Config.QUANT_CALIBRATION_SAMPLES
+        )
+        calibration, held_out = samples, samples
+        if mode == 'static' and samples is not None:
+            # Static scales are fitted to the calibration masks, so measure drift on others
+            calibration, held_out = split_holdout(samples, Config.QUANT_HOLDOUT_FRACTION)
         
         try:
-            checkpoint = torch.load(model_path, map_location=self.device)
-            
-            if 'target_mean' in checkpoint and 'target_std' in checkpoint:
-                self.target_mean = torch.FloatTensor(checkpoint['target_mean']).to(self.device)
-                self.target_std = torch.FloatTensor(checkpoint['target_std']).to(self.device)
-                return
-        except:
-            pass
+            quantized = quantize_model(model, mode, calibration)
+        except Exception as e:
+            print(f"⚠️ {mode} quantization failed ({e}), serving fp32 model")
+            return model
+        
+        # Drift is only meaningful on real masks; fall back to noise without them
+        if held_out is not None:
+            evaluation, inputs = held_out, 'held-out' if mode == 'static' else 'sample'
+        elif samples is not None:
+            evaluation, inputs = samples, 'calibration'  # too few masks to hold any out
+        else:
+            height, width = Config.IMG_SIZE
+            evaluation = (torch.randn(4, 3, height, width), torch.randn(4, 3, height, width))
+            inputs = 'random'
+        
+        report = evaluate_quantization(model, quantized, *evaluation, state.target_std)
+        report.update({
+            'mode': mode,
+            'inputs': inputs,
+            'calibration_samples': len(calibration[0]) if mode == 'static' else 0,
+        })
+        state.quantization_report = report
+        
+        print(f"✅ {mode} int8 quantization: {report['speedup']}x speedup, "
+              f"max MAE drift {report['max_mae_cm']} cm ({inputs} inputs)")
+        return quantized
+    
+    def _load_onnx_backend(self, state, model, model_path):
+        """Export (if stale) and serve the model through onnxruntime"""
+        suffix = '_gray' if state.input_channels == 1 else ''
+        onnx_path = Config.ONNX_DIR / f"{state.model_name}{suffix}.onnx"
+        
+        if not onnx_path.exists() or onnx_path.stat().st_mtime < Path(model_path).stat().st_mtime:
+            export_model_to_onnx(model, onnx_path, Config.IMG_SIZE, channels=state.input_channels)
+        
+        runner = OnnxModelRunner(
+            onnx_path,
+            device=str(self.device),
+            intra_op_threads=Config.ONNX_INTRA_OP_THREADS
+        )
+        
+        # Guard against export drift before serving from the graph
+        state.onnx_parity = check_onnx_parity(
+            model, runner, Config.IMG_SIZE, atol=Config.ONNX_PARITY_ATOL, channels=state.input_channels
+        )
+        if not state.onnx_parity['passed']:
+            print(f"⚠️ ONNX parity check failed (max diff {state.onnx_parity['max_abs_diff']:.2e}), "
+                  f"falling back to PyTorch")
+            return model
+        
+        print(f"✅ ONNX Runtime backend ready (max diff {state.onnx_parity['max_abs_diff']:.2e})")
+        return runner
+    
+    def load_normalization_stats(self, checkpoint=None, state=None):
+        """Load mean and std for denormalization (auto-downloads if missing)"""
+        state = state or self._state
+        
+        # Try the model checkpoint first (reuses an already-read checkpoint)
+        if checkpoint is None:
+            try:
+                checkpoint, _ = self._read_checkpoint(state)
+            except Exception:
+                checkpoint = {}
+        
+        if 'target_mean' in checkpoint and 'target_std' in checkpoint:
+            state.target_mean = torch.FloatTensor(checkpoint['target_mean']).to(self.device)
+            state.target_std = torch.FloatTensor(checkpoint['target_std']).to(self.device)
+            return
         
         # Fallback: try to load from normalization_stats.json
         stats_path = Config.MODEL_DIR / 'normalization_stats.json'
@@ -134,9 +454,9 @@ class ModelInference:
             # Try auto-download from Hugging Face
             print("⬇️  normalization_stats.json not found, downloading...")
             try:
-                stats = hf_manager.load_normalization_stats()
-                self.target_mean = torch.FloatTensor(stats['target_mean']).to(self.device)
-                self.target_std = torch.FloatTensor(stats['target_std']).to(self.device)
+                stats = hf_service.hf_manager.load_normalization_stats()
+                state.target_mean = torch.FloatTensor(stats['target_mean']).to(self.device)
+                state.target_std = torch.FloatTensor(stats['target_std']).to(self.device)
                 print("✅ Normalization stats loaded from Hugging Face")
                 return
             except Exception as e:
@@ -145,18 +465,19 @@ class ModelInference:
             # Load from local file
             with open(stats_path, 'r') as f:
                 stats = json.load(f)
-            self.target_mean = torch.FloatTensor(stats['target_mean']).to(self.device)
-            self.target_std = torch.FloatTensor(stats['target_std']).to(self.device)
+            state.target_mean = torch.FloatTensor(stats['target_mean']).to(self.device)
+            state.target_std = torch.FloatTensor(stats['target_std']).to(self.device)
             return
         
         # Default values (not recommended, should have proper stats)
         print("⚠️ Warning: Using default normalization (may affect accuracy)")
-        self.target_mean = torch.zeros(len(Config.MEASUREMENT_COLUMNS)).to(self.device)
-        self.target_std = torch.ones(len(Config.MEASUREMENT_COLUMNS)).to(self.device)
+        state.target_mean = torch.zeros(len(Config.MEASUREMENT_COLUMNS)).to(self.device)
+        state.target_std = torch.ones(len(Config.MEASUREMENT_COLUMNS)).to(self.device)
     
-    def denormalize(self, normalized_tensor):
+    def denormalize(self, normalized_tensor, state=None):
         """Convert normalized predictions back to real values"""
-        return normalized_tensor * self.target_std + self.target_mean
+        state = state or self._state
+        return normalized_tensor * state.target_std + state.target_mean
     
     def predict(self, front_image_bytes, side_image_bytes):
         """
@@ -170,46 +491,188 @@ class ModelInference:
             Dictionary of measurements
         """
         # Preprocess images
-        front_img = preprocess_image(front_image_bytes, Config.IMG_SIZE)
-        side_img = preprocess_image(side_image_bytes, Config.IMG_SIZE)
+        channels = self.input_channels
+        front_img = preprocess_image(front_image_bytes, Config.IMG_SIZE, channels)
+        side_img = preprocess_image(side_image_bytes, Config.IMG_SIZE, channels)
         
-        # Add batch dimension
-        front_img = front_img.unsqueeze(0).to(self.device)
-        side_img = side_img.unsqueeze(0).to(self.device)
+        return self.predict_tensors(front_img, side_img)
+    
+    def predict_masks(self, front_mask, side_mask):
+        """
+        Predict body measurements from in-memory masks (no PNG round-trip)
         
-        # Inference
-        with torch.no_grad():
-            normalized_output = self.model(front_img, side_img)
-            output = self.denormalize(normalized_output)
+        The masks are normalized straight into this thread's reused float32
+        input buffer, which is the batch itself when micro-batching is off.
         
-        # Convert to dictionary
-        measurements = {}
-        output_np = output.cpu().numpy()[0]
+        Args:
+            front_mask: Front view uint8 mask (H, W)
+            side_mask: Side view uint8 mask (H, W)
         
-        for i, col in enumerate(Config.MEASUREMENT_COLUMNS):
-            measurements[col] = float(output_np[i])
+        Returns:
+            Dictionary of measurements
+        """
+        channels = self.input_channels
+        buffers = getattr(self._buffers, 'pair', None)
+        if buffers is None or buffers.shape[2] != channels:
+            height, width = Config.IMG_SIZE
+            buffers = self._buffers.pair = torch.empty(2, 1, channels, height, width)
+        
+        # Safe to reuse: this thread blocks until its prediction is done
+        front_img = mask_to_tensor(front_mask, Config.IMG_SIZE, out=buffers[0, 0], channels=channels)
+        side_img = mask_to_tensor(side_mask, Config.IMG_SIZE, out=buffers[1, 0], channels=channels)
+        
+        return self.predict_tensors(front_img, side_img)
+    
+    def predict_tensors(self, front_img, side_img):
+        """
+        Predict body measurements for one preprocessed (C, H, W) pair
+        
+        Returns:
+            Dictionary of measurements
+        """
+        # Same masks on the same weights -> same measurements
+        cache_key = None
+        if self.result_cache is not None:
+            state = self._state
+            cache_key = (
+                state.model_name,
+                state.checkpoint_id,
+                content_hash(front_img.numpy()),
+                content_hash(side_img.numpy())
+            )
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return dict(cached)
+        
+        # Batched forward (shared with concurrent requests when micro-batching)
+        with admission.limit('inference'):
+            if self.batcher is not None:
+                measurements = self.batcher.predict(front_img, side_img)
+            else:
+                measurements = self.predict_batch(front_img.unsqueeze(0), side_img.unsqueeze(0))[0]
+        
+        if cache_key is not None:
+            self.result_cache.set(cache_key, dict(measurements))
         
         return measurements
     
+    def predict_batch(self, front_batch, side_batch):
+        """
+        Predict body measurements for a batch of preprocessed images
+        
+        Args:
+            front_batch: Front view tensor (N, C, H, W) or list of (C, H, W) tensors
+            side_batch: Side view tensor (N, C, H, W) or list of (C, H, W) tensors
+        
+        Returns:
+            List of N measurement dictionaries
+        """
+        if isinstance(front_batch, (list, tuple)):
+            front_batch = torch.stack(front_batch)
+        if isinstance(side_batch, (list, tuple)):
+            side_batch = torch.stack(side_batch)
+        
+        # One snapshot per batch so a concurrent switch never mixes weights and stats
+        state = self._state
+        
+        # Inputs prepared for the other input layout (e.g. just before a switch)
+        front_batch = self._match_channels(front_batch, state.input_channels).to(self.device)
+        side_batch = self._match_channels(side_batch, state.input_channels).to(self.device)
+        
+        if state.channels_last:
+            front_batch = front_batch.contiguous(memory_format=torch.channels_last)
+            side_batch = side_batch.contiguous(memory_format=torch.channels_last)
+        
+        # Inference
+        with torch.no_grad():
+            normalized_output = state.model(front_batch, side_batch)
+            output = self.denormalize(normalized_output, state)
+        
+        # Convert to dictionaries
+        results = []
+        for row in output.cpu().numpy():
+            measurements = {}
+            for i, col in enumerate(Config.MEASUREMENT_COLUMNS):
+                measurements[col] = float(row[i])
+            results.append(measurements)
+        
+        return results
+    
+    @staticmethod
+    def _match_channels(batch, channels):
+        """Convert between RGB-normalized and grayscale-stem (mask / 255) inputs"""
+        if batch.shape[1] == channels:
+            return batch
+        return rgb_to_gray_input(batch) if channels == 1 else gray_to_rgb_input(batch)
+    
+    def get_batching_stats(self):
+        """Get micro-batching queue statistics"""
+        if self.batcher is None:
+            return {'enabled': False}
+        
+        stats = self.batcher.get_stats()
+        stats['enabled'] = True
+        return stats
+    
+    def get_cache_stats(self):
+        """Get measurement result cache hit/miss counters"""
+        if self.result_cache is None:
+            return {'enabled': False}
+        
+        return {'enabled': True, **self.result_cache.get_stats()}
+    
+    def get_resident_bytes(self):
+        """Approximate memory held by the serving model's weights"""
+        model = self.model
+        if isinstance(model, OnnxModelRunner):
+            return model.onnx_path.stat().st_size
+        
+        return sum(
+            t.numel() * t.element_size()
+            for t in model.state_dict().values()
+            if torch.is_tensor(t)
+        )
+    
+    def close(self):
+        """Stop background work (micro-batcher) before the model is dropped"""
+        if self.batcher is not None:
+            self.batcher.shutdown()
+    
     def get_model_info(self):
         """Get model information"""
+        state = self._state
         return {
-            'name': self.model_config['name'],
-            'backbone': self.model_config['backbone'],
-            'description': self.model_config.get('description', ''),
-            'speed': self.model_config['speed'],
-            'accuracy': self.model_config['accuracy'],
+            'name': state.model_config['name'],
+            'backbone': state.model_config['backbone'],
+            'description': state.model_config.get('description', ''),
+            'speed': state.model_config['speed'],
+            'accuracy': state.model_config['accuracy'],
             'device': str(self.device),
-            'parameters': sum(p.numel() for p in self.model.parameters()),
-            'measurements': Config.MEASUREMENT_COLUMNS
+            'backend': 'onnx' if isinstance(state.model, OnnxModelRunner) else 'torch',
+            'onnx_parity': state.onnx_parity,
+            'quantization': state.quantization_report,
+            'optimization': state.optimization_report,
+            'input_channels': state.input_channels,
+            'parameters': state.num_parameters,
+            'load_time_ms': state.load_time_ms,
+            'load_timings': state.load_timings,
+            'measurements': Config.MEASUREMENT_COLUMNS,
+            'batching': self.get_batching_stats(),
+            'result_cache': self.get_cache_stats(),
+            'switch': self.get_switch_status()
         }
     
-    def switch_model(self, new_model_name):
+    def switch_model(self, new_model_name, wait=False):
         """
-        Switch to a different model
+        Switch to a different model without interrupting traffic
+        
+        The new model and its normalization stats are loaded and warmed up on
+        a background thread while the current model keeps serving; the two
+        are then swapped in a single assignment.
         
         Args:
-            new_model_name: Name of model to switch to ('efficientnet-b3', 'mobilenetv3', 'resnet50')
+            new_model_name: Name of model to switch to ('model_v1', 'model_v2', 'model_v3')
+            wait: Block until the switch has finished
         
         Returns:
             Dictionary with switch status
@@ -218,35 +681,133 @@ class ModelInference:
             available = list(Config.MODELS.keys())
             raise ValueError(f"Model '{new_model_name}' not found. Available: {available}")
         
-        if new_model_name == self.model_name:
+        with self._switch_lock:
+            if self.switch_status['state'] == 'loading':
+                if self.switch_status['target'] != new_model_name:
+                    raise RuntimeError(
+                        f"Switch to {self.switch_status['target']} already in progress"
+                    )
+                worker = self._switch_thread
+            
+            elif new_model_name == self.model_name:
+                return {
+                    'status': 'already_loaded',
+                    'model': new_model_name,
+                    'message': f'Model {new_model_name} is already loaded'
+                }
+            
+            else:
+                print(f"🔄 Switching from {self.model_name} to {new_model_name} in background...")
+                self.switch_status = {
+                    'state': 'loading',
+                    'stage': 'queued',
+                    'source': self.model_name,
+                    'target': new_model_name,
+                    'started_at': time.time()
+                }
+                worker = threading.Thread(
+                    target=self._run_switch, args=(new_model_name,),
+                    name=f'switch-{new_model_name}', daemon=True
+                )
+                self._switch_thread = worker
+                worker.start()
+        
+        if wait:
+            worker.join()
+            status = self.get_switch_status()
+            if status['state'] == 'failed':
+                return {
+                    'status': 'failed',
+                    'model': new_model_name,
+                    'message': f"Failed to switch to {new_model_name}: {status.get('error')}",
+                    'switch': status
+                }
             return {
-                'status': 'already_loaded',
+                'status': 'success',
                 'model': new_model_name,
-                'message': f'Model {new_model_name} is already loaded'
+                'message': f"Successfully switched to {self.model_config['name']}",
+                'info': self.get_model_info()
             }
         
-        print(f"🔄 Switching from {self.model_name} to {new_model_name}...")
-        
-        # Update config
-        self.model_name = new_model_name
-        self.model_config = Config.MODELS[new_model_name]
-        
-        # Reload model
-        self.model = self._load_model()
-        self.model.eval()
-        
-        # Reload normalization stats
-        self.load_normalization_stats()
-        
-        print(f"✅ Switched to {self.model_config['name']}")
-        
         return {
-            'status': 'success',
+            'status': 'switching',
             'model': new_model_name,
-            'message': f"Successfully switched to {self.model_config['name']}",
-            'info': self.get_model_info()
+            'message': f"Loading {Config.MODELS[new_model_name]['name']} in background; "
+                       f"{self.model_config['name']} keeps serving until it is ready",
+            'switch': self.get_switch_status()
         }
     
+    def add_switch_listener(self, callback):
+        """Call callback() after every completed switch (e.g. ModelPool dropping a duplicate)"""
+        self._switch_listeners.append(callback)
+    
+    def _set_switch_stage(self, stage):
+        self.switch_status = dict(self.switch_status, stage=stage)
+    
+    def _run_switch(self, new_model_name):
+        """Background worker: load, warm up, then atomically swap in the new model"""
+        try:
+            state = self._load(
+                ModelState(new_model_name, Config.MODELS[new_model_name]),
+                progress=self._set_switch_stage
+            )
+            
+            self._set_switch_stage('warming_up')
+            self.warm_up(state)
+            
+            previous = self._state
+            self._state = state
+            
+            # Cached results belong to the old weights/stats
+            if self.result_cache is not None:
+                self.result_cache.clear()
+            
+            self.switch_status = dict(
+                self.switch_status, state='ready', stage='done', finished_at=time.time()
+            )
+            print(f"✅ Switched from {previous.model_name} to {state.model_config['name']}")
+            
+            for listener in self._switch_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    print(f"⚠️ Switch listener failed: {e}")
+        
+        except Exception as e:
+            print(f"❌ Switch to {new_model_name} failed: {e}")
+            self.switch_status = dict(
+                self.switch_status, state='failed', error=str(e), finished_at=time.time()
+            )
+    
+    def warm_up(self, state=None):
+        """
+        Run one forward on blank masks at Config.IMG_SIZE so the first request
+        doesn't pay lazy kernel selection and allocation costs
+        
+        Calls the model directly (not through the micro-batcher or result cache),
+        so warm-up doesn't show up in their statistics.
+        
+        Args:
+            state: ModelState to warm up (default: the serving model; a switch
+                warms up the new state before swapping it in)
+        """
+        state = state or self._state
+        height, width = Config.IMG_SIZE
+        blank = torch.zeros(1, state.input_channels, height, width, device=self.device)
+        if state.channels_last:
+            blank = blank.contiguous(memory_format=torch.channels_last)
+        
+        with torch.no_grad():
+            state.model(blank, blank)
+    
+    def get_switch_status(self):
+        """Get progress of the current (or last) background model switch"""
+        status = dict(self.switch_status)
+        if 'started_at' in status:
+            finished = status.get('finished_at', time.time())
+            status['elapsed_s'] = round(finished - status['started_at'], 2)
+        return status
+    
     @staticmethod
     def get_available_models():
         """Get list of all available models"""
@@ -257,6 +818,7 @@ class ModelInference:
                 'description': config.get('description', ''),
                 'speed': config['speed'],
                 'accuracy': config['accuracy'],
-                'backbone': config['backbone']
+                'backbone': config['backbone'],
+                'quantization': config.get('quantization')
             }
         return models_info
\ No newline at end of file
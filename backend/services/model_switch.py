@@ -0,0 +1,125 @@
+"""
+/switch-model across serve.py workers
+
+Each worker has its own ModelInference, so a switch handled by one worker
+would leave the others serving the old model. The request is written to a
+file in the shared state directory instead; every worker watches it,
+switches its own model and acknowledges in a file of its own.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the switch file (also the delay before a worker starts loading)
+POLL_S = 1.0
+
+
+def _read_json(path):
+    """Parsed file, or None if it is missing or being replaced"""
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    """Replace a file atomically, so readers never see a partial write"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+class ModelSwitchBroadcast:
+    """Serving model chosen through /switch-model, shared by every serve.py worker"""
+
+    def __init__(self, state_dir, workers):
+        """
+        Initialize broadcast
+
+        Args:
+            state_dir: Directory shared by the workers (Config.SERVE_STATE_DIR)
+            workers: Number of workers that must acknowledge a switch
+        """
+        self.directory = Path(state_dir)
+        self.workers = max(1, int(workers))
+        self.path = self.directory / 'model_switch.json'
+        self._applied = None  # id of the last request this worker acted on
+
+        # Created once in the master: a restarted server starts from MODEL_NAME,
+        # not from a switch requested before the restart
+        for path in self.directory.glob('model_switch*.json'):
+            path.unlink(missing_ok=True)
+
+    def _ack_path(self, slot):
+        return self.directory / f"model_switch.{slot}.json"
+
+    def publish(self, model_name):
+        """Ask every worker to switch to model_name; returns the request id"""
+        request = {'id': uuid.uuid4().hex, 'model_name': model_name, 'requested_at': time.time()}
+        _write_json(self.path, request)
+        logger.info(f"📣 Asked all {self.workers} workers to switch to {model_name}")
+        return request['id']
+
+    def watch(self, inference, slot):
+        """Worker: apply published switches to `inference` on a daemon thread"""
+        def loop():
+            while True:
+                try:
+                    self._apply(inference, slot)
+                except Exception as e:
+                    logger.error(f"❌ Worker {slot}: model switch failed: {e}")
+                time.sleep(POLL_S)
+
+        thread = threading.Thread(target=loop, name='model-switch-watch', daemon=True)
+        thread.start()
+        return thread
+
+    def _apply(self, inference, slot):
+        """Switch to the latest published model if this worker hasn't yet, then acknowledge"""
+        request = _read_json(self.path)
+        if request is None or request['id'] == self._applied:
+            return
+
+        try:
+            result = inference.switch_model(request['model_name'], wait=True)
+        except RuntimeError:
+            return  # a different switch is still loading; retried on the next check
+
+        self._applied = request['id']
+        _write_json(self._ack_path(slot), {
+            'id': request['id'],
+            'model_name': inference.model_name,
+            'status': 'failed' if result['status'] == 'failed' else 'ready',
+            'message': result['message'],
+            'pid': os.getpid(),
+        })
+
+    def wait(self, request_id, timeout):
+        """
+        Block until every worker has acknowledged a request, or the timeout passes
+
+        Returns:
+            (all acknowledged, {slot: acknowledgement or None})
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            acks = {slot: _read_json(self._ack_path(slot)) for slot in range(self.workers)}
+            acks = {slot: ack if ack and ack['id'] == request_id else None for slot, ack in acks.items()}
+            done = all(ack is not None for ack in acks.values())
+            if done or time.monotonic() >= deadline:
+                return done, acks
+            time.sleep(POLL_S / 4)
+
+    def get_status(self):
+        """Latest request and each worker's acknowledgement"""
+        request = _read_json(self.path)
+        return {
+            'request': request,
+            'workers': {slot: _read_json(self._ack_path(slot)) for slot in range(self.workers)},
+        }
@@ -0,0 +1,152 @@
+import os
+import inspect
+import logging
+import threading
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from core.config import Config
+
+logger = logging.getLogger(__name__)
+
+INPUT_NAMES = ['front_image', 'side_image']
+OUTPUT_NAMES = ['measurements']
+
+# torch.onnx.export keeps exporter state in globals, so one export per process at a time
+_export_lock = threading.Lock()
+
+
+def export_model_to_onnx(model, onnx_path, img_size=None, opset_version=17, channels=3):
+    """
+    Export a DualInputBodyModel to an ONNX graph with a dynamic batch dimension
+
+    Args:
+        model: DualInputBodyModel in eval mode
+        onnx_path: Destination .onnx file
+        img_size: (height, width) of the inputs (default: Config.IMG_SIZE)
+        opset_version: ONNX opset to target
+        channels: Model input channels (1 for grayscale-stem models)
+
+    Returns:
+        Path to the exported graph
+    """
+    img_size = img_size or Config.IMG_SIZE
+    onnx_path = Path(onnx_path)
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+
+    device = next(model.parameters()).device
+    dummy_front = torch.randn(2, channels, img_size[0], img_size[1], device=device)
+    dummy_side = torch.randn(2, channels, img_size[0], img_size[1], device=device)
+
+    export_kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # Newer torch defaults to the dynamo exporter; keep the TorchScript one
+        export_kwargs['dynamo'] = False
+
+    logger.info(f"📦 Exporting ONNX graph to {onnx_path}...")
+
+    # Write to a temp file first so a crash never leaves a half-written graph; the
+    # name is unique per process and thread, so concurrent exports (serve.py
+    # workers, a background model switch) never write into each other's file
+    tmp_path = onnx_path.with_name(f"{onnx_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with _export_lock, torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy_front, dummy_side),
+                str(tmp_path),
+                input_names=INPUT_NAMES,
+                output_names=OUTPUT_NAMES,
+                dynamic_axes={
+                    'front_image': {0: 'batch'},
+                    'side_image': {0: 'batch'},
+                    'measurements': {0: 'batch'},
+                },
+                opset_version=opset_version,
+                do_constant_folding=True,
+                **export_kwargs
+            )
+        tmp_path.replace(onnx_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    logger.info(f"✅ ONNX export complete: {onnx_path.name}")
+    return onnx_path
+
+
+class OnnxModelRunner:
+    """onnxruntime session exposing the same call signature as DualInputBodyModel"""
+
+    def __init__(self, onnx_path, device='cpu', intra_op_threads=None):
+        """
+        Create an optimized onnxruntime session
+
+        Args:
+            onnx_path: Path to the exported .onnx graph
+            device: 'cpu' or 'cuda' (CUDA provider used only when available)
+            intra_op_threads: Threads per operator (0/None = onnxruntime default)
+        """
+        import onnxruntime as ort
+
+        self.onnx_path = Path(onnx_path)
+
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if intra_op_threads:
+            sess_options.intra_op_num_threads = intra_op_threads
+
+        providers = ['CPUExecutionProvider']
+        if str(device).startswith('cuda') and 'CUDAExecutionProvider' in ort.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+
+        self.session = ort.InferenceSession(
+            str(self.onnx_path), sess_options=sess_options, providers=providers
+        )
+        self.providers = self.session.get_providers()
+
+    def __call__(self, front_img, side_img):
+        """Run the graph on torch tensors and return a torch tensor"""
+        outputs = self.session.run(OUTPUT_NAMES, {
+            'front_image': np.ascontiguousarray(front_img.detach().cpu().numpy(), dtype=np.float32),
+            'side_image': np.ascontiguousarray(side_img.detach().cpu().numpy(), dtype=np.float32),
+        })
+        return torch.from_numpy(outputs[0])
+
+
+def check_onnx_parity(model, runner, img_size=None, batch_size=2, atol=1e-3, channels=3):
+    """
+    Compare PyTorch and onnxruntime outputs on random inputs
+
+    Args:
+        model: Reference DualInputBodyModel in eval mode
+        runner: OnnxModelRunner for the exported graph
+        img_size: (height, width) of the inputs (default: Config.IMG_SIZE)
+        batch_size: Batch size to test (exercises the dynamic batch axis)
+        atol: Maximum allowed absolute difference
+        channels: Model input channels (1 for grayscale-stem models)
+
+    Returns:
+        Dictionary with max/mean absolute difference and pass flag
+    """
+    img_size = img_size or Config.IMG_SIZE
+    generator = torch.Generator().manual_seed(0)
+    front = torch.randn(batch_size, channels, img_size[0], img_size[1], generator=generator)
+    side = torch.randn(batch_size, channels, img_size[0], img_size[1], generator=generator)
+
+    device = next(model.parameters()).device
+    with torch.no_grad():
+        expected = model(front.to(device), side.to(device)).cpu()
+    actual = runner(front, side)
+
+    diff = (expected - actual).abs()
+    max_abs_diff = float(diff.max())
+
+    return {
+        'max_abs_diff': max_abs_diff,
+        'mean_abs_diff': float(diff.mean()),
+        'atol': atol,
+        'passed': max_abs_diff <= atol
+    }
@@ -0,0 +1,270 @@
+import logging
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from core.config import Config
+from utils.image_utils import IMAGENET_MEAN, IMAGENET_STD
+
+logger = logging.getLogger(__name__)
+
+JIT_MODES = ('none', 'freeze', 'compile')
+
+
+def _bn_scale_shift(bn):
+    """Per-channel (scale, shift) that an eval-mode BatchNorm applies"""
+    scale = bn.running_var.add(bn.eps).rsqrt()
+    if bn.weight is not None:
+        scale = scale * bn.weight
+    shift = -bn.running_mean * scale
+    if bn.bias is not None:
+        shift = shift + bn.bias
+    return scale, shift
+
+
+@torch.no_grad()
+def fold_bn_into(layer, bn):
+    """
+    Fold an eval-mode BatchNorm into the preceding Linear/Conv2d weights
+
+    The folded weights are new tensors: with load_state_dict(assign=True) the
+    layer's parameters share storage with the checkpoint, which must stay
+    intact so the model can be rebuilt from it if the optimized outputs diverge.
+
+    Args:
+        layer: nn.Linear or nn.Conv2d whose output feeds bn
+        bn: nn.BatchNorm1d/2d over layer's output channels
+    """
+    scale, shift = _bn_scale_shift(bn)
+
+    weight = layer.weight * scale.reshape(-1, *([1] * (layer.weight.dim() - 1)))
+    bias = layer.bias if layer.bias is not None else torch.zeros_like(scale)
+
+    layer.weight = nn.Parameter(weight, requires_grad=layer.weight.requires_grad)
+    layer.bias = nn.Parameter(bias * scale + shift, requires_grad=layer.weight.requires_grad)
+
+
+def _bn_replacement(bn):
+    """What remains of a BatchNorm after folding (timm BatchNormAct2d keeps drop + act)"""
+    act = getattr(bn, 'act', None)
+    drop = getattr(bn, 'drop', None)
+    if isinstance(act, nn.Module):
+        if isinstance(drop, nn.Module) and not isinstance(drop, (nn.Identity, nn.Dropout)):
+            return nn.Sequential(drop, act)
+        return act
+    return nn.Identity()
+
+
+def fold_batchnorms(module):
+    """
+    Fold BatchNorm layers into the Linear/Conv2d registered right before them
+
+    Relies on children being registered in forward order, which holds for the
+    regression head and the timm EfficientNet/MobileNetV3/ResNet blocks; the
+    caller verifies numerical equivalence afterwards.
+
+    Returns:
+        Number of BatchNorm layers folded
+    """
+    folded = 0
+    children = list(module.named_children())
+
+    for (_, layer), (bn_name, bn) in zip(children, children[1:]):
+        if isinstance(layer, nn.Linear) and type(bn) is nn.BatchNorm1d:
+            matches = layer.out_features == bn.num_features
+        elif type(layer) is nn.Conv2d and isinstance(bn, nn.BatchNorm2d):
+            matches = layer.out_channels == bn.num_features
+        else:
+            continue
+
+        if matches and bn.track_running_stats and bn.running_mean is not None:
+            fold_bn_into(layer, bn)
+            setattr(module, bn_name, _bn_replacement(bn))
+            folded += 1
+
+    for _, child in module.named_children():
+        folded += fold_batchnorms(child)
+
+    return folded
+
+
+def strip_dropout(module):
+    """Replace every Dropout layer with Identity; returns the number removed"""
+    removed = 0
+    for name, child in module.named_children():
+        if isinstance(child, nn.Dropout):
+            setattr(module, name, nn.Identity())
+            removed += 1
+        else:
+            removed += strip_dropout(child)
+    return removed
+
+
+class GrayscaleStem(nn.Module):
+    """
+    Single-channel stand-in for an RGB stem conv fed replicated, ImageNet-normalized gray
+
+    With x_c = (v - mean_c) / std_c for every channel c:
+        conv(x) = conv(v, sum_c W_c / std_c) + b - conv(1, sum_c W_c * mean_c / std_c)
+    The last two terms form a per-position bias map (it differs near the
+    borders because zero padding pads x, not v), precomputed for the
+    serving input size.
+    """
+
+    def __init__(self, conv, input_size, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        super().__init__()
+        weight = conv.weight.detach()
+        mean = torch.tensor(mean, dtype=weight.dtype, device=weight.device).reshape(1, 3, 1, 1)
+        std = torch.tensor(std, dtype=weight.dtype, device=weight.device).reshape(1, 3, 1, 1)
+
+        self.stride, self.padding, self.dilation = conv.stride, conv.padding, conv.dilation
+        self.weight = nn.Parameter((weight / std).sum(1, keepdim=True))
+        self.register_buffer('offset_weight', (weight * mean / std).sum(1, keepdim=True))
+        bias = conv.bias.detach() if conv.bias is not None else torch.zeros_like(weight[:, 0, 0, 0])
+        self.register_buffer('bias', bias.clone())
+
+        self.input_size = tuple(input_size)
+        self.register_buffer('bias_map', self._bias_map(self.input_size), persistent=False)
+
+    def _bias_map(self, size):
+        ones = torch.ones(1, 1, *size, dtype=self.weight.dtype, device=self.weight.device)
+        offset = F.conv2d(ones, self.offset_weight, None, self.stride, self.padding, self.dilation)
+        return self.bias.reshape(1, -1, 1, 1) - offset
+
+    def forward(self, x):
+        size = tuple(x.shape[-2:])
+        bias_map = self.bias_map if size == self.input_size else self._bias_map(size)
+        return F.conv2d(x, self.weight, None, self.stride, self.padding, self.dilation) + bias_map
+
+
+def _stem_conv_name(encoder):
+    """Attribute path of a timm encoder's first conv ('conv_stem', 'conv1', ...)"""
+    cfg = getattr(encoder, 'pretrained_cfg', None) or getattr(encoder, 'default_cfg', None) or {}
+    return cfg.get('first_conv')
+
+
+@torch.no_grad()
+def fold_grayscale_stems(model, img_size):
+    """
+    Replace both encoders' RGB stem convs with GrayscaleStem modules
+
+    Afterwards the model takes (N, 1, H, W) inputs holding mask / 255
+    instead of 3 identical ImageNet-normalized channels.
+
+    Returns:
+        True if both stems were folded (model.input_channels is then 1)
+    """
+    stems = []
+    for encoder in (model.front_encoder, model.side_encoder):
+        name = _stem_conv_name(encoder)
+        conv = encoder.get_submodule(name) if name else None
+
+        # Plain zero-padded conv only (e.g. timm Conv2dSame pads dynamically)
+        if not (type(conv) is nn.Conv2d and conv.in_channels == 3
+                and conv.groups == 1 and conv.padding_mode == 'zeros'):
+            logger.warning(f"⚠️ Grayscale stem not supported for {type(encoder).__name__} ({name})")
+            return False
+        stems.append((encoder, name, conv))
+
+    for encoder, name, conv in stems:
+        parent_name, _, attr = name.rpartition('.')
+        parent = encoder.get_submodule(parent_name) if parent_name else encoder
+        setattr(parent, attr, GrayscaleStem(conv, img_size))
+
+    model.input_channels = 1
+    return True
+
+
+def gray_to_rgb_input(gray):
+    """(N, 1, H, W) mask / 255 -> (N, 3, H, W) ImageNet-normalized RGB input"""
+    mean = torch.tensor(IMAGENET_MEAN, dtype=gray.dtype, device=gray.device).reshape(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD, dtype=gray.dtype, device=gray.device).reshape(1, 3, 1, 1)
+    return (gray - mean) / std
+
+
+def rgb_to_gray_input(rgb):
+    """Inverse of gray_to_rgb_input for replicated-gray RGB inputs"""
+    return rgb[:, :1] * IMAGENET_STD[0] + IMAGENET_MEAN[0]
+
+
+def _example_inputs(img_size, batch_size=2):
+    """Mask-like gray inputs (N, 1, H, W) in [0, 1]"""
+    generator = torch.Generator().manual_seed(0)
+    return [torch.rand(batch_size, 1, img_size[0], img_size[1], generator=generator) for _ in range(2)]
+
+
+def optimize_for_inference(model, channels_last=True, jit_mode='none', img_size=None, atol=1e-3,
+                           grayscale=False):
+    """
+    One-time "freeze for inference" pass for an eval-mode DualInputBodyModel
+
+    Folds BatchNorm into neighbouring Linear/Conv weights, strips Dropout,
+    optionally folds the RGB stems into single-channel convs, converts to
+    channels_last and applies torch.jit.freeze or torch.compile. The model
+    is modified in place, but folded layers get new weight tensors, so the
+    state dict it was loaded from is left unchanged; if the optimized outputs
+    diverge from the original, report['applied'] is False and the caller
+    should rebuild the model from its checkpoint.
+
+    Args:
+        model: DualInputBodyModel in eval mode (CPU or GPU)
+        channels_last: Convert weights to channels_last memory format
+        jit_mode: 'none', 'freeze' (trace + torch.jit.freeze) or 'compile'
+        img_size: (height, width) used for tracing and the parity check
+        atol: Allowed absolute/relative output difference
+        grayscale: Fold the stems so the model takes 1-channel mask inputs
+
+    Returns:
+        (model, report) tuple
+    """
+    if jit_mode not in JIT_MODES:
+        raise ValueError(f"Unknown MODEL_JIT '{jit_mode}'. Use one of {JIT_MODES}")
+
+    img_size = img_size or Config.IMG_SIZE
+    device = next(model.parameters()).device
+    gray_inputs = [x.to(device) for x in _example_inputs(img_size)]
+    inputs = [gray_to_rgb_input(x) for x in gray_inputs]
+
+    with torch.no_grad():
+        expected = model(*inputs)
+
+    report = {
+        'batchnorm_folded': fold_batchnorms(model),
+        'dropout_removed': strip_dropout(model),
+        'grayscale_stem': bool(grayscale) and fold_grayscale_stems(model, img_size),
+        'channels_last': channels_last,
+        'jit': jit_mode,
+    }
+
+    # Parity below compares the grayscale path against the original RGB path
+    if report['grayscale_stem']:
+        inputs = gray_inputs
+
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+        inputs = [x.contiguous(memory_format=torch.channels_last) for x in inputs]
+
+    with torch.no_grad():
+        if jit_mode == 'freeze':
+            model = torch.jit.freeze(torch.jit.trace(model, tuple(inputs)))
+        elif jit_mode == 'compile':
+            model = torch.compile(model)
+
+        actual = model(*inputs)
+
+    max_abs_diff = float((expected - actual).abs().max())
+    report['max_abs_diff'] = max_abs_diff
+    report['applied'] = bool(torch.allclose(expected, actual, atol=atol, rtol=atol))
+
+    if not report['applied']:
+        logger.warning(f"⚠️ Optimized model diverged (max diff {max_abs_diff:.2e})")
+        return model, report
+
+    logger.info(
+        f"⚡ Inference optimization: {report['batchnorm_folded']} BatchNorm folded, "
+        f"{report['dropout_removed']} Dropout removed, grayscale_stem={report['grayscale_stem']}, "
+        f"channels_last={channels_last}, "
+        f"jit={jit_mode} (max diff {max_abs_diff:.2e})"
+    )
+    return model, report
@@ -0,0 +1,198 @@
+import copy
+import time
+import logging
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+from core.config import Config
+from utils.image_utils import preprocess_image, allowed_file
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ('dynamic', 'static')
+
+
+def load_calibration_batches(calibration_dir, img_size=None, max_samples=32):
+    """
+    Load sample masks for static calibration and drift evaluation
+
+    Uses <dir>/front and <dir>/side when both exist, otherwise every image
+    in <dir> is fed to both encoders.
+
+    Args:
+        calibration_dir: Directory of mask images
+        img_size: (height, width) of the inputs (default: Config.IMG_SIZE)
+        max_samples: Maximum number of samples per view
+
+    Returns:
+        (front_batch, side_batch) tensors, or None if no samples were found
+    """
+    img_size = img_size or Config.IMG_SIZE
+    calibration_dir = Path(calibration_dir)
+
+    if not calibration_dir.is_dir():
+        return None
+
+    def _load(directory):
+        files = sorted(p for p in directory.iterdir() if p.is_file() and allowed_file(p.name))
+        tensors = []
+        for path in files[:max_samples]:
+            try:
+                tensors.append(preprocess_image(path.read_bytes(), img_size))
+            except ValueError:
+                logger.warning(f"⚠️ Skipping unreadable calibration sample: {path.name}")
+        return tensors
+
+    front_dir, side_dir = calibration_dir / 'front', calibration_dir / 'side'
+    if front_dir.is_dir() and side_dir.is_dir():
+        front, side = _load(front_dir), _load(side_dir)
+        count = min(len(front), len(side))
+        front, side = front[:count], side[:count]
+    else:
+        front = side = _load(calibration_dir)
+
+    if not front:
+        return None
+
+    return torch.stack(front), torch.stack(side)
+
+
+def split_holdout(samples, fraction=0.25):
+    """
+    Set some samples aside so drift isn't measured on the masks calibration saw
+
+    Args:
+        samples: (front_batch, side_batch) from load_calibration_batches
+        fraction: Share of the samples to hold out (at least one, never all)
+
+    Returns:
+        (calibration, holdout) batch pairs; holdout is None with fewer than two samples
+    """
+    count = len(samples[0])
+    if count < 2 or fraction <= 0:
+        return samples, None
+
+    # Spread over the sorted file list rather than taking its tail
+    held = min(max(1, round(count * fraction)), count - 1)
+    holdout = torch.zeros(count, dtype=torch.bool)
+    holdout[torch.linspace(0, count - 1, held).round().long()] = True
+
+    return (
+        (samples[0][~holdout], samples[1][~holdout]),
+        (samples[0][holdout], samples[1][holdout]),
+    )
+
+
+def quantize_dynamic_head(model):
+    """Dynamically quantize the Linear layers of the regression head to int8"""
+    model.regression_head = torch.ao.quantization.quantize_dynamic(
+        model.regression_head, {nn.Linear}, dtype=torch.qint8
+    )
+    return model
+
+
+def quantize_static_encoders(model, front_batch, side_batch, batch_size=8):
+    """
+    Statically quantize both conv encoders with post-training calibration
+
+    Args:
+        model: fp32 DualInputBodyModel in eval mode (modified in place)
+        front_batch: Calibration tensors for the front encoder (N, C, H, W)
+        side_batch: Calibration tensors for the side encoder (N, C, H, W)
+        batch_size: Calibration forward batch size
+
+    Returns:
+        The model with int8 encoders
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+
+    for attr, samples in (('front_encoder', front_batch), ('side_encoder', side_batch)):
+        encoder = getattr(model, attr)
+        prepared = prepare_fx(encoder, qconfig_mapping, (samples[:1],))
+
+        with torch.no_grad():
+            for start in range(0, len(samples), batch_size):
+                prepared(samples[start:start + batch_size])
+
+        setattr(model, attr, convert_fx(prepared))
+
+    return model
+
+
+def quantize_model(model, mode, calibration=None):
+    """
+    Build a quantized copy of an fp32 model
+
+    Args:
+        model: fp32 DualInputBodyModel on CPU in eval mode
+        mode: 'dynamic' (int8 regression head) or 'static' (int8 encoders + head)
+        calibration: (front_batch, side_batch) required for 'static'
+
+    Returns:
+        Quantized model (the fp32 model is left untouched)
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode '{mode}'. Use one of {QUANTIZATION_MODES}")
+
+    quantized = copy.deepcopy(model).eval()
+
+    if mode == 'static':
+        if calibration is None:
+            raise ValueError(
+                f"Static quantization needs calibration masks in {Config.QUANT_CALIBRATION_DIR}"
+            )
+        quantize_static_encoders(quantized, *calibration)
+
+    return quantize_dynamic_head(quantized)
+
+
+def _median_latency_ms(model, front, side, repeats):
+    """Median forward latency over several runs (after one warm-up)"""
+    timings = []
+    with torch.no_grad():
+        model(front, side)
+        for _ in range(repeats):
+            started = time.perf_counter()
+            model(front, side)
+            timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def evaluate_quantization(fp32_model, quantized_model, front_batch, side_batch, target_std, repeats=5):
+    """
+    Measure speedup and per-measurement drift of a quantized model
+
+    Args:
+        fp32_model: Reference model
+        quantized_model: Quantized model
+        front_batch: Evaluation tensors (N, C, H, W)
+        side_batch: Evaluation tensors (N, C, H, W)
+        target_std: Denormalization std, to report MAE in cm
+        repeats: Timed forward passes per model (batch of one)
+
+    Returns:
+        Dictionary with latencies, speedup and per-measurement MAE (cm)
+    """
+    with torch.no_grad():
+        expected = fp32_model(front_batch, side_batch)
+        actual = quantized_model(front_batch, side_batch)
+
+    # Normalized outputs differ only by scale, so MAE in cm = MAE * std
+    mae = ((expected - actual).abs().mean(dim=0) * target_std.cpu()).tolist()
+
+    fp32_ms = _median_latency_ms(fp32_model, front_batch[:1], side_batch[:1], repeats)
+    quantized_ms = _median_latency_ms(quantized_model, front_batch[:1], side_batch[:1], repeats)
+
+    return {
+        'samples': len(front_batch),
+        'fp32_latency_ms': round(fp32_ms, 2),
+        'quantized_latency_ms': round(quantized_ms, 2),
+        'speedup': round(fp32_ms / quantized_ms, 2) if quantized_ms else None,
+        'mae_cm': {col: round(value, 3) for col, value in zip(Config.MEASUREMENT_COLUMNS, mae)},
+        'max_mae_cm': round(max(mae), 3),
+    }
@@ -0,0 +1,200 @@
+import os
+import queue
+import inspect
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+# Kept at module level: rembg pulls in pymatting, which hangs interpreter exit
+# when it is first imported from a worker thread (e.g. a startup chain)
+from rembg import new_session
+
+logger = logging.getLogger(__name__)
+
+# u2net input resolution and normalization (same as rembg's U2netHumanSegSession)
+U2NET_INPUT_SIZE = (320, 320)
+U2NET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+U2NET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def u2net_input(image_rgb):
+    """
+    Preprocess an RGB uint8 image for u2net
+
+    Args:
+        image_rgb: (H, W, 3) uint8 array
+
+    Returns:
+        (3, 320, 320) float32 array
+    """
+    resized = cv2.resize(image_rgb, U2NET_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+    tensor = resized.astype(np.float32) / max(float(resized.max()), 1e-6)
+    tensor = (tensor - U2NET_MEAN) / U2NET_STD
+    return tensor.transpose(2, 0, 1)
+
+
+def _session_options(intra_op_threads, cpus=None):
+    """
+    onnxruntime options for one session of a pool (no inter-op fan-out)
+
+    Args:
+        intra_op_threads: Threads per session
+        cpus: Optional CPU ids the session's worker threads are pinned to (the
+            calling thread counts as one of intra_op_threads and isn't pinned)
+    """
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = intra_op_threads
+    sess_opts.inter_op_num_threads = 1
+    sess_opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+
+    if cpus and intra_op_threads > 1:
+        # One entry per worker thread; onnxruntime processor ids are 1-based
+        affinity = ','.join(str(cpu + 1) for cpu in cpus)
+        sess_opts.add_session_config_entry(
+            'session.intra_op_thread_affinities', ';'.join([affinity] * (intra_op_threads - 1))
+        )
+    return sess_opts
+
+
+def _new_rembg_session(model_name, sess_opts):
+    """Create a rembg session with explicit onnxruntime options"""
+    if 'sess_opts' in inspect.signature(new_session).parameters:
+        return new_session(model_name, sess_opts=sess_opts)
+
+    # Older rembg builds its own SessionOptions; construct the session class directly
+    from rembg.sessions import sessions_class
+    for session_class in sessions_class:
+        if session_class.name() == model_name:
+            return session_class(model_name, sess_opts)
+    raise ValueError(f"No rembg session class for '{model_name}'")
+
+
+class SessionPool:
+    """Fixed-size pool of rembg/onnxruntime sessions shared by all request threads"""
+
+    def __init__(self, model_names=('u2net_human_seg', 'u2net'), size=2, intra_op_threads=0, cpu_sets=None):
+        """
+        Initialize session pool
+
+        Args:
+            model_names: rembg models to try in order (first that loads wins)
+            size: Number of sessions, i.e. maximum concurrent segmentations
+            intra_op_threads: Threads per session (0 = CPU cores / size, so
+                parallel sessions don't oversubscribe the machine)
+            cpu_sets: Optional list of CPU id lists; session i is pinned to
+                cpu_sets[i % len(cpu_sets)]
+        """
+        self.size = max(1, int(size))
+        self.intra_op_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // self.size)
+        self.cpu_sets = cpu_sets or None
+        self.model_name = None
+
+        self._sessions = queue.Queue()
+
+        def build(model_name, index):
+            cpus = self.cpu_sets[index % len(self.cpu_sets)] if self.cpu_sets else None
+            return _new_rembg_session(model_name, _session_options(self.intra_op_threads, cpus))
+
+        last_error = None
+        for model_name in model_names:
+            try:
+                # onnxruntime builds sessions without holding the GIL, so build them side by side
+                with ThreadPoolExecutor(max_workers=self.size) as executor:
+                    sessions = list(executor.map(lambda index: build(model_name, index), range(self.size)))
+                for session in sessions:
+                    self._sessions.put(session)
+                self.model_name = model_name
+                break
+            except Exception as e:
+                logger.warning(f"⚠️ {model_name} session failed: {e}")
+                last_error = e
+                self._sessions = queue.Queue()
+
+        if self.model_name is None:
+            raise RuntimeError(f"No segmentation model could be loaded: {last_error}")
+
+        logger.info(
+            f"✅ Segmentation pool: {self.size} x {self.model_name} "
+            f"({self.intra_op_threads} threads each)"
+        )
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a session (blocks while all sessions are busy)"""
+        session = self._sessions.get()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def predict_masks(self, images_rgb, target_size):
+        """
+        Run u2net directly on decoded images (no PIL / RGBA cutout round-trips)
+
+        All images go through one session run when the model has a dynamic
+        batch axis, otherwise one run per image on the same session.
+
+        Args:
+            images_rgb: List of (H, W, 3) uint8 RGB arrays
+            target_size: Output size (height, width)
+
+        Returns:
+            List of uint8 probability masks (0-255) at target_size
+        """
+        batch = np.stack([u2net_input(image) for image in images_rgb])
+
+        with self.acquire() as session:
+            preds = self._run(session, batch)
+
+        masks = []
+        for pred in preds[:, 0]:
+            # Per-image min-max scaling, as rembg does for a single image
+            low, high = float(pred.min()), float(pred.max())
+            pred = (pred - low) / max(high - low, 1e-6)
+            mask = (pred * 255).astype(np.uint8)
+            masks.append(cv2.resize(mask, (target_size[1], target_size[0]), interpolation=cv2.INTER_LINEAR))
+
+        return masks
+
+    @staticmethod
+    def _run(session, batch):
+        """u2net predictions (N, 1, 320, 320) for a preprocessed batch"""
+        inner = session.inner_session
+        model_input = inner.get_inputs()[0]
+
+        if isinstance(model_input.shape[0], int):
+            # Fixed batch dimension exported into the graph
+            return np.concatenate([
+                inner.run(None, {model_input.name: batch[i:i + 1]})[0]
+                for i in range(len(batch))
+            ])
+        return inner.run(None, {model_input.name: batch})[0]
+
+    def warm_up(self, target_size):
+        """
+        Run every session once on a blank image of target_size
+
+        The first run of a session allocates its buffers; doing it at startup
+        keeps that cost off the first requests. Sessions run side by side.
+        """
+        batch = u2net_input(np.zeros((*target_size, 3), np.uint8))[None]
+        sessions = [self._sessions.get() for _ in range(self.size)]
+        try:
+            with ThreadPoolExecutor(max_workers=self.size) as executor:
+                list(executor.map(lambda session: self._run(session, batch), sessions))
+        finally:
+            for session in sessions:
+                self._sessions.put(session)
+
+    def get_stats(self):
+        """Pool size and current availability"""
+        return {
+            'model': self.model_name,
+            'sessions': self.size,
+            'idle_sessions': self._sessions.qsize(),
+            'intra_op_threads': self.intra_op_threads,
+            'cpu_sets': self.cpu_sets,
+        }
@@ -0,0 +1,614 @@
+import os
+import sys
+import json
+import time
+import atexit
+import signal
+import socket
+import struct
+import logging
+import subprocess
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.config import Config
+from services.admission_service import admission, Overloaded, BATCH
+
+logger = logging.getLogger(__name__)
+
+SEGMENTATION = 'segmentation'
+MEASUREMENT = 'measurement'
+
+# Frame: 4-byte header length, JSON header, then each array's raw bytes in header order
+_LENGTH = struct.Struct('!I')
+MAX_HEADER_BYTES = 1024 * 1024
+MAX_ARRAY_BYTES = 256 * 1024 * 1024
+
+# Extra seconds a client waits past the request deadline (the stage answers 503 at the deadline)
+DEADLINE_GRACE_S = 1.0
+
+
+class StageError(RuntimeError):
+    """A stage failed to process a request"""
+
+
+def _is_tcp(address):
+    """host:port addresses use TCP, anything else is a Unix socket path"""
+    host, _, port = address.rpartition(':')
+    return bool(host) and port.isdigit() and '/' not in address
+
+
+def _tcp_address(address):
+    host, _, port = address.rpartition(':')
+    return host, int(port)
+
+
+def _recv_exact(sock, view):
+    """Fill a writable memoryview from the socket"""
+    while view.nbytes:
+        received = sock.recv_into(view)
+        if received == 0:
+            raise ConnectionError("Stage connection closed mid-message")
+        view = view[received:]
+
+
+def send_message(sock, header, arrays=()):
+    """
+    Send a header and raw arrays
+
+    Args:
+        sock: Connected socket
+        header: JSON-serializable dict
+        arrays: numpy arrays sent as raw bytes (shape and dtype go in the header)
+    """
+    arrays = [np.ascontiguousarray(array) for array in arrays]
+    header = dict(header, arrays=[{'shape': list(a.shape), 'dtype': a.dtype.str} for a in arrays])
+    encoded = json.dumps(header).encode('utf-8')
+
+    sock.sendall(_LENGTH.pack(len(encoded)) + encoded)
+    for array in arrays:
+        if array.nbytes:
+            sock.sendall(memoryview(array).cast('B'))
+
+
+def recv_message(sock):
+    """
+    Receive a header and its arrays (each read straight into its own buffer)
+
+    Returns:
+        (header dict, list of numpy arrays)
+
+    Raises:
+        ValueError: Malformed or oversized message
+        ConnectionError: Peer closed the connection
+    """
+    prefix = bytearray(_LENGTH.size)
+    _recv_exact(sock, memoryview(prefix))
+    (length,) = _LENGTH.unpack(prefix)
+    if length > MAX_HEADER_BYTES:
+        raise ValueError(f"Stage message header too large ({length} bytes)")
+
+    encoded = bytearray(length)
+    _recv_exact(sock, memoryview(encoded))
+    header = json.loads(encoded)
+
+    arrays = []
+    for meta in header.pop('arrays', []):
+        dtype = np.dtype(meta['dtype'])
+        if dtype.hasobject:
+            raise ValueError("Object arrays can't be sent between stages")
+        shape = tuple(int(dim) for dim in meta['shape'])
+        if int(np.prod(shape)) * dtype.itemsize > MAX_ARRAY_BYTES:
+            raise ValueError(f"Stage message array too large ({shape}, {dtype})")
+
+        array = np.empty(shape, dtype)
+        if array.nbytes:
+            _recv_exact(sock, memoryview(array).cast('B'))
+        arrays.append(array)
+
+    return header, arrays
+
+
+def _error_header(error):
+    """Response header for a failed request"""
+    if isinstance(error, Overloaded):
+        return {
+            'error': str(error), 'kind': 'overloaded',
+            'status_code': error.status_code, 'retry_after': error.retry_after
+        }
+    if isinstance(error, ValueError):
+        return {'error': str(error), 'kind': 'invalid'}
+    return {'error': str(error), 'kind': 'internal'}
+
+
+class StageClient:
+    """Call a stage over its socket (one connection per call)"""
+
+    def __init__(self, name, address, timeout_s=None):
+        """
+        Initialize client
+
+        Args:
+            name: Stage name used in messages
+            address: Unix socket path or host:port
+            timeout_s: Timeout for calls made outside a request (None = Config.STAGE_TIMEOUT_S)
+        """
+        self.name = name
+        self.address = address
+        self.timeout = Config.STAGE_TIMEOUT_S if timeout_s is None else float(timeout_s)
+
+    def _connect(self, timeout):
+        if _is_tcp(self.address):
+            sock = socket.create_connection(_tcp_address(self.address), timeout=timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return sock
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def call(self, op, arrays=(), **fields):
+        """
+        Run one operation on the stage
+
+        The current request's remaining deadline and priority travel with the
+        call, so the stage's own admission control queues and rejects it
+        exactly as the in-process pipeline would.
+
+        Args:
+            op: Operation name
+            arrays: numpy arrays for the operation
+            **fields: JSON-serializable operation arguments
+
+        Returns:
+            (response header, response arrays)
+
+        Raises:
+            Overloaded: The stage rejected the request, timed out or is unreachable
+            ValueError: The stage rejected the input
+            StageError: The stage failed
+        """
+        remaining, priority = admission.current_scope()
+        timeout = self.timeout if remaining is None else remaining + DEADLINE_GRACE_S
+        header = dict(fields, op=op, timeout_s=remaining, priority=priority)
+
+        try:
+            with self._connect(timeout) as sock:
+                send_message(sock, header, arrays)
+                response, results = recv_message(sock)
+        except socket.timeout:
+            raise Overloaded(f"Server busy: {self.name} stage timed out", 503, timeout)
+        except OSError as e:
+            raise Overloaded(f"{self.name} stage unavailable at {self.address}: {e}", 503, 5)
+
+        if 'error' in response:
+            if response.get('kind') == 'overloaded':
+                raise Overloaded(response['error'], response['status_code'], response['retry_after'])
+            if response.get('kind') == 'invalid':
+                raise ValueError(response['error'])
+            raise StageError(f"{self.name} stage error: {response['error']}")
+
+        return response, results
+
+    def ping(self):
+        """Stage details if it is serving, None otherwise"""
+        try:
+            with self._connect(1.0) as sock:
+                send_message(sock, {'op': 'ping'})
+                response, _ = recv_message(sock)
+            return response
+        except (OSError, ValueError):
+            return None
+
+    def wait_ready(self, timeout_s):
+        """Block until the stage answers a ping; returns its details"""
+        deadline = time.monotonic() + timeout_s
+        while True:
+            response = self.ping()
+            if response is not None:
+                return response
+            if time.monotonic() > deadline:
+                raise StageError(f"{self.name} stage not ready at {self.address} after {timeout_s:.0f}s")
+            time.sleep(0.5)
+
+
+class StageServer:
+    """Serve one stage from a group of worker processes, each with its own request threads"""
+
+    def __init__(self, name, address, handlers, workers=1, threads=8, post_fork=None):
+        """
+        Initialize server
+
+        Args:
+            name: Stage name
+            address: Unix socket path or host:port to listen on
+            handlers: {op: callable(header, arrays) -> (header, arrays)}
+            workers: Worker processes (forked after the stage's models are loaded)
+            threads: Connections each worker serves at once; beyond that they
+                wait in the worker's queue, and the stage's admission control
+                bounds how long
+            post_fork: Callable(slot) run in each worker before it serves
+        """
+        self.name = name
+        self.address = address
+        self.handlers = dict(handlers, ping=self._ping)
+        self.workers = max(1, int(workers))
+        self.threads = max(1, int(threads))
+        self.post_fork = post_fork
+        self.worker_slot = None
+        self._children = {}  # pid -> slot
+        self._stopping = False
+
+    def _listen(self):
+        if _is_tcp(self.address):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(_tcp_address(self.address))
+        else:
+            if os.path.exists(self.address):
+                if StageClient(self.name, self.address).ping() is not None:
+                    raise StageError(f"A {self.name} stage is already serving {self.address}")
+                os.unlink(self.address)  # stale socket from a previous run
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.address)
+
+        listener.listen(socket.SOMAXCONN)
+        return listener
+
+    def _ping(self, header, arrays):
+        return {'stage': self.name, 'pid': os.getpid(), 'worker': self.worker_slot}, []
+
+    def _handle(self, conn):
+        """Worker thread: serve one request on one connection"""
+        with conn:
+            try:
+                header, arrays = recv_message(conn)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ {self.name} stage: bad request: {e}")
+                return
+
+            handler = self.handlers.get(header.get('op'))
+            timeout = header.get('timeout_s')
+            scope = nullcontext() if timeout is None else admission.request_scope(timeout, header.get('priority') or BATCH)
+
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown {self.name} stage operation: {header.get('op')}")
+                with scope:
+                    response, results = handler(header, arrays)
+            except Exception as e:
+                if not isinstance(e, (Overloaded, ValueError)):
+                    logger.error(f"❌ {self.name} stage {header.get('op')} failed: {e}")
+                response, results = _error_header(e), []
+
+            try:
+                send_message(conn, response, results)
+            except OSError:
+                pass  # client gave up
+
+    def _serve(self, listener, slot):
+        """Worker process: accept connections until terminated"""
+        self.worker_slot = slot
+        if self.post_fork is not None:
+            self.post_fork(slot)
+
+        executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix=f'{self.name}-stage')
+        logger.info(f"✅ {self.name} stage worker {slot} (pid {os.getpid()}) serving {self.address}")
+
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except InterruptedError:
+                continue
+            if _is_tcp(self.address):
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            executor.submit(self._handle, conn)
+
+    def _spawn(self, listener, slot):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                self._serve(listener, slot)
+            finally:
+                os._exit(1)
+        self._children[pid] = slot
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve_forever(self):
+        """Listen, fork the workers and restart any that die"""
+        listener = self._listen()
+
+        if self.workers == 1:
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            try:
+                self._serve(listener, 0)
+            finally:
+                self._cleanup(listener)
+            return
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.workers):
+            self._spawn(listener, slot)
+
+        try:
+            while self._children:
+                try:
+                    pid, status = os.wait()
+                except InterruptedError:
+                    continue
+                slot = self._children.pop(pid, None)
+                if slot is not None and not self._stopping:
+                    logger.warning(f"⚠️ {self.name} stage worker {slot} exited ({status}), restarting")
+                    self._spawn(listener, slot)
+        finally:
+            self._cleanup(listener)
+
+    def _cleanup(self, listener):
+        listener.close()
+        if not _is_tcp(self.address) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+def _target_size(header):
+    return tuple(header.get('target_size') or Config.IMG_SIZE)
+
+
+def segmentation_handlers():
+    """Operations of the segmentation stage, backed by this process's ImageProcessor"""
+    from services.image_service import image_processor
+
+    # Load and warm up before the stage answers pings (the API waits for that)
+    if image_processor.load() is not None and Config.STARTUP_WARMUP:
+        image_processor.warm_up(Config.IMG_SIZE)
+
+    def segment(header, arrays):
+        masks = image_processor.segment_images(
+            [array.tobytes() for array in arrays], _target_size(header), header.get('content')
+        )
+        return {}, masks
+
+    def preview(header, arrays):
+        result = image_processor.process_and_preview(arrays[0].tobytes(), _target_size(header), header.get('content'))
+        return {}, [
+            np.frombuffer(result['mask_bytes'], np.uint8),
+            np.frombuffer(result['preview_bytes'], np.uint8)
+        ]
+
+    def stats(header, arrays):
+        pool = image_processor.session_pool
+        return {
+            'mask_cache': image_processor.get_cache_stats(),
+            'segmentation_pool': pool.get_stats() if pool is not None else None,
+            'admission': admission.get_stats(),
+        }, []
+
+    return {'segment': segment, 'preview': preview, 'stats': stats}
+
+
+def measurement_handlers(model_name, device='cpu'):
+    """Operations of the measurement stage; loads the model (and a pool for ?model= requests)"""
+    from services.model_service import ModelInference
+    from services.model_pool import ModelPool
+
+    inference = ModelInference(model_name=model_name, device=device)
+    pool = ModelPool(inference, Config.MODEL_POOL_MEMORY_MB, device)
+    if Config.STARTUP_WARMUP:
+        inference.warm_up()
+
+    def as_floats(measurements):
+        return {column: float(value) for column, value in measurements.items()}
+
+    def info(header, arrays):
+        model = pool.get(header.get('model'))
+        return {'model_name': model.model_name, 'info': model.get_model_info()}, []
+
+    def measure(header, arrays):
+        front_mask, side_mask = arrays
+        return {'measurements': as_floats(pool.get(header.get('model')).predict_masks(front_mask, side_mask))}, []
+
+    def measure_images(header, arrays):
+        front_bytes, side_bytes = (array.tobytes() for array in arrays)
+        return {'measurements': as_floats(pool.get(header.get('model')).predict(front_bytes, side_bytes))}, []
+
+    def measure_batch(header, arrays):
+        import torch
+
+        front_batch, side_batch = (torch.from_numpy(array) for array in arrays)
+        results = pool.get(header.get('model')).predict_batch(front_batch, side_batch)
+        return {'measurements': [as_floats(measurements) for measurements in results]}, []
+
+    def stats(header, arrays):
+        return {
+            'batching': inference.get_batching_stats(),
+            'result_cache': inference.get_cache_stats(),
+            'model_pool': pool.get_stats(),
+            'admission': admission.get_stats(),
+        }, []
+
+    return {
+        'info': info,
+        'measure': measure,
+        'measure_images': measure_images,
+        'measure_batch': measure_batch,
+        'stats': stats,
+    }
+
+
+class RemoteImageProcessor:
+    """ImageProcessor interface served by the segmentation stage"""
+
+    session_pool = None  # sessions live in the stage processes
+
+    def __init__(self, client):
+        self.client = client
+
+    def segment_images(self, images, target_size=(512, 384), content=None):
+        """Masks for encoded images, segmented in one stage call"""
+        _, masks = self.client.call(
+            'segment', [np.frombuffer(image, np.uint8) for image in images],
+            target_size=list(target_size), content=content
+        )
+        return masks
+
+    def process_pair(self, front_bytes, side_bytes, target_size=(512, 384), content=None):
+        """(front_mask, side_mask) uint8 arrays"""
+        front_mask, side_mask = self.segment_images([front_bytes, side_bytes], target_size, content)
+        return front_mask, side_mask
+
+    def process_and_preview(self, image_bytes, target_size=(512, 384), content=None):
+        """Mask and overlay preview PNGs"""
+        _, (mask_png, preview_png) = self.client.call(
+            'preview', [np.frombuffer(image_bytes, np.uint8)],
+            target_size=list(target_size), content=content
+        )
+        return {'mask_bytes': mask_png.tobytes(), 'preview_bytes': preview_png.tobytes()}
+
+    def get_cache_stats(self):
+        """Mask cache of the stage worker that answered"""
+        stats, _ = self.client.call('stats')
+        return stats['mask_cache']
+
+
+class RemoteModelInference:
+    """ModelInference interface served by the measurement stage"""
+
+    def __init__(self, client, model_name=None):
+        """
+        Args:
+            client: StageClient of the measurement stage
+            model_name: Model to request (None = the stage's own model)
+        """
+        self.client = client
+        self._requested = model_name
+        self._info = None
+        # The stage's model is fixed for its lifetime (no /switch-model in split mode)
+        response, _ = self.client.call('info', model=model_name)
+        self.model_name = response['model_name']
+        self.input_channels = response['info']['input_channels']
+
+    model_config = property(lambda self: Config.MODELS[self.model_name])
+
+    def predict(self, front_image_bytes, side_image_bytes):
+        """Measurements from encoded masks"""
+        response, _ = self.client.call(
+            'measure_images',
+            [np.frombuffer(front_image_bytes, np.uint8), np.frombuffer(side_image_bytes, np.uint8)],
+            model=self._requested
+        )
+        return response['measurements']
+
+    def predict_masks(self, front_mask, side_mask):
+        """Measurements from uint8 (H, W) masks"""
+        response, _ = self.client.call('measure', [front_mask, side_mask], model=self._requested)
+        return response['measurements']
+
+    def predict_batch(self, front_batch, side_batch):
+        """Measurements for lists (or batches) of preprocessed (C, H, W) tensors"""
+        import torch
+
+        front = torch.stack(list(front_batch)) if isinstance(front_batch, (list, tuple)) else front_batch
+        side = torch.stack(list(side_batch)) if isinstance(side_batch, (list, tuple)) else side_batch
+        response, _ = self.client.call(
+            'measure_batch', [front.numpy(), side.numpy()], model=self._requested
+        )
+        return response['measurements']
+
+    def get_model_info(self):
+        response, _ = self.client.call('info', model=self._requested)
+        return response['info']
+
+    def get_batching_stats(self):
+        stats, _ = self.client.call('stats')
+        return stats['batching']
+
+    def get_cache_stats(self):
+        stats, _ = self.client.call('stats')
+        return stats['result_cache']
+
+    def switch_model(self, new_model_name, wait=False):
+        return {
+            'status': 'failed',
+            'message': "Model switching is not available with SERVING_MODE=split; "
+                       "restart the measurement stage with MODEL_NAME instead"
+        }
+
+
+class RemoteModelPool:
+    """ModelPool interface: models are loaded and evicted by the measurement stage"""
+
+    def __init__(self, primary):
+        self.primary = primary
+        self._proxies = {}
+
+    def get(self, model_name=None):
+        if model_name is None or model_name == self.primary.model_name:
+            return self.primary
+        if model_name not in Config.MODELS:
+            raise ValueError(f"Model '{model_name}' not found. Available: {list(Config.MODELS.keys())}")
+
+        proxy = self._proxies.get(model_name)
+        if proxy is None:
+            proxy = self._proxies[model_name] = RemoteModelInference(self.primary.client, model_name)
+        return proxy
+
+    def get_stats(self):
+        stats, _ = self.primary.client.call('stats')
+        return stats['model_pool']
+
+
+def _start_stage(client, workers):
+    """Launch stage_worker.py for a stage unless one already answers at its address"""
+    if client.ping() is not None:
+        logger.info(f"🔗 Using running {client.name} stage at {client.address}")
+        return None
+
+    logger.info(f"🚀 Starting {client.name} stage ({workers} workers) at {client.address}")
+    process = subprocess.Popen(
+        [sys.executable, str(Config.BASE_DIR / 'stage_worker.py'), client.name,
+         '--address', client.address, '--workers', str(workers)],
+        cwd=str(Config.BASE_DIR)
+    )
+    atexit.register(process.terminate)
+    return process
+
+
+def connect_stages():
+    """
+    Connect the API process to the segmentation and measurement stages
+
+    Starts local stages that aren't running yet (STAGE_AUTOSTART) and waits
+    until both answer.
+
+    Returns:
+        (image_processor, model_inference, model_pool) stand-ins for the routes
+    """
+    segmentation = StageClient(SEGMENTATION, Config.SEGMENTATION_STAGE_ADDRESS)
+    measurement = StageClient(MEASUREMENT, Config.MEASUREMENT_STAGE_ADDRESS)
+
+    if Config.STAGE_AUTOSTART:
+        _start_stage(segmentation, Config.SEGMENTATION_STAGE_WORKERS)
+        _start_stage(measurement, Config.MEASUREMENT_STAGE_WORKERS)
+
+    for client in (segmentation, measurement):
+        client.wait_ready(Config.STAGE_START_TIMEOUT_S)
+        logger.info(f"✅ {client.name} stage ready at {client.address}")
+
+    model_inference = RemoteModelInference(measurement)
+    return RemoteImageProcessor(segmentation), model_inference, RemoteModelPool(model_inference)
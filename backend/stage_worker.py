@@ -0,0 +1,86 @@
+"""
+Run one pipeline stage as its own process group (SERVING_MODE=split)
+
+The stage's models are loaded once, then worker processes are forked that
+share them copy-on-write and accept connections on one socket. app.py starts
+these automatically (STAGE_AUTOSTART); run them by hand to size each stage
+separately or to serve a stage from another machine.
+
+Usage:
+    python stage_worker.py segmentation
+    python stage_worker.py measurement --workers 2
+    python stage_worker.py measurement --address 0.0.0.0:7002
+"""
+import gc
+import os
+import logging
+import argparse
+
+from core.config import Config
+from core.resources import resource_manager, available_cpus, worker_cpus
+
+logger = logging.getLogger(__name__)
+
+STAGE_DEFAULTS = {
+    'segmentation': lambda: (Config.SEGMENTATION_STAGE_ADDRESS, Config.SEGMENTATION_STAGE_WORKERS),
+    'measurement': lambda: (Config.MEASUREMENT_STAGE_ADDRESS, Config.MEASUREMENT_STAGE_WORKERS),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the segmentation or measurement stage')
+    parser.add_argument('stage', choices=sorted(STAGE_DEFAULTS))
+    parser.add_argument('--address', help='Unix socket path or host:port (default: from config)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: from config)')
+    parser.add_argument('--threads', type=int, default=Config.STAGE_THREADS,
+                        help='Connections served at once per worker')
+    parser.add_argument('--model', default=os.getenv('MODEL_NAME', Config.DEFAULT_MODEL),
+                        help='Measurement model')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    default_address, default_workers = STAGE_DEFAULTS[args.stage]()
+    address = args.address or default_address
+    workers = max(1, args.workers or default_workers)
+    cores = Config.CPU_BUDGET or max(1, len(available_cpus()) // workers)
+
+    # Same pre-fork rules as serve.py: single-threaded torch and no GC while loading
+    resource_manager.prefork = workers > 1
+    resource_manager.apply(resource_manager.plan(budget=cores, stage=args.stage))
+
+    gc.disable()
+    from services.stage_service import StageServer, segmentation_handlers, measurement_handlers
+
+    if args.stage == 'segmentation':
+        handlers = segmentation_handlers()
+    else:
+        device = 'cuda' if os.getenv('USE_GPU', 'False') == 'True' else 'cpu'
+        handlers = measurement_handlers(args.model, device)
+    gc.freeze()
+
+    def post_fork(slot):
+        """Worker: apply this worker's share of the cores"""
+        gc.enable()
+        resource_manager.prefork = False
+        resource_manager.worker_slot = slot
+        plan = resource_manager.apply(resource_manager.plan(
+            stage=args.stage, cpus=worker_cpus(slot, cores)
+        ))
+
+        if args.stage == 'segmentation' and plan['pinned']:
+            from services.image_service import image_processor
+            if image_processor.session_pool is not None:
+                image_processor.session_pool = image_processor.create_session_pool(
+                    (image_processor.session_pool.model_name,)
+                )
+
+    logger.info(f"🚀 Starting {args.stage} stage: {workers} workers x {args.threads} threads ({cores} cores each) at {address}")
+    StageServer(args.stage, address, handlers, workers, args.threads, post_fork).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Grayscale stem parity: folded 1-channel models must match the RGB path on
+replicated gray input (tiny random-weight models, no checkpoints needed)
+"""
+import copy
+
+import cv2
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+
+from services.model_service import DualInputBodyModel
+from services.optimization_service import (
+    GrayscaleStem,
+    fold_grayscale_stems,
+    gray_to_rgb_input,
+    optimize_for_inference,
+)
+from utils.image_utils import mask_to_tensor
+
+IMG_SIZE = (64, 48)
+ATOL = 1e-4
+
+
+def _masks(count, size=IMG_SIZE):
+    """Filled ellipses like segmented silhouettes"""
+    rng = np.random.default_rng(0)
+    masks = []
+    for _ in range(count):
+        mask = np.zeros(size, np.uint8)
+        center = (int(rng.integers(size[1] // 3, 2 * size[1] // 3)), size[0] // 2)
+        axes = (int(rng.integers(4, size[1] // 4)), int(rng.integers(8, size[0] // 2 - 4)))
+        cv2.ellipse(mask, center, axes, 0, 0, 360, 255, -1)
+        masks.append(mask)
+    return masks
+
+
+def _inputs(masks, channels):
+    return torch.stack([mask_to_tensor(mask, IMG_SIZE, channels=channels) for mask in masks])
+
+
+@pytest.fixture(scope='module')
+def model():
+    """Small timm backbone with random weights and non-trivial BatchNorm statistics"""
+    torch.manual_seed(0)
+    model = DualInputBodyModel('mobilenetv3_small_050', num_measurements=14)
+    for module in model.modules():
+        if isinstance(module, (nn.BatchNorm1d, nn.BatchNorm2d)):
+            module.running_mean.uniform_(-0.2, 0.2)
+            module.running_var.uniform_(0.5, 1.5)
+    return model.eval()
+
+
+@pytest.mark.parametrize('kernel_size, stride, padding, bias', [
+    (3, 2, 1, False),
+    (7, 2, 3, True),
+    (3, 1, 1, True),
+])
+@pytest.mark.parametrize('size', [IMG_SIZE, (37, 29)])
+def test_stem_matches_rgb_conv(kernel_size, stride, padding, bias, size):
+    torch.manual_seed(0)
+    conv = nn.Conv2d(3, 8, kernel_size, stride, padding, bias=bias)
+    stem = GrayscaleStem(conv, IMG_SIZE)
+    gray = torch.rand(2, 1, *size)
+
+    with torch.no_grad():
+        expected = conv(gray_to_rgb_input(gray))
+        actual = stem(gray)
+
+    torch.testing.assert_close(actual, expected, atol=ATOL, rtol=ATOL)
+
+
+def test_folded_model_matches_rgb_path(model):
+    masks = _masks(4)
+    folded = copy.deepcopy(model)
+
+    assert fold_grayscale_stems(folded, IMG_SIZE)
+    assert folded.input_channels == 1
+
+    with torch.no_grad():
+        expected = model(_inputs(masks, 3), _inputs(masks[::-1], 3))
+        actual = folded(_inputs(masks, 1), _inputs(masks[::-1], 1))
+
+    torch.testing.assert_close(actual, expected, atol=ATOL, rtol=ATOL)
+
+
+def test_optimized_grayscale_model_matches_rgb_path(model):
+    masks = _masks(4)
+    optimized, report = optimize_for_inference(
+        copy.deepcopy(model), channels_last=True, img_size=IMG_SIZE, atol=ATOL, grayscale=True
+    )
+
+    assert report['applied'] and report['grayscale_stem']
+    with torch.no_grad():
+        expected = model(_inputs(masks, 3), _inputs(masks[::-1], 3))
+        actual = optimized(_inputs(masks, 1), _inputs(masks[::-1], 1))
+
+    torch.testing.assert_close(actual, expected, atol=ATOL, rtol=ATOL)
+
+
+def test_optimizing_leaves_checkpoint_tensors_intact(model):
+    # Models are loaded with assign=True, so parameters share storage with the checkpoint
+    checkpoint = copy.deepcopy(model.state_dict())
+    reference = {name: tensor.clone() for name, tensor in checkpoint.items()}
+    loaded = DualInputBodyModel('mobilenetv3_small_050', num_measurements=14)
+    loaded.load_state_dict(checkpoint, assign=True)
+
+    optimize_for_inference(loaded.eval(), img_size=IMG_SIZE, atol=ATOL, grayscale=True)
+
+    for name, tensor in checkpoint.items():
+        assert torch.equal(tensor, reference[name]), name
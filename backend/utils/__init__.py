@@ -1,20 +1,29 @@
 """
 Utility functions
+
+Exports are imported on first use (see services/__init__.py)
 """
-from .image_utils import preprocess_image, allowed_file, decode_base64_image
-from .response_utils import (
-    format_measurements,
-    validate_measurements,
-    create_error_response,
-    create_success_response
-)
+from core.lazy import lazy_exports
+
+_EXPORTS = {
+    'preprocess_image': 'image_utils',
+    'mask_to_tensor': 'image_utils',
+    'allowed_file': 'image_utils',
+    'decode_image': 'image_utils',
+    'decode_base64_image': 'image_utils',
+    'extract_image_pairs': 'image_utils',
+    'get_requested_model': 'request_utils',
+    'get_content_hint': 'request_utils',
+    'check_content_length': 'request_utils',
+    'read_upload': 'request_utils',
+    'get_request_timeout': 'request_utils',
+    'format_measurements': 'response_utils',
+    'validate_measurements': 'response_utils',
+    'create_error_response': 'response_utils',
+    'create_overload_response': 'response_utils',
+    'create_success_response': 'response_utils',
+}
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
 
-__all__ = [
-    'preprocess_image',
-    'allowed_file',
-    'decode_base64_image',
-    'format_measurements',
-    'validate_measurements',
-    'create_error_response',
-    'create_success_response'
-]
\ No newline at end of file
+__all__ = list(_EXPORTS)
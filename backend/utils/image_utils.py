@@ -1,10 +1,10 @@
 import cv2
 import numpy as np
-import torch
 from PIL import Image
 import io
 import base64
-from pathlib import Path
+import zipfile
+from pathlib import Path, PurePosixPath
 from core.config import Config
 
 def allowed_file(filename):
@@ -12,13 +12,56 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
-def preprocess_image(image_bytes, target_size=(512, 384)):
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Every gray level as model input: v / 255 for grayscale-stem models, and
+# (v / 255 - mean) / std per replicated RGB channel (float64 math, float32 storage)
+_GRAY_LUT = np.arange(256, dtype=np.float32) / 255.0
+_NORMALIZE_LUT = (
+    (_GRAY_LUT[None, :] - np.array(IMAGENET_MEAN)[:, None]) / np.array(IMAGENET_STD)[:, None]
+).astype(np.float32)
+
+def mask_to_tensor(mask, target_size=(512, 384), out=None, channels=3):
+    """
+    Normalize a uint8 grayscale mask straight into a float32 model input
+    
+    Args:
+        mask: (H, W) uint8 array
+        target_size: (height, width) tuple
+        out: Optional preallocated (C, H, W) float32 tensor or array to
+            write into (e.g. a slot of a reused batch buffer)
+        channels: 3 (replicated, ImageNet-normalized RGB) or 1 (mask / 255,
+            for models with a folded grayscale stem)
+    
+    Returns:
+        (C, H, W) float32 tensor (shares memory with out when given)
+    """
+    import torch
+    
+    if mask.shape[:2] != tuple(target_size):
+        mask = cv2.resize(mask, (target_size[1], target_size[0]))
+    
+    if out is None:
+        out = torch.empty(channels, target_size[0], target_size[1], dtype=torch.float32)
+    
+    out_array = out.numpy() if torch.is_tensor(out) else out
+    if channels == 1:
+        np.take(_GRAY_LUT, mask, out=out_array[0])
+    else:
+        for channel in range(3):
+            np.take(_NORMALIZE_LUT[channel], mask, out=out_array[channel])
+    
+    return out if torch.is_tensor(out) else torch.from_numpy(out)
+
+def preprocess_image(image_bytes, target_size=(512, 384), channels=3):
     """
     Preprocess image for model inference
     
     Args:
         image_bytes: Raw image bytes
         target_size: (height, width) tuple
+        channels: Model input channels (3 = RGB, 1 = grayscale stem)
     
     Returns:
         Preprocessed image tensor
@@ -30,20 +73,55 @@ def preprocess_image(image_bytes, target_size=(512, 384)):
     if img is None:
         raise ValueError("Invalid image data")
     
-    # Convert grayscale to RGB
-    img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    # Grayscale is replicated to RGB and normalized per channel
+    return mask_to_tensor(img, target_size, channels=channels)
+
+# libjpeg DCT scaling: decode straight to 1/2, 1/4 or 1/8 resolution
+_REDUCED_COLOR_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+def decode_image(image_bytes, min_size=None):
+    """
+    Decode uploaded image bytes to a BGR array, once
+    
+    JPEGs are decoded at the smallest 1/2, 1/4 or 1/8 scale that still
+    covers min_size, which skips most of the IDCT work and memory for
+    large phone photos.
+    
+    Args:
+        image_bytes: Raw image bytes
+        min_size: (height, width) the decoded image must still cover
+    
+    Returns:
+        BGR uint8 array
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    flags = cv2.IMREAD_COLOR
     
-    # Resize
-    img = cv2.resize(img, (target_size[1], target_size[0]))
+    if min_size is not None:
+        try:
+            # Header only; pixel data is not decoded
+            with Image.open(io.BytesIO(image_bytes)) as header:
+                image_format, (width, height) = header.format, header.size
+        except Exception:
+            image_format = None
+        
+        if image_format == 'JPEG':
+            # Compare short/long sides so EXIF rotation can't undershoot
+            short_side, long_side = sorted((width, height))
+            min_short, min_long = sorted(min_size)
+            for scale, reduced_flag in _REDUCED_COLOR_FLAGS:
+                if short_side // scale >= min_short and long_side // scale >= min_long:
+                    flags = reduced_flag
+                    break
     
-    # Normalize
-    img = img.astype(np.float32) / 255.0
-    mean = np.array([0.485, 0.456, 0.406])
-    std = np.array([0.229, 0.224, 0.225])
-    img = (img - mean) / std
+    img = cv2.imdecode(nparr, flags)
     
-    # Convert to tensor (C, H, W)
-    img = torch.from_numpy(img.transpose(2, 0, 1)).float()
+    if img is None:
+        raise ValueError("Invalid image - cannot decode")
     
     return img
 
@@ -52,3 +130,84 @@ def decode_base64_image(base64_string):
     if ',' in base64_string:
         base64_string = base64_string.split(',')[1]
     return base64.b64decode(base64_string)
+
+
+def extract_image_pairs(archive_bytes, max_pairs=None, max_file_size=None, max_total_size=None):
+    """
+    Extract front/side image pairs from a zip archive
+    
+    Accepted layouts (any allowed image extension):
+        <subject>/front.jpg + <subject>/side.jpg
+        <subject>_front.jpg + <subject>_side.jpg
+    
+    Limits are checked against the archive's directory before any entry is
+    decompressed, and each read is capped, so a zip bomb can't exhaust memory.
+    
+    Args:
+        archive_bytes: Raw zip file bytes
+        max_pairs: Most subjects allowed (default: Config.MAX_BATCH_ITEMS)
+        max_file_size: Largest uncompressed image (default: Config.MAX_FILE_SIZE)
+        max_total_size: Largest uncompressed total (default: Config.MAX_ARCHIVE_SIZE)
+    
+    Returns:
+        List of (subject_id, front_bytes, side_bytes, error) tuples,
+        sorted by subject_id. error is None for complete pairs.
+    
+    Raises:
+        ValueError: If the archive exceeds a limit
+    """
+    max_pairs = max_pairs or Config.MAX_BATCH_ITEMS
+    max_file_size = max_file_size or Config.MAX_FILE_SIZE
+    max_total_size = max_total_size or Config.MAX_ARCHIVE_SIZE
+    subjects = {}
+    
+    with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+        entries = {}
+        total_size = 0
+        for entry in archive.infolist():
+            if entry.is_dir():
+                continue
+            
+            path = PurePosixPath(entry.filename)
+            if path.name.startswith('.') or '__MACOSX' in path.parts:
+                continue
+            if not allowed_file(path.name):
+                continue
+            
+            stem = path.stem.lower()
+            if stem in ('front', 'side') and len(path.parts) > 1:
+                subject_id, view = str(path.parent), stem
+            elif stem.endswith('_front') or stem.endswith('_side'):
+                base, view = path.stem.rsplit('_', 1)
+                subject_id, view = str(path.parent / base), view.lower()
+            else:
+                continue
+            
+            if entry.file_size > max_file_size:
+                raise ValueError(
+                    f"{entry.filename} is too large ({entry.file_size} bytes, max {max_file_size})"
+                )
+            total_size += entry.file_size
+            if total_size > max_total_size:
+                raise ValueError(f"Archive images exceed {max_total_size // (1024 * 1024)} MB uncompressed")
+            
+            entries.setdefault(subject_id, {})[view] = entry
+            if len(entries) > max_pairs:
+                raise ValueError(f"Too many pairs: more than {max_pairs} (max {max_pairs})")
+        
+        for subject_id, views in entries.items():
+            for view, entry in views.items():
+                with archive.open(entry) as f:
+                    data = f.read(max_file_size + 1)  # don't trust the declared size
+                if len(data) > max_file_size:
+                    raise ValueError(f"{entry.filename} is too large (max {max_file_size} bytes)")
+                subjects.setdefault(subject_id, {})[view] = data
+    
+    pairs = []
+    for subject_id in sorted(subjects):
+        views = subjects[subject_id]
+        missing = [view for view in ('front', 'side') if view not in views]
+        error = f"Missing {' and '.join(missing)} image" if missing else None
+        pairs.append((subject_id, views.get('front'), views.get('side'), error))
+    
+    return pairs
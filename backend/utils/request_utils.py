@@ -0,0 +1,112 @@
+import math
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from core.config import Config
+
+# Room for multipart headers and the small form fields next to the uploaded files
+FORM_OVERHEAD = 64 * 1024
+
+
+def get_requested_model(req):
+    """
+    Model selected by the client for this request
+    
+    Args:
+        req: Flask request
+    
+    Returns:
+        Config.MODELS key from ?model=... or the X-Model header, or None
+    """
+    model_name = req.args.get('model') or req.headers.get('X-Model')
+    return model_name.strip() if model_name else None
+
+
+CONTENT_HINTS = ('mask', 'photo')
+
+
+def get_content_hint(req):
+    """
+    Client hint about what was uploaded, so mask detection can be skipped
+    
+    Args:
+        req: Flask request
+    
+    Returns:
+        'mask', 'photo' or None, from a `content` form field or ?content=
+    
+    Raises:
+        ValueError: For any other value
+    """
+    content = req.form.get('content') or req.args.get('content')
+    if not content:
+        return None
+    
+    content = content.strip().lower()
+    if content not in CONTENT_HINTS:
+        raise ValueError(f"Invalid content hint '{content}'. Use one of {list(CONTENT_HINTS)}")
+    return content
+
+
+def check_content_length(req, max_bytes):
+    """
+    Reject an oversized body before the form is parsed (and spooled to disk)
+    
+    Args:
+        req: Flask request
+        max_bytes: Largest total size of the uploaded files
+    
+    Raises:
+        RequestEntityTooLarge: If the declared Content-Length is larger (plus FORM_OVERHEAD)
+    """
+    if req.content_length is not None and req.content_length > max_bytes + FORM_OVERHEAD:
+        raise RequestEntityTooLarge(f"Request body is larger than {max_bytes // (1024 * 1024)} MB")
+
+
+def read_upload(file, max_bytes=None):
+    """
+    Bytes of an uploaded file, read no further than the size limit
+    
+    Args:
+        file: werkzeug FileStorage
+        max_bytes: Largest accepted size (default: Config.MAX_FILE_SIZE)
+    
+    Raises:
+        RequestEntityTooLarge: If the file is larger
+    """
+    max_bytes = max_bytes or Config.MAX_FILE_SIZE
+    data = file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise RequestEntityTooLarge(f"{file.filename or file.name} is larger than {max_bytes // (1024 * 1024)} MB")
+    return data
+
+
+def get_request_timeout(req):
+    """
+    Deadline the client is willing to wait for this request
+    
+    Args:
+        req: Flask request
+    
+    Returns:
+        Seconds from the X-Request-Timeout header or ?timeout=, or None for the server default
+    
+    Raises:
+        ValueError: If the value is not a positive number up to REQUEST_TIMEOUT_MAX_S
+    """
+    timeout = req.headers.get('X-Request-Timeout') or req.args.get('timeout')
+    if not timeout:
+        return None
+    
+    try:
+        seconds = float(timeout)
+    except ValueError:
+        raise ValueError(f"Invalid request timeout '{timeout}'. Use seconds, e.g. 5")
+    
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError(f"Invalid request timeout '{timeout}'. Use seconds, e.g. 5")
+    if seconds > Config.REQUEST_TIMEOUT_MAX_S:
+        raise ValueError(
+            f"Request timeout {timeout}s exceeds the maximum of {Config.REQUEST_TIMEOUT_MAX_S:g}s"
+        )
+    return seconds
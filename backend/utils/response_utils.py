@@ -47,6 +47,12 @@ def create_error_response(message, status_code=400):
         'status_code': status_code
     }, status_code
 
+def create_overload_response(message, status_code, retry_after):
+    """Create a 429/503 error response telling the client when to retry"""
+    body, status_code = create_error_response(message, status_code)
+    body['retry_after'] = retry_after
+    return body, status_code, {'Retry-After': str(retry_after)}
+
 def create_success_response(data, message="Success"):
     """Create standardized success response"""
     return {